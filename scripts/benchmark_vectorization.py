@@ -0,0 +1,265 @@
+"""
+Micro-benchmark of the per-row and vectorized demand metric calculations.
+
+The per-row loops previously used in the demand and decile scripts are
+timed against the column operations and lookup tables that replaced them,
+on the largest country population results available, and their outputs
+are checked to be identical.
+
+Written by Bonface Osoro & Ed Oughton.
+
+"""
+import configparser
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from glassfibre.preprocessing import population_decile, population_deciles
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+BASE_PATH = CONFIG['file_locations']['base_path']
+DATA_RESULTS = os.path.join(BASE_PATH, '..', 'results', 'final')
+
+ARPU = 10
+ADOPTION_LOW = 20
+
+
+def largest_country():
+    """
+    This function finds the country with the largest population results.
+
+    Returns
+    -------
+    iso3 : string
+        Country ISO3 code, or None if there are no population results.
+    df : dataframe
+        Population results of the country.
+
+    """
+    sizes = {}
+    if os.path.exists(DATA_RESULTS):
+
+        for iso3 in os.listdir(DATA_RESULTS):
+
+            path = os.path.join(DATA_RESULTS, iso3, 'population',
+                                '{}_population_results.csv'.format(iso3))
+            if os.path.exists(path):
+
+                sizes[iso3] = os.path.getsize(path)
+
+    if not sizes:
+
+        return None, None
+
+    iso3 = max(sizes, key = sizes.get)
+    path = os.path.join(DATA_RESULTS, iso3, 'population',
+                        '{}_population_results.csv'.format(iso3))
+
+
+    return iso3, pd.read_csv(path)
+
+
+def synthetic_country(rows, seed = 42):
+    """
+    This function generates population results of a synthetic country.
+
+    """
+    rng = np.random.default_rng(seed)
+
+
+    return pd.DataFrame({
+        'GID_2': ['SYN.{}'.format(i) for i in range(rows)],
+        'area': rng.uniform(1, 5000, rows),
+        'population': rng.integers(100, 1000000, rows)})
+
+
+def scenarios(df):
+    """
+    This function repeats the subregions once per adoption scenario.
+
+    """
+    df = df[['GID_2', 'area', 'population']].copy()
+    df['pop_den_km'] = df['population'] / df['area']
+    df = pd.concat([df.assign(adoption_scenario = scenario) for scenario
+                    in ['low', 'baseline', 'high']], ignore_index = True)
+
+
+    return df
+
+
+def density_loop(df):
+    """
+    Population density computed row by row.
+
+    """
+    df = df.copy()
+    df['iso3'] = None
+    df['pop_den_km'] = np.nan
+    for i in range(len(df)):
+
+        df.loc[i, 'iso3'] = 'SYN'
+        df.loc[i, 'pop_den_km'] = df['population'].loc[i] / df['area'].loc[i]
+
+
+    return df
+
+
+def density_vectorized(df):
+    """
+    Population density computed column-wise.
+
+    """
+    df = df.copy()
+    df['iso3'] = 'SYN'
+    df['pop_den_km'] = df['population'] / df['area']
+
+
+    return df
+
+
+def adoption_loop(df):
+    """
+    Adoption scenario metrics computed row by row.
+
+    """
+    df = df.copy()
+    df[['adoption_value', 'users_area_sqkm', 'revenue_per_area']] = np.nan
+    df['geotype'] = None
+    for i in range(len(df)):
+
+        if df['adoption_scenario'].loc[i] == 'low':
+
+            df.loc[i, 'adoption_value'] = round((ADOPTION_LOW / 100), 4)
+
+        elif df['adoption_scenario'].loc[i] == 'baseline':
+
+            df.loc[i, 'adoption_value'] = round((ADOPTION_LOW / 100) + (0.1
+                                          * ((ADOPTION_LOW / 100))), 4)
+
+        else:
+
+            df.loc[i, 'adoption_value'] = round((ADOPTION_LOW / 100) + (0.2
+                                          * ((ADOPTION_LOW / 100))), 4)
+
+        df.loc[i, 'users_area_sqkm'] = (df['adoption_value'].loc[i]
+                                        * df['pop_den_km'].loc[i])
+        df.loc[i, 'revenue_per_area'] = df['users_area_sqkm'].loc[i] * ARPU
+        df.loc[i, 'geotype'] = population_decile(df['pop_den_km'].loc[i])
+
+
+    return df
+
+
+def adoption_vectorized(df):
+    """
+    Adoption scenario metrics computed with a lookup table.
+
+    """
+    df = df.copy()
+    adoption = {
+        'low': round((ADOPTION_LOW / 100), 4),
+        'baseline': round((ADOPTION_LOW / 100) + (0.1 * ((ADOPTION_LOW
+                          / 100))), 4),
+        'high': round((ADOPTION_LOW / 100) + (0.2 * ((ADOPTION_LOW
+                      / 100))), 4)}
+    df['adoption_value'] = df['adoption_scenario'].map(adoption)
+    df['users_area_sqkm'] = df['adoption_value'] * df['pop_den_km']
+    df['revenue_per_area'] = df['users_area_sqkm'] * ARPU
+    df['geotype'] = population_deciles(df['pop_den_km'])
+
+
+    return df
+
+
+def decile_loop(df):
+    """
+    Population deciles assigned row by row.
+
+    """
+    df = df.sort_values(by = 'pop_den_km', ascending = True)
+    df['decile_value'] = pd.qcut(df['pop_den_km'], 10, labels = False) + 1
+    df['decile'] = None
+    for i in range(len(df)):
+
+        df.loc[i, 'decile'] = population_decile(df['decile_value'].loc[i])
+
+
+    return df
+
+
+def decile_vectorized(df):
+    """
+    Population deciles assigned with a lookup table.
+
+    """
+    df = df.sort_values(by = 'pop_den_km', ascending = True)
+    df['decile_value'] = pd.qcut(df['pop_den_km'], 10, labels = False) + 1
+    df['decile'] = population_deciles(df['decile_value'])
+
+
+    return df
+
+
+def timed(function, df, repeats):
+    """
+    This function returns the output and best run time of a function.
+
+    """
+    best = np.inf
+    for repeat in range(repeats):
+
+        start = time.perf_counter()
+        output = function(df)
+        best = min(best, time.perf_counter() - start)
+
+
+    return output, best
+
+
+def run_benchmark(rows = 10000, repeats = 3):
+    """
+    Time the per-row and vectorized calculations and check that their
+    outputs are identical.
+
+    Parameters
+    ----------
+    rows : int
+        Number of subregions of the synthetic country used when no
+        population results are available.
+    repeats : int
+        Number of runs, the fastest of which is reported.
+
+    """
+    iso3, df = largest_country()
+    if iso3 is None:
+
+        iso3, df = 'SYN', synthetic_country(rows)
+
+    print('Benchmarking {} with {} subregions'.format(iso3, len(df)))
+    base = df[['GID_2', 'area', 'population']].reset_index(drop = True)
+    demand = scenarios(base)
+
+    cases = [('pop_den_km', density_loop, density_vectorized, base),
+             ('adoption', adoption_loop, adoption_vectorized, demand),
+             ('decile', decile_loop, decile_vectorized, demand)]
+
+    for name, loop, vectorized, data in cases:
+
+        expected, loop_time = timed(loop, data, 1)
+        output, vector_time = timed(vectorized, data, repeats)
+        pd.testing.assert_frame_equal(expected, output, check_dtype = False)
+
+        print('{:<12} {:>10.4f} s per-row {:>10.4f} s vectorized {:>10.0f}x'
+              .format(name, loop_time, vector_time,
+                      loop_time / max(vector_time, 1e-9)))
+
+
+    return None
+
+
+if __name__ == '__main__':
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    run_benchmark(rows)
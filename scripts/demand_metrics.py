@@ -5,7 +5,10 @@ import pandas as pd
 import numpy as np
 import geopandas as gpd
 
-from glassfibre.preprocessing import population_decile
+from glassfibre.preprocessing import population_deciles
+from glassfibre.aggregate import aggregate
+from glassfibre.storage import (read_layer, write_layer, list_layers,
+                                find_layers)
 
 pd.options.mode.chained_assignment = None
 warnings.filterwarnings('ignore')
@@ -33,15 +36,11 @@ def demand(iso3):
     print('Generating demand results for {} csv'.format(iso3))
     demand_folder = os.path.join(DATA_RESULTS, iso3, 'population', 
                  '{}_demand_metrics.shp'.format(iso3))
-    df = gpd.read_file(demand_folder)
+    df = read_layer(demand_folder)
     df = df[['GID_2', 'area', 'population']]
     df = df.groupby(['GID_2', 'area'])['population'].sum().reset_index()
-    df[['iso3', 'pop_den_km']] = ''
-
-    for i in range(len(df)):
-
-        df['iso3'].loc[i] = iso3
-        df['pop_den_km'].loc[i] = df['population'].loc[i] / df['area'].loc[i] 
+    df['iso3'] = iso3
+    df['pop_den_km'] = df['population'] / df['area']
 
     for idx, country in countries.iterrows():
             
@@ -59,39 +58,19 @@ def demand(iso3):
             'pop_den_km', ], var_name = 'adoption_scenario', value_vars = 
             ['low', 'baseline', 'high'])
         df = df.drop(columns = ['value'])
-        df[['adoption_value', 'users_area_sqkm', 'revenue_per_area', 'geotype']] = ''
         df['pop_den_km'] = df['pop_den_km'].astype(float)
+        adoption = {
+            'low': round((adoption_low / 100), 4),
+            'baseline': round((adoption_low / 100) + (0.1 * ((adoption_low 
+                              / 100))), 4),
+            'high': round((adoption_low / 100) + (0.2 * ((adoption_low 
+                          / 100))), 4)}
+
+        df['adoption_value'] = df['adoption_scenario'].map(adoption)
+        df['users_area_sqkm'] = df['adoption_value'] * df['pop_den_km']
+        df['revenue_per_area'] = df['users_area_sqkm'] * arpu
+        df['geotype'] = population_deciles(df['pop_den_km'])
 
-        for i in range(len(df)):
-
-            if df['adoption_scenario'].loc[i] == 'low':
-
-                df['adoption_value'].loc[i] = round((adoption_low / 100), 4)
-                df['users_area_sqkm'].loc[i] = (df['adoption_value'].loc[i] 
-                                                * df['pop_den_km'].loc[i])
-                df['revenue_per_area'].loc[i] = ((df['users_area_sqkm'].loc[i]) 
-                                                 * (arpu))
-                
-            elif df['adoption_scenario'].loc[i] == 'baseline':
-
-                df['adoption_value'].loc[i] = round((adoption_low / 100) + (0.1 
-                                              * ((adoption_low / 100))), 4)
-                df['users_area_sqkm'].loc[i] = (df['adoption_value'].loc[i] 
-                                                * df['pop_den_km'].loc[i])
-                df['revenue_per_area'].loc[i] = ((df['users_area_sqkm'].loc[i]) 
-                                                 * (arpu))
-                
-            else:
-
-                df['adoption_value'].loc[i] = round((adoption_low / 100) + (0.2 
-                                              * ((adoption_low / 100))), 4)
-                df['users_area_sqkm'].loc[i] = (df['adoption_value'].loc[i] 
-                                                * df['pop_den_km'].loc[i])
-                df['revenue_per_area'].loc[i] = ((df['users_area_sqkm'].loc[i]) 
-                                                 * (arpu))
-
-            df['geotype'].loc[i] = population_decile(df['pop_den_km'].loc[i])
-                
         df = df[['iso3', 'GID_2', 'area', 'population', 'adoption_scenario',
                  'adoption_value', 'pop_den_km', 'geotype', 'users_area_sqkm', 
                  'revenue_per_area']]
@@ -129,21 +108,18 @@ def generate_demand_metrics(iso3):
     df = df[['GID_2', 'area']]
 
     merged_shapefile = gpd.GeoDataFrame()
-    for file_name in os.listdir(settlement_folder_in):
+    for file_name in list_layers(settlement_folder_in):
 
         if file_name.endswith('access_settlements.shp'):
 
             file_path = os.path.join(settlement_folder_in, file_name)
-            gdf = gpd.read_file(file_path)
+            gdf = read_layer(file_path)
             gdf.rename(columns = {'GID_1': 'GID_2'}, inplace = True)
             gdf = gdf[['iso3', 'GID_2', 'population', 'geometry', 'type']]
 
             merged_df = pd.merge(gdf, df, on = 'GID_2', how = 'inner')
-            merged_df['pop_den_km'] = ''
-            for i in range(len(merged_df)):
-
-                merged_df['pop_den_km'].loc[i] = (
-                    merged_df['population'].loc[i] / merged_df['area'].loc[i])
+            merged_df['pop_den_km'] = (merged_df['population'] / 
+                                       merged_df['area'])
             
             merged_shapefile = pd.concat([merged_shapefile, merged_df], 
                                         ignore_index = True) 
@@ -155,7 +131,7 @@ def generate_demand_metrics(iso3):
                 os.makedirs(folder_out)
 
             path_out = os.path.join(folder_out, fileout)
-            merged_shapefile.to_file(path_out, index = False)
+            write_layer(merged_shapefile, path_out, index = False)
 
 
     return None
@@ -165,54 +141,35 @@ def combine_shapefiles():
     """
     This function combines shapefiles of individual country into a single one.
     """
-    isos = os.listdir(DATA_RESULTS)
-    combined_gdf = gpd.GeoDataFrame()
-    combined_df = pd.DataFrame()
- 
-    for iso3 in isos:
-        
-        print('Combining data for {}'.format(iso3))
-        shapefile_path = os.path.join(DATA_RESULTS, iso3, 'population')
+    arpu = dict(zip(countries['iso3'], countries['arpu']))
+    paths = []
+    path_iso3 = {}
 
-        for root, _, files in os.walk(shapefile_path):
+    for iso3 in sorted(os.listdir(DATA_RESULTS)):
 
-            for file in files:
+        for path in find_layers(os.path.join(DATA_RESULTS, iso3, 
+                                             'population')):
 
-                if file.endswith('.shp'):
+            paths.append(path)
+            path_iso3[path] = iso3
 
-                    file_path = os.path.join(root, file)
-                    gdf = gpd.read_file(file_path)
-                    gdf[['total_area_revenue']] = ''
-                    
-                    for i in range(len(gdf)):
-                        
-                        for idx, country in countries.iterrows():
-            
-                            if not country['iso3'] == iso3:
+    def add_revenue(gdf, path):
 
-                                continue
+        gdf['total_area_revenue'] = gdf['population'] * arpu.get(
+            path_iso3[path], np.nan)
 
-                            arpu = countries['arpu'].loc[idx]
 
-                            gdf['total_area_revenue'].loc[i] = (
-                                (gdf['population'].loc[i]) * (arpu))
-                            
-                    combined_gdf = pd.concat([combined_gdf, gdf], 
-                                                ignore_index = True) 
-                    combined_df = pd.concat([combined_df, gdf], ignore_index = 
-                                            True)
-                    
-                    fileout = 'SSA_demand_metrics.shp'
-                    filename = 'SSA_demand_metrics.csv'
-                    folder_out = os.path.join(DATA_AFRICA, 'shapefiles')
-                    if not os.path.exists(folder_out):
+        return gdf
 
-                        os.makedirs(folder_out)
+    folder_out = os.path.join(DATA_AFRICA, 'shapefiles')
+    path_out = os.path.join(folder_out, 'SSA_demand_metrics.shp')
+    combined_gdf = aggregate(paths, path_out, add_revenue, description = 
+                             'Combining demand metrics')
 
-                    path_out = os.path.join(folder_out, fileout)
-                    path_out1 = os.path.join(DATA_AFRICA, filename)
-                    combined_gdf.to_file(path_out, index = False)
-                    combined_df.to_csv(path_out1, index = False)
+    if combined_gdf is not None:
+
+        path_out1 = os.path.join(DATA_AFRICA, 'SSA_demand_metrics.csv')
+        combined_gdf.to_csv(path_out1, index = False)
 
 
     return None
@@ -227,34 +184,18 @@ def combine_fiber_shapefiles(metric):
     metric : string
         Network level and shape being quantified'
     """
-    isos = os.listdir(DATA_PROCESSED)
-    combined_gdf = gpd.GeoDataFrame()
-    
-    for iso3 in isos:
+    paths = []
+    for iso3 in sorted(os.listdir(DATA_PROCESSED)):
 
-        print('Combining data for {}'.format(iso3))
-        shapefile_path = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                                      'combined')
+        paths += find_layers(os.path.join(DATA_PROCESSED, iso3, 
+                             'buffer_routing_zones', 'combined'), metric)
 
-        for root, _, files in os.walk(shapefile_path):
+    path_out = os.path.join(DATA_AFRICA, 'shapefiles', 
+                            'SSA_{}.shp'.format(metric))
+    aggregate(paths, path_out, stream = True, description = 
+              'Combining {}'.format(metric))
 
-            for file in files:
 
-                if file.endswith('{}.shp'.format(metric)):
-
-                    file_path = os.path.join(root, file)
-                    gdf = gpd.read_file(file_path)
-                    combined_gdf = pd.concat([combined_gdf, gdf], 
-                                                ignore_index = True) 
-                    
-                    fileout = 'SSA_{}.shp'.format(metric)
-                    folder_out = os.path.join(DATA_AFRICA, 'shapefiles')
-                    if not os.path.exists(folder_out):
-
-                        os.makedirs(folder_out)
-
-                    path_out = os.path.join(folder_out, fileout)
-                    combined_gdf.to_file(path_out, index = False)
     return None
 
 
@@ -263,33 +204,18 @@ def combine_existing_fiber_shapefiles(metric):
     This function exclusively combines existing fiber shapefiles of an 
     individual country into a single one.
     """
-    isos = os.listdir(DATA_PROCESSED)
-    combined_gdf = gpd.GeoDataFrame()
-    
-    for iso3 in isos:
-
-        print('Combining data for {}'.format(iso3))
-        shapefile_path = os.path.join(DATA_PROCESSED, iso3, 'network_existing')
+    paths = []
+    for iso3 in sorted(os.listdir(DATA_PROCESSED)):
 
-        for root, _, files in os.walk(shapefile_path):
+        paths += find_layers(os.path.join(DATA_PROCESSED, iso3, 
+                             'network_existing'), metric)
 
-            for file in files:
+    path_out = os.path.join(DATA_AFRICA, 'shapefiles', 
+                            'SSA_{}.shp'.format(metric))
+    aggregate(paths, path_out, stream = True, description = 
+              'Combining {}'.format(metric))
 
-                if file.endswith('{}.shp'.format(metric)):
 
-                    file_path = os.path.join(root, file)
-                    gdf = gpd.read_file(file_path)
-                    combined_gdf = pd.concat([combined_gdf, gdf], 
-                                                ignore_index = True) 
-                    
-                    fileout = 'SSA_{}.shp'.format(metric)
-                    folder_out = os.path.join(DATA_AFRICA, 'shapefiles')
-                    if not os.path.exists(folder_out):
-
-                        os.makedirs(folder_out)
-
-                    path_out = os.path.join(folder_out, fileout)
-                    combined_gdf.to_file(path_out, index = False)
     return None
 
 
@@ -300,7 +226,7 @@ def combine_africa_shapefile():
     """
     file = os.path.join(DATA_AFRICA, 'shapefiles', 'SSA_demand_metrics.shp')
     file_1 = os.path.join(DATA_RAW, 'Africa_Boundaries', 'SSA_combined_shapefile.shp')
-    gdf = gpd.read_file(file)
+    gdf = read_layer(file)
     gdf = gdf[['iso3', 'GID_2', 'population', 'type', 'area', 'pop_den_km', 
                  'region', 'total_area']]
     gdf1 = gpd.read_file(file_1)
@@ -313,97 +239,66 @@ def combine_africa_shapefile():
 
     fileout = 'SSA_gid_2_demand_metrics.shp'
     path_out = os.path.join(folder_out, fileout)
-    merged_df.to_file(path_out, index = False)
+    write_layer(merged_df, path_out, index = False)
 
 
     return None
 
 
 def generate_population_decile():
-
     """
     This function generates population decile for each country and combine them 
     together.
     """
-
-    isos = os.listdir(DATA_RESULTS)
-    merged_data = pd.DataFrame()
-    merged_data_1 = pd.DataFrame()
     print('Generating population deciles')
+    paths = []
+    for iso3 in sorted(os.listdir(DATA_RESULTS)):
+
+        path = os.path.join(DATA_RESULTS, iso3, 'population', 
+                            '{}_population_results.csv'.format(iso3))
+        if os.path.exists(path):
 
-    for iso3 in isos:
+            paths.append(path)
 
-        base_directory = os.path.join(DATA_RESULTS, iso3, 'population') 
+    def population_density(df, path):
 
-        for root, _, files in os.walk(base_directory):
+        df['pop_density_sqkm'] = df['population'] / df['area']
 
-            for file in files:
 
-                if file.endswith('_population_results.csv'):
-                    
-                    file_path = os.path.join(base_directory, 
-                                '{}_population_results.csv'.format(iso3))
-                    df = pd.read_csv(file_path)
-                    df['pop_density_sqkm'] = df['population'] / df['area']
+        return df[['iso3', 'GID_1', 'GID_2', 'area', 'population', 
+                   'pop_density_sqkm']]
 
-                    df1 = pd.read_csv(file_path)
-                    df1 = df1.groupby(['iso3', 'GID_1']).agg({'population': 
+    folder_out = os.path.join(DATA_RESULTS, '..', 'SSA')
+    merged_data = aggregate(paths, os.path.join(folder_out, 
+                            'subregional_population_deciles.csv'), 
+                            population_density, description = 
+                            'Combining population results')
+
+    merged_data_1 = merged_data.groupby(['iso3', 'GID_1']).agg({'population': 
                                         'sum', 'area': 'sum'}).reset_index()
-                                                                  
-                    df1['pop_density_sqkm'] = df1['population'] / df1['area']
-
-                    df = df[['iso3', 'GID_1', 'GID_2', 'area', 'population', 
-                             'pop_density_sqkm']]
-                    df1 = df1[['iso3', 'GID_1', 'area', 'population', 
-                               'pop_density_sqkm']]
-                    merged_data = pd.concat([merged_data, df], 
-                                            ignore_index = True)
-                    merged_data_1 = pd.concat([merged_data_1, df1], 
-                                              ignore_index = True)            
-                    
-                fileout = 'subregional_population_deciles.csv'
-                fileout_1 = 'regional_population_deciles.csv'
-                folder_out = os.path.join(DATA_RESULTS, '..', 'SSA')
-
-                if not os.path.exists(folder_out):
-
-                    os.makedirs(folder_out)
-
-                path_out = os.path.join(folder_out, fileout)
-                path_out_1 = os.path.join(folder_out, fileout_1)
-                merged_data.to_csv(path_out, index = False)
-                merged_data_1.to_csv(path_out_1, index = False)
+    merged_data_1['pop_density_sqkm'] = (merged_data_1['population'] / 
+                                         merged_data_1['area'])
+    merged_data_1 = merged_data_1[['iso3', 'GID_1', 'area', 'population',
+                                   'pop_density_sqkm']]
+    merged_data_1.to_csv(os.path.join(folder_out, 
+                         'regional_population_deciles.csv'), index = False)
     
     reg_data = pd.DataFrame()
     subregion_data = pd.DataFrame()
 
-    pop_folder = os.path.join(DATA_RESULTS, '..', 'SSA')
-    regional_population = os.path.join(pop_folder, 
-                          'regional_population_deciles.csv')
-    subregion_population = os.path.join(pop_folder, 
-                          'subregional_population_deciles.csv')
-    df = pd.read_csv(regional_population)
-    df1 = pd.read_csv(subregion_population)
+    df = merged_data_1
+    df1 = merged_data
     df = df.sort_values(by = 'pop_density_sqkm', ascending = True)                   
     df['decile_value'] = pd.qcut(df['pop_density_sqkm'], 10, 
                                     labels = False) + 1
-    df['decile'] = ""
+    df['decile'] = population_deciles(df['decile_value'])
 
     df1 = df1.sort_values(by = 'pop_density_sqkm', ascending = True)
     df1['decile_value'] = pd.qcut(df1['pop_density_sqkm'], 10, 
                                     labels = False) + 1
-    df1['decile'] = ""
-
-    for i in range(len(df)):
-
-        df['decile'].loc[i] = population_decile(df['decile_value'].loc[i])
+    df1['decile'] = population_deciles(df1['decile_value'])
 
     reg_data = pd.concat([reg_data, df], ignore_index = True)  
-
-    for i in range(len(df1)):
-
-        df1['decile'].loc[i] = population_decile(df1['decile_value'].loc[i])
-    
     subregion_data = pd.concat([subregion_data, df1], ignore_index = True) 
 
     filename = 'SSA_regional_population_deciles.csv'
@@ -431,34 +326,19 @@ def combine_pcsf_fiber_lines():
     metric : string
         Network level and shape being quantified'
     """
-    isos = os.listdir(DATA_PROCESSED)
-    combined_gdf = gpd.GeoDataFrame()
-    
-    for iso3 in isos:
-
-        print('Combining data for {}'.format(iso3))
-        shapefile_path = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                                      'combined')
+    paths = []
+    for iso3 in sorted(os.listdir(DATA_PROCESSED)):
 
-        for root, _, files in os.walk(shapefile_path):
-
-            for file in files:
-    
-                if file.endswith('{}_combined_pcsf_access_edges.shp'.format(iso3)):
+        paths += find_layers(os.path.join(DATA_PROCESSED, iso3, 
+                             'buffer_routing_zones', 'combined'), 
+                             '{}_combined_pcsf_access_edges'.format(iso3))
 
-                    file_path = os.path.join(root, file)
-                    gdf = gpd.read_file(file_path)
-                    combined_gdf = pd.concat([combined_gdf, gdf], 
-                                                ignore_index = True) 
-                    
-                    fileout = 'SSA_combined_pcsf_access_edges.shp'
-                    folder_out = os.path.join(DATA_AFRICA, 'shapefiles')
-                    if not os.path.exists(folder_out):
+    path_out = os.path.join(DATA_AFRICA, 'shapefiles', 
+                            'SSA_combined_pcsf_access_edges.shp')
+    aggregate(paths, path_out, stream = True, description = 
+              'Combining combined_pcsf_access_edges')
 
-                        os.makedirs(folder_out)
 
-                    path_out = os.path.join(folder_out, fileout)
-                    combined_gdf.to_file(path_out, index = False)
     return None
 
 
@@ -471,36 +351,22 @@ def combine_pcsf_fiber_nodes():
     metric : string
         Network level and shape being quantified'
     """
-    isos = os.listdir(DATA_PROCESSED)
-    combined_gdf = gpd.GeoDataFrame()
-    
-    for iso3 in isos:
-
-        print('Combining data for {}'.format(iso3))
-        shapefile_path = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                                      'combined')
+    paths = []
+    for iso3 in sorted(os.listdir(DATA_PROCESSED)):
 
-        for root, _, files in os.walk(shapefile_path):
+        paths += find_layers(os.path.join(DATA_PROCESSED, iso3, 
+                             'buffer_routing_zones', 'combined'), 
+                             '{}_combined_pcsf_subregional_nodes'.format(iso3))
 
-            for file in files:
-    
-                if file.endswith('{}_combined_pcsf_subregional_nodes.shp'.format(iso3)):
+    path_out = os.path.join(DATA_AFRICA, 'shapefiles', 
+                            'SSA_combined_pcsf_access_nodes.shp')
+    aggregate(paths, path_out, stream = True, description = 
+              'Combining combined_pcsf_subregional_nodes')
 
-                    file_path = os.path.join(root, file)
-                    gdf = gpd.read_file(file_path)
-                    combined_gdf = pd.concat([combined_gdf, gdf], 
-                                                ignore_index = True) 
-                    
-                    fileout = 'SSA_combined_pcsf_access_nodes.shp'
-                    folder_out = os.path.join(DATA_AFRICA, 'shapefiles')
-                    if not os.path.exists(folder_out):
 
-                        os.makedirs(folder_out)
-
-                    path_out = os.path.join(folder_out, fileout)
-                    combined_gdf.to_file(path_out, index = False)
     return None
 
+
 for idx, country in countries.iterrows():
         
     if not country['region'] == 'Sub-Saharan Africa' or country['Exclude'] == 1:
@@ -8,9 +8,9 @@ October 2024
 """
 import configparser
 import os
-import random
 import numpy as np
 import pandas as pd
+from scipy.stats import qmc
 from inputs import parameters
 from geosafi_consav.mobile import generate_log_normal_dist_value
 pd.options.mode.chained_assignment = None 
@@ -24,267 +24,404 @@ DATA_SSA = os.path.join(BASE_PATH, '..', 'results', 'SSA')
 deciles = ['Decile 1', 'Decile 2', 'Decile 3', 'Decile 4', 'Decile 5',
            'Decile 6', 'Decile 7', 'Decile 8', 'Decile 9', 'Decile 10']
 
+# Sampled parameters as (column, low key, high key, integer draw).
+COST_SPECS = [
+    ('olt_usd', 'olt_low_usd', 'olt_high_usd', True),
+    ('otc_usd', 'otc_low_usd', 'otc_high_usd', True),
+    ('wan_unit_usd', 'wan_unit_low_usd', 'wan_unit_high_usd', True),
+    ('installation_usd', 'installation_low_usd', 'installation_high_usd', 
+     True),
+    ('wdm_usd', 'wdm_low_usd', 'wdm_high_usd', True),
+    ('other_usd', 'other_low_usd', 'other_high_usd', True),
+    ('staff_usd', 'staff_low_usd', 'staff_high_usd', True),
+    ('power_usd', 'power_low_usd', 'power_high_usd', True),
+    ('regulatory_usd', 'regulatory_low_usd', 'regulatory_high_usd', True),
+    ('customer_usd', 'customer_low_usd', 'customer_high_usd', True),
+    ('fiber_speed_gbps', 'min_fiber_speed_gbps', 'max_fiber_speed_gbps', True),
+    ('node_power_kWh_per_km_gbps', 'node_pwr_low_kWh_per_km_gbps', 
+     'node_pwr_high_kWh_per_km_gbps', False),
+    ('other_costs_usd', 'other_low_costs_usd', 'other_high_costs_usd', True),
+]
+
+# Fixed parameters as (column, parameter key).
+COST_CONSTANTS = [
+    ('assessment_years', 'assessment_period_year'),
+    ('discount_rate', 'discount_rate_percent'),
+]
+
+EMISSION_SPECS = [
+    ('fiber_cable_kg_per_km', 'fiber_cable_low_kg_per_km', 
+     'fiber_cable_high_kg_per_km', True),
+    ('pcb_kg', 'pcb_low_kg', 'pcb_high_kg', False),
+    ('pvc_kg', 'pvc_low_kg', 'pvc_high_kg', True),
+    ('steel_kg', 'steel_low_kg', 'steel_high_kg', True),
+    ('concrete_kg', 'machine_concrete_low_kg', 'machine_concrete_high_kg', 
+     False),
+    ('router', 'low_router', 'high_router', True),
+    ('fuel_efficiency', 'fuel_efficiency_low', 'fuel_efficiency_high', False),
+    ('truck_fuel_efficiency', 'truck_fuel_efficiency_low', 
+     'truck_fuel_efficiency_high', False),
+    ('trench_percent', 'trench_low_percent', 'trench_high_percent', False),
+    ('hours_per_km', 'hours_low_per_km', 'hours_high_per_km', True),
+    ('fiber_speed_gbps', 'min_fiber_speed_gbps', 'max_fiber_speed_gbps', True),
+    ('node_power_kWh_per_km_gbps', 'node_pwr_low_kWh_per_km_gbps', 
+     'node_pwr_high_kWh_per_km_gbps', False),
+]
+
+EMISSION_CONSTANTS = [
+    ('glass_kg_co2e', 'glass_kg_co2e'),
+    ('pcb_kg_co2e', 'pcb_kg_co2e'),
+    ('steel_kg_co2e', 'steel_kg_co2e'),
+    ('concrete_kg_co2e', 'concrete_kg_co2e'),
+    ('pvc_kg_co2e', 'pvc_kg_co2e'),
+    ('router_kg_co2e', 'olnu_kg_co2e'),
+    ('electricity_kg_co2e', 'electricity_kg_co2e'),
+    ('glass_eolt_kg_co2e', 'glass_eolt_kg_co2e'),
+    ('plastics_factor_kgco2e', 'plastics_factor_kgco2'),
+    ('metals_factor_kgco2e', 'metals_factor_kgco2'),
+    ('diesel_factor_kgco2e', 'diesel_factor_kgco2e'),
+    ('container_ship_kgco2e', 'container_ship_kgco2e'),
+    ('assessment_years', 'assessment_period_year'),
+    ('social_carbon_cost_usd', 'social_carbon_cost_usd'),
+]
+
+# Column order of the emission parameters written out.
+EMISSION_COLUMNS = ['fiber_cable_kg_per_km', 'pcb_kg', 'pvc_kg', 'steel_kg', 
+    'concrete_kg', 'router', 'glass_kg_co2e', 'pcb_kg_co2e', 'steel_kg_co2e', 
+    'concrete_kg_co2e', 'pvc_kg_co2e', 'router_kg_co2e', 'electricity_kg_co2e',
+    'glass_eolt_kg_co2e', 'plastics_factor_kgco2e', 'metals_factor_kgco2e',
+    'diesel_factor_kgco2e', 'container_ship_kgco2e', 'fuel_efficiency', 
+    'truck_fuel_efficiency', 'trench_percent', 'hours_per_km', 
+    'fiber_speed_gbps', 'node_power_kWh_per_km_gbps', 'assessment_years', 
+    'social_carbon_cost_usd', 'decile']
+
+
+def sample_unit(rng, n, dims, method = 'random', engine = None):
+    """
+    This function draws points in the unit hypercube.
+
+    Parameters
+    ----------
+    rng : numpy Generator
+        Seeded random number generator.
+    n : int.
+        Number of points.
+    dims : int.
+        Number of dimensions.
+    method : string
+        'random' for plain Monte Carlo, 'lhs' for Latin hypercube or 'sobol' 
+        for a scrambled Sobol sequence.
+    engine : qmc engine
+        Optional Sobol engine to continue the sequence of an earlier chunk.
+
+    Returns
+    -------
+    sample : numpy array
+        Array of shape (n, dims) with values in [0, 1).
+    """
+    if method == 'random':
+
+        return rng.random((n, dims))
+
+    if method == 'lhs':
+
+        return qmc.LatinHypercube(d = dims, seed = rng).random(n)
+
+    if method == 'sobol':
+
+        if engine is None:
+
+            engine = qmc.Sobol(d = dims, scramble = True, seed = rng)
+
+        return engine.random(n)
+
+    raise ValueError('Unknown sampling method: {}'.format(method))
+
 
-def multinetwork_fiber_costs(i, fiber_params):
+def scale_sample(sample, specs, fiber_params):
     """
-    This function generates random values within the given parameter ranges. 
+    This function maps unit hypercube points onto the parameter ranges.
+
+    Integer parameters are drawn uniformly from the inclusive range, as 
+    random.randint does, and the rest uniformly between the bounds.
 
     Parameters
     ----------
-    i : int.
-        number of iterations
+    sample : numpy array
+        Array of shape (n, len(specs)) with values in [0, 1).
+    specs : list
+        Sampled parameters as (column, low key, high key, integer draw).
     fiber_params : dict
-        Dictionary containing fiber engineering details
-
-    Return
-    ------
-        output : list
-            List containing cost outputs
+        Dictionary containing the parameter ranges.
 
+    Returns
+    -------
+    columns : dict
+        Column name mapped to the array of draws.
     """
-    output = []
-
-    for decile in deciles:
-
-        olt_usd = random.randint(fiber_params['olt_low_usd'], 
-                                fiber_params['olt_high_usd'])
-        
-        otc_usd = random.randint(fiber_params['otc_low_usd'], 
-                                fiber_params['otc_high_usd'])
-        
-        wan_unit_usd = random.randint(fiber_params['wan_unit_low_usd'], 
-                                fiber_params['wan_unit_high_usd'])
-
-        installation_usd = random.randint(fiber_params['installation_low_usd'], 
-                                fiber_params['installation_high_usd'])
-        
-        wdm_usd = random.randint(fiber_params['wdm_low_usd'], 
-                                fiber_params['wdm_high_usd'])
-        
-        other_usd = random.randint(fiber_params['other_low_usd'], 
-                                fiber_params['other_high_usd'])
-        
-        staff_usd = random.randint(fiber_params['staff_low_usd'], 
-                                fiber_params['staff_high_usd'])
-        
-        power_usd = random.randint(fiber_params['power_low_usd'], 
-                                fiber_params['power_high_usd'])
-        
-        regulatory_usd = random.randint(fiber_params['regulatory_low_usd'], 
-                                fiber_params['regulatory_high_usd'])
-        
-        customer_usd = random.randint(fiber_params['customer_low_usd'], 
-                                fiber_params['customer_high_usd'])
-        
-        other_costs_usd = random.randint(fiber_params['other_low_costs_usd'], 
-                                fiber_params['other_high_costs_usd'])
-
-        fiber_speed_gbps = random.randint(fiber_params['min_fiber_speed_gbps'], 
-            fiber_params['max_fiber_speed_gbps'])
-        
-        node_pwr_low_kWh_per_km_gbps = random.uniform(
-            fiber_params['node_pwr_low_kWh_per_km_gbps'], 
-            fiber_params['node_pwr_high_kWh_per_km_gbps'])
-        
-        output.append({
-            'olt_usd' : olt_usd,
-            'otc_usd' : otc_usd,
-            'wan_unit_usd' : wan_unit_usd,
-            'installation_usd' : installation_usd,
-            'wdm_usd' : wdm_usd,
-            'other_usd' : other_usd,
-            'staff_usd' : staff_usd,
-            'power_usd' : power_usd,
-            'regulatory_usd' : regulatory_usd,
-            'customer_usd' : customer_usd,
-            'fiber_speed_gbps' : fiber_speed_gbps,
-            'node_power_kWh_per_km_gbps' : node_pwr_low_kWh_per_km_gbps,
-            'other_costs_usd' : other_costs_usd,
-            'assessment_years' : fiber_params['assessment_period_year'],
-            'discount_rate' : fiber_params['discount_rate_percent'],
-            'decile' : decile
-        })
+    columns = {}
 
+    for j, (column, low_key, high_key, integer) in enumerate(specs):
 
-    return output
+        low, high = fiber_params[low_key], fiber_params[high_key]
+
+        if integer:
 
+            values = np.floor(low + sample[:, j] * (high - low + 1))
+            columns[column] = np.minimum(values, high).astype(np.int64)
 
-def uq_inputs_costs(parameters):
+        else:
+
+            columns[column] = low + sample[:, j] * (high - low)
+
+
+    return columns
+
+
+def iter_parameters(specs, constants, fiber_params, rng, method = 'random', 
+                    chunk_size = 100000):
     """
-    Generate all UQ cost inputs in preparation for running through the 
-    mobile broadband model. 
+    This function generates the UQ parameters of every iteration and decile 
+    in column-oriented chunks of bounded size.
+
+    Rows follow the iteration, then decile order. Sobol chunks continue a 
+    single sequence, while Latin hypercube chunks are each stratified.
 
     Parameters
     ----------
-    parameters : dict
-        dictionary of dictionary containing mobile cost values.
-
+    specs : list
+        Sampled parameters as (column, low key, high key, integer draw).
+    constants : list
+        Fixed parameters as (column, parameter key).
+    fiber_params : dict
+        Dictionary containing the parameter ranges.
+    rng : numpy Generator
+        Seeded random number generator.
+    method : string
+        'random', 'lhs' or 'sobol'.
+    chunk_size : int.
+        Largest number of rows generated at once.
+
+    Yields
+    ------
+    chunk : dataframe
+        Dataframe of parameter draws.
     """
-    iterations = []
+    total = fiber_params['iterations'] * len(deciles)
+    chunk_size = max(len(deciles), chunk_size - chunk_size % len(deciles))
+    engine = None
 
-    for key, fiber_params in parameters.items():
+    if method == 'sobol':
 
-        for i in range(0, fiber_params['iterations']):
+        engine = qmc.Sobol(d = len(specs), scramble = True, seed = rng)
 
-            if key in ['regional']:
-                
-                data = multinetwork_fiber_costs(i, fiber_params)
+    for start in range(0, total, chunk_size):
 
-            iterations = iterations + data
+        n = min(chunk_size, total - start)
 
-    df = pd.DataFrame.from_dict(iterations)
+        yield generate_batch(specs, constants, fiber_params, rng, 
+                             n // len(deciles), deciles, method, engine)
 
-    # Import user data
-    pop_path = os.path.join(DATA_SSA, 'population_connected_fiber.csv') 
-    df1 = pd.read_csv(pop_path)
 
-    filename = 'uq_parameters_cost.csv'
-    folder_out = os.path.join(DATA_RESULTS, 'fiber')
+def generate_batch(specs, constants, fiber_params, rng, iterations, 
+                   batch_deciles, method = 'random', engine = None):
+    """
+    This function generates one batch of UQ parameters for a set of deciles.
 
-    if not os.path.exists(folder_out):
+    Parameters
+    ----------
+    specs : list
+        Sampled parameters as (column, low key, high key, integer draw).
+    constants : list
+        Fixed parameters as (column, parameter key).
+    fiber_params : dict
+        Dictionary containing the parameter ranges.
+    rng : numpy Generator
+        Seeded random number generator.
+    iterations : int.
+        Number of draws per decile.
+    batch_deciles : list
+        Deciles to draw for.
+    method : string
+        'random', 'lhs' or 'sobol'.
+    engine : qmc engine
+        Optional Sobol engine continuing an earlier batch.
+
+    Returns
+    -------
+    batch : dataframe
+        Dataframe of parameter draws in iteration, then decile order.
+    """
+    n = iterations * len(batch_deciles)
+    sample = sample_unit(rng, n, len(specs), method, engine)
+    batch = scale_sample(sample, specs, fiber_params)
 
-        os.makedirs(folder_out)
-    
-    merged_df = pd.merge(df, df1, on = 'decile')
-    path_out = os.path.join(folder_out, filename)
-    merged_df.to_csv(path_out, index = False)
+    for column, key in constants:
 
+        batch[column] = np.full(n, fiber_params[key])
+
+    batch['decile'] = np.tile(batch_deciles, iterations)
 
-    return None
 
+    return pd.DataFrame(batch)
 
-def multinetwork_fiber_emissions(i, fiber_params):
+
+def multinetwork_fiber_costs(fiber_params, rng, method = 'random'):
     """
-    This function generates random values within the given emission ranges. 
+    This function generates random values within the given parameter ranges 
+    for all iterations and deciles at once. 
 
     Parameters
     ----------
-    i : int.
-        number of iterations
-    mobile_params : dict
-        Dictionary containing fiber emission details
+    fiber_params : dict
+        Dictionary containing fiber engineering details
+    rng : numpy Generator
+        Seeded random number generator.
+    method : string
+        'random', 'lhs' or 'sobol'.
 
     Return
     ------
-        output : list
-            List containing emission outputs
+        output : dataframe
+            Dataframe containing cost inputs
 
     """
-    output = []
-
-    for decile in deciles:
-
-        fiber_cable_kg_per_km = random.randint(
-            fiber_params['fiber_cable_low_kg_per_km'], 
-            fiber_params['fiber_cable_high_kg_per_km'])
-
-        pcb_kg = random.uniform(fiber_params['pcb_low_kg'], 
-            fiber_params['pcb_high_kg'])
-        
-        concrete_kg = random.uniform(fiber_params['machine_concrete_low_kg'], 
-            fiber_params['machine_concrete_high_kg'])
-        
-        pvc_kg = random.randint(fiber_params['pvc_low_kg'], 
-            fiber_params['pvc_high_kg'])
-        
-        steel_kg = random.randint(fiber_params['steel_low_kg'], 
-            fiber_params['steel_high_kg'])
-        
-        router = random.randint(fiber_params['low_router'], 
-            fiber_params['high_router'])
-
-        fuel_efficiency = random.uniform(fiber_params['fuel_efficiency_low'], 
-            fiber_params['fuel_efficiency_high'])
-        
-        hours_per_km = random.randint(fiber_params['hours_low_per_km'], 
-            fiber_params['hours_high_per_km'])
-        
-        fiber_speed_gbps = random.randint(fiber_params['min_fiber_speed_gbps'], 
-            fiber_params['max_fiber_speed_gbps'])
-        
-        node_power_kWh_per_km_gbps = random.uniform(
-            fiber_params['node_pwr_low_kWh_per_km_gbps'], 
-            fiber_params['node_pwr_high_kWh_per_km_gbps'])
-        
-        truck_fuel_efficiency = random.uniform(
-            fiber_params['truck_fuel_efficiency_low'], 
-            fiber_params['truck_fuel_efficiency_high'])
-        
-        trench_percent = random.uniform(
-            fiber_params['trench_low_percent'], 
-            fiber_params['trench_high_percent'])
-        
-        output.append({
-            'fiber_cable_kg_per_km' : fiber_cable_kg_per_km,
-            'pcb_kg' : pcb_kg,
-            'pvc_kg' : pvc_kg,
-            'steel_kg' : steel_kg,
-            'concrete_kg' : concrete_kg,
-            'router' : router,
-            'glass_kg_co2e' : fiber_params['glass_kg_co2e'],
-            'pcb_kg_co2e' : fiber_params['pcb_kg_co2e'],
-            'steel_kg_co2e' : fiber_params['steel_kg_co2e'],
-            'concrete_kg_co2e' : fiber_params['concrete_kg_co2e'],
-            'pvc_kg_co2e' : fiber_params['pvc_kg_co2e'],
-            'router_kg_co2e' : fiber_params['olnu_kg_co2e'],
-            'electricity_kg_co2e' : fiber_params['electricity_kg_co2e'],
-            'glass_eolt_kg_co2e' : fiber_params['glass_eolt_kg_co2e'],
-            'plastics_factor_kgco2e' : fiber_params['plastics_factor_kgco2'],
-            'metals_factor_kgco2e' : fiber_params['metals_factor_kgco2'],
-            'diesel_factor_kgco2e' : fiber_params['diesel_factor_kgco2e'],
-            'container_ship_kgco2e' : fiber_params['container_ship_kgco2e'],
-            'fuel_efficiency' : fuel_efficiency,
-            'truck_fuel_efficiency' : truck_fuel_efficiency,
-            'trench_percent' : trench_percent,
-            'hours_per_km' : hours_per_km,
-            'fiber_speed_gbps' : fiber_speed_gbps,
-            'node_power_kWh_per_km_gbps' : node_power_kWh_per_km_gbps,
-            'assessment_years' : fiber_params['assessment_period_year'],
-            'social_carbon_cost_usd' : fiber_params['social_carbon_cost_usd'],
-            'decile' : decile,
-        })
+    output = pd.concat(iter_parameters(COST_SPECS, COST_CONSTANTS, 
+        fiber_params, rng, method, chunk_size = fiber_params['iterations'] * 
+        len(deciles)), ignore_index = True)
 
 
     return output
 
 
-def uq_inputs_emissions(parameters):
+def multinetwork_fiber_emissions(fiber_params, rng, method = 'random'):
     """
-    Generate all UQ emission inputs in preparation for running through the 
-    fiber broadband model. 
+    This function generates random values within the given emission ranges 
+    for all iterations and deciles at once. 
 
     Parameters
     ----------
-    parameters : dict
-        dictionary of dictionary containing fiber emission values.
+    fiber_params : dict
+        Dictionary containing fiber emission details
+    rng : numpy Generator
+        Seeded random number generator.
+    method : string
+        'random', 'lhs' or 'sobol'.
+
+    Return
+    ------
+        output : dataframe
+            Dataframe containing emission inputs
 
     """
-    iterations = []
+    output = pd.concat(iter_parameters(EMISSION_SPECS, EMISSION_CONSTANTS, 
+        fiber_params, rng, method, chunk_size = fiber_params['iterations'] * 
+        len(deciles)), ignore_index = True)
 
-    for key, fiber_params in parameters.items():
 
-        for i in range(0, fiber_params['iterations']):
+    return output[EMISSION_COLUMNS]
 
-            if key in ['regional']:
-                
-                data = multinetwork_fiber_emissions(i, fiber_params)
 
-            iterations = iterations + data
+def write_uq_inputs(parameters, specs, constants, filename, method = 'random', 
+                    chunk_size = 100000, columns = None):
+    """
+    This function streams UQ inputs, merged with the decile user data, to a 
+    csv file chunk by chunk.
 
-    df = pd.DataFrame.from_dict(iterations)
+    Parameters
+    ----------
+    parameters : dict
+        dictionary of dictionary containing fiber values.
+    specs : list
+        Sampled parameters as (column, low key, high key, integer draw).
+    constants : list
+        Fixed parameters as (column, parameter key).
+    filename : string
+        Name of the output csv file.
+    method : string
+        'random', 'lhs' or 'sobol'.
+    chunk_size : int.
+        Largest number of rows held in memory.
+    columns : list
+        Optional column order of the parameters.
+
+    """
     pop_path = os.path.join(DATA_SSA, 'population_connected_fiber.csv') 
     df1 = pd.read_csv(pop_path)
 
-    filename = 'uq_parameters_emission.csv'
     folder_out = os.path.join(DATA_RESULTS, 'fiber')
 
     if not os.path.exists(folder_out):
 
         os.makedirs(folder_out)
 
-    merged_df = pd.merge(df, df1, on = 'decile')
     path_out = os.path.join(folder_out, filename)
-    merged_df.to_csv(path_out, index = False)
+    header = True
+
+    for key, fiber_params in parameters.items():
+
+        if not key in ['regional']:
+
+            continue
+
+        rng = np.random.default_rng(fiber_params['seed_value'])
+
+        for df in iter_parameters(specs, constants, fiber_params, rng, method, 
+                                  chunk_size):
+
+            if columns is not None:
+
+                df = df[columns]
+
+            merged_df = pd.merge(df, df1, on = 'decile')
+            merged_df.to_csv(path_out, index = False, 
+                             mode = 'w' if header else 'a', header = header)
+            header = False
+
+
+    return None
+
+
+def uq_inputs_costs(parameters, method = 'random', chunk_size = 100000):
+    """
+    Generate all UQ cost inputs in preparation for running through the 
+    mobile broadband model. 
+
+    Parameters
+    ----------
+    parameters : dict
+        dictionary of dictionary containing mobile cost values.
+    method : string
+        'random', 'lhs' or 'sobol'.
+    chunk_size : int.
+        Largest number of rows held in memory.
+
+    """
+    write_uq_inputs(parameters, COST_SPECS, COST_CONSTANTS, 
+                    'uq_parameters_cost.csv', method, chunk_size)
+
+
+    return None
+
+
+def uq_inputs_emissions(parameters, method = 'random', chunk_size = 100000):
+    """
+    Generate all UQ emission inputs in preparation for running through the 
+    fiber broadband model. 
+
+    Parameters
+    ----------
+    parameters : dict
+        dictionary of dictionary containing fiber emission values.
+    method : string
+        'random', 'lhs' or 'sobol'.
+    chunk_size : int.
+        Largest number of rows held in memory.
+
+    """
+    write_uq_inputs(parameters, EMISSION_SPECS, EMISSION_CONSTANTS, 
+                    'uq_parameters_emission.csv', method, chunk_size, 
+                    EMISSION_COLUMNS)
 
 
     return None
@@ -292,11 +429,10 @@ def uq_inputs_emissions(parameters):
 
 if __name__ == '__main__':
 
-    print('Setting seed for consistent results')
-    random.seed(10)
+    print('Seeding the generator from seed_value for consistent results')
 
     print('Running uq_cost_inputs_generator()')
     #uq_inputs_costs(parameters)
 
     print('Running uq_inputs_emissions_generator()')
-    #uq_inputs_emissions(parameters)
\ No newline at end of file
+    #uq_inputs_emissions(parameters)
@@ -0,0 +1,189 @@
+"""
+Global sensitivity analysis of the fiber broadband cost and emissions models.
+
+Written by Bonface Osoro & Ed Oughton.
+
+"""
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from glassfibre.sensitivity import (saltelli_sample, iter_saltelli_batches,
+                                    sensitivity_table)
+from inputs import parameters
+from fiber_montecarlo import (COST_SPECS, COST_CONSTANTS, EMISSION_SPECS,
+                              EMISSION_CONSTANTS, deciles, sample_unit,
+                              scale_sample)
+from run_fiber_model import (SSA_RESULTS, calculate_costs, calculate_emissions,
+                             cost_decile_inputs, emission_decile_inputs)
+pd.options.mode.chained_assignment = None
+
+OUTPUTS = ['per_user_tco', 'total_cost_ownership', 'total_emissions_ghg_kg',
+           'user_emissions_kg_per_user']
+
+
+def sensitivity_specs():
+    """
+    This function combines the cost and emission parameter ranges, keeping
+    parameters shared by both models once.
+
+    Returns
+    -------
+    specs : list
+        Sampled parameters as (column, low key, high key, integer draw).
+    constants : list
+        Fixed parameters as (column, parameter key).
+    """
+    specs = list(COST_SPECS)
+    names = [spec[0] for spec in specs]
+    specs += [spec for spec in EMISSION_SPECS if spec[0] not in names]
+
+    constants = list(COST_CONSTANTS)
+    names = [constant[0] for constant in constants]
+    constants += [constant for constant in EMISSION_CONSTANTS
+                  if constant[0] not in names]
+
+
+    return specs, constants
+
+
+def evaluate_decile(job):
+    """
+    This function runs the Saltelli sample of one decile through the cost
+    and emissions models in batches and estimates the Sobol indices of
+    every strategy and algorithm.
+
+    Parameters
+    ----------
+    job : tuple
+        Decile, seed sequence, fiber parameters, decile inputs, number of
+        base samples, sampling method and batch size.
+
+    Returns
+    -------
+    df : dataframe
+        Sobol indices of the decile.
+    """
+    decile, seed, fiber_params, decile_inputs, n, method, batch_size = job
+    specs, constants = sensitivity_specs()
+    names = [spec[0] for spec in specs]
+    rng = np.random.default_rng(seed)
+
+    a, b = saltelli_sample(lambda n, dims: sample_unit(rng, n, dims, method),
+                           n, len(specs))
+    groups = decile_inputs[['strategy', 'algorithm']].drop_duplicates()
+    outputs = {}
+
+    for batch in iter_saltelli_batches(a, b, batch_size):
+
+        draws = pd.DataFrame(scale_sample(batch, specs, fiber_params))
+        draws['draw'] = np.arange(len(draws))
+        draws['decile'] = decile
+
+        for column, key in constants:
+
+            draws[column] = fiber_params[key]
+
+        df = pd.merge(draws, decile_inputs, on = 'decile', how = 'inner')
+        df = df.sort_values(['strategy', 'algorithm', 'draw'],
+                            kind = 'stable')
+        costs = calculate_costs(df)
+        emissions = calculate_emissions(df)
+        results = pd.concat([costs[['strategy', 'algorithm', 'per_user_tco',
+                                    'total_cost_ownership']],
+                             emissions[['total_emissions_ghg_kg',
+                                        'user_emissions_kg_per_user']]],
+                            axis = 1)
+
+        for group, values in results.groupby(['strategy', 'algorithm'],
+                                             sort = False):
+
+            for output in OUTPUTS:
+
+                outputs.setdefault(group, {}).setdefault(output, []).append(
+                    values[output].values)
+
+    tables = []
+    for strategy, algorithm in groups.itertuples(index = False):
+
+        group_outputs = {output: np.concatenate(values) for output, values
+                         in outputs[(strategy, algorithm)].items()}
+        table = sensitivity_table(group_outputs, names, n)
+        table.insert(0, 'algorithm', algorithm)
+        table.insert(0, 'strategy', strategy)
+        table.insert(0, 'decile', decile)
+        tables.append(table)
+
+
+    return pd.concat(tables, ignore_index = True)
+
+
+def run_sensitivity(parameters, n = 1024, method = 'sobol', workers = None,
+                    batch_size = 100000):
+    """
+    Estimate first-order and total Sobol indices of the fiber cost and
+    emission outputs for every decile, strategy and algorithm.
+
+    Deciles are evaluated in parallel, each in batches of whole Saltelli
+    matrices, so N * (k + 2) evaluations per decile fit in bounded memory.
+
+    Parameters
+    ----------
+    parameters : dict
+        dictionary of dictionary containing fiber values.
+    n : int
+        Number of Saltelli base samples, ideally a power of two.
+    method : string
+        'random', 'lhs' or 'sobol'.
+    workers : int
+        Number of worker processes, 1 runs the deciles serially.
+    batch_size : int
+        Largest number of parameter draws evaluated at once.
+
+    """
+    fiber_params = parameters['regional']
+    users = pd.read_csv(os.path.join(SSA_RESULTS,
+                                     'population_connected_fiber.csv'))
+    inputs = pd.merge(users, cost_decile_inputs(), on = 'decile',
+                      how = 'inner')
+    emission_inputs = emission_decile_inputs()
+    missing = [column for column in emission_inputs.columns
+               if column not in inputs.columns]
+    if missing:
+
+        inputs = pd.merge(inputs, emission_inputs[['decile'] + missing],
+                          on = 'decile', how = 'inner')
+
+    seeds = np.random.SeedSequence(fiber_params['seed_value']).spawn(
+        len(deciles))
+
+    jobs = [(decile, seed, fiber_params, inputs[inputs['decile'] == decile],
+             n, method, batch_size) for decile, seed in zip(deciles, seeds)]
+
+    if workers == 1:
+
+        tables = [evaluate_decile(job) for job in jobs]
+
+    else:
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+
+            tables = list(executor.map(evaluate_decile, jobs))
+
+    df = pd.concat(tables, ignore_index = True)
+
+    if not os.path.exists(SSA_RESULTS):
+
+        os.makedirs(SSA_RESULTS)
+
+    path_out = os.path.join(SSA_RESULTS, 'SSA_fiber_sobol_indices.csv')
+    df.to_csv(path_out, index = False)
+
+
+    return None
+
+
+if __name__ == '__main__':
+
+    print('Running fiber broadband global sensitivity analysis')
+    run_sensitivity(parameters)
@@ -64,6 +64,9 @@ parameters = {
         'fiber_point_pwr_high_kwh' : 8,
         'social_carbon_cost_usd' : 75,
         'iterations' : 50,
+        'rse_tolerance' : 0.005,
+        'batch_iterations' : 500,
+        'max_iterations' : 50000,
         'seed_value' : 42,
         'mu' : 2, 
         'sigma' : 10,
@@ -1,23 +1,53 @@
+"""
+Pipeline runner for the network planning and preprocessing stages.
+
+Countries are processed in parallel in a process pool, with the stages of
+each country run in dependency order. Completed stages are recorded in a
+per-country status file so an interrupted run resumes where it stopped,
+and the outputs of the settlement and routing stages are cached on their
+inputs and parameters so only stages affected by a change are rerun.
+
+Usage
+-----
+python run_all.py --stages create_routing_buffer_zone --iso3 RWA KEN
+python run_all.py --workers 16 --memory-gb 12
+python run_all.py --storage flatgeobuf --iso3 RWA
+python run_all.py --stages generate_street_graph --iso3 RWA
+python run_all.py --routing road --iso3 RWA
+python run_all.py --stages export_shapefiles --iso3 KEN
+python run_all.py --list
+
+"""
+import argparse
 import configparser
+import json
 import os
+import time
+import traceback
 import warnings
 import pandas as pd
-from glassfibre.preprocessing import (ProcessCountry, ProcessRegions, 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glassfibre.preprocessing import (ProcessCountry, ProcessRegions,
                                       ProcessPopulation)
 
+from glassfibre.cache import StageCache, expand_paths, remove_outputs
 from glassfibre.fiber_process import FiberProcess
-from glassfibre.netPlanning import(process_regional_settlement_tifs, 
-    process_access_settlement_tifs, generate_access_settlement_lut, 
+from glassfibre.netPlanning import(process_regional_settlement_tifs,
+    process_access_settlement_tifs, generate_access_settlement_lut,
     generate_regional_settlement_lut, generate_agglomeration_lut,
     find_largest_regional_settlement, get_settlement_routing_paths,
     create_regions_to_model, create_routing_buffer_zone, create_region_nodes,
     fit_regional_node_edges, combine_access_nodes, combine_access_edges,
     combine_pcsf_access_edges, combine_pcsf_regional_nodes,
     generate_access_csv, combine_regional_nodes, combine_regional_edges,
-    generate_regional_csv, generate_existing_fiber_csv, 
+    generate_regional_csv, generate_existing_fiber_csv,
     generate_pcsf_regional_csv, generate_pcsf_access_csv)
-from glassfibre.street_data import(generate_region_nodes, 
-                                   generate_sub_region_nodes)
+from glassfibre.storage import FORMATS, get_storage_format, export_shapefiles
+from glassfibre.pcst import solve_pcsf
+from glassfibre.road_routing import ROUTING_MODES, get_routing_mode
+from glassfibre.street_data import(generate_region_nodes,
+                                   generate_sub_region_nodes,
+                                   generate_street_graph)
 
 pd.options.mode.chained_assignment = None
 warnings.filterwarnings('ignore')
@@ -34,68 +64,675 @@ DATA_RESULTS = os.path.join(BASE_PATH, '..', 'results', 'final')
 path = os.path.join(DATA_RAW, 'countries.csv')
 pop_tif_loc = os.path.join(DATA_RAW, 'WorldPop', 'ppp_2020_1km_Aggregated.tif')
 
-countries = pd.read_csv(path, encoding = 'utf-8-sig')
-
-for idx, country in countries.iterrows():
-        
-    if not country['region'] == 'Sub-Saharan Africa' or country['Exclude'] == 1:
-        
-    #if not country['iso3'] == 'RWA':
-        
-        continue 
-   
-    country = ProcessCountry(path, countries['iso3'].loc[idx])
-    #country.process_country_shapes()
-
-    regions = ProcessRegions(countries['iso3'].loc[idx], 
-                             countries['lowest'].loc[idx])
-    #regions.process_regions()
-    #regions.process_sub_region_boundaries()
-
-    populations = ProcessPopulation(path, countries['iso3'].loc[idx], 
-                                    countries['lowest'].loc[idx], pop_tif_loc)
-    #opulations.process_national_population()
-    #populations.process_population_tif()
-    
-    fiber_processor = FiberProcess(countries['iso3'].loc[idx], 
-                                   countries['iso2'].loc[idx], path)
-    '''fiber_processor.process_existing_fiber()
+
+def process_country_shapes(country, workers):
+
+    ProcessCountry(path, country['iso3']).process_country_shapes()
+
+
+def process_regions(country, workers):
+
+    ProcessRegions(country['iso3'], country['lowest']).process_regions()
+
+
+def process_sub_region_boundaries(country, workers):
+
+    regions = ProcessRegions(country['iso3'], country['lowest'])
+    regions.process_sub_region_boundaries()
+
+
+def process_national_population(country, workers):
+
+    populations = ProcessPopulation(path, country['iso3'], country['lowest'],
+                                    pop_tif_loc)
+    populations.process_national_population()
+
+
+def process_population_tif(country, workers):
+
+    populations = ProcessPopulation(path, country['iso3'], country['lowest'],
+                                    pop_tif_loc)
+    populations.process_population_tif()
+
+
+def process_existing_fiber(country, workers):
+
+    fiber_processor = FiberProcess(country['iso3'], country['iso2'], path)
+    fiber_processor.process_existing_fiber()
+
+
+def find_nodes_on_existing_infrastructure(country, workers):
+
+    fiber_processor = FiberProcess(country['iso3'], country['iso2'], path)
     fiber_processor.find_nodes_on_existing_infrastructure()
-    
-    process_regional_settlement_tifs(country)
-    process_access_settlement_tifs(country)
-    generate_access_settlement_lut(country)
-    generate_regional_settlement_lut(country)
-
-    generate_agglomeration_lut(country)
-    find_largest_regional_settlement(country)
-    get_settlement_routing_paths(country)
-    create_regions_to_model(country)
-    create_routing_buffer_zone(country)'''
-
-    #create_region_nodes(countries['iso3'].loc[idx])
-    #fit_regional_node_edges(countries['iso3'].loc[idx])
-   
-    #combine_access_nodes(countries['iso3'].loc[idx])
-    #combine_access_edges(countries['iso3'].loc[idx])
-    #generate_access_csv(countries['iso3'].loc[idx])
-
-    #combine_regional_nodes(countries['iso3'].loc[idx])
-    #combine_regional_edges(countries['iso3'].loc[idx])
-    #generate_regional_csv(countries['iso3'].loc[idx])
-    #generate_existing_fiber_csv(countries['iso3'].loc[idx])
-
-    #download_street_data(countries['iso3'].loc[idx])
-    #combine_street_csv(countries['iso3'].loc[idx])
-    #generate_street_shapefile(countries['iso3'].loc[idx])
-    #process_region_street(countries['iso3'].loc[idx])
-    #process_subregion_street(countries['iso3'].loc[idx])
-
-    #generate_region_nodes(countries['iso3'].loc[idx])
-    #generate_sub_region_nodes(countries['iso3'].loc[idx])
-
-    #combine_pcsf_access_edges(countries['iso3'].loc[idx])
-    #combine_pcsf_regional_nodes(countries['iso3'].loc[idx])
-
-    #generate_pcsf_regional_csv(countries['iso3'].loc[idx])
-    #generate_pcsf_access_csv(countries['iso3'].loc[idx])
\ No newline at end of file
+
+
+def export_country_shapefiles(country, workers):
+    """
+    Export the GeoParquet and FlatGeobuf layers of a country to Shapefiles
+    for the QGIS projects in vis/.
+
+    """
+    for folder in [DATA_PROCESSED, DATA_RESULTS]:
+
+        export_shapefiles(os.path.join(folder, country['iso3']))
+
+
+def by_country(function):
+    """
+    Wrap a stage taking the country dict.
+
+    """
+    return lambda country, workers: function(country)
+
+
+def by_iso3(function):
+    """
+    Wrap a stage taking the country ISO3 code.
+
+    """
+    return lambda country, workers: function(country['iso3'])
+
+
+# Pipeline stages in run order, each with the stages it depends on.
+STAGES = [
+    ('process_country_shapes', process_country_shapes, []),
+    ('process_regions', process_regions, ['process_country_shapes']),
+    ('process_sub_region_boundaries', process_sub_region_boundaries,
+     ['process_regions']),
+    ('process_national_population', process_national_population,
+     ['process_country_shapes']),
+    ('process_population_tif', process_population_tif,
+     ['process_national_population', 'process_regions']),
+    ('process_existing_fiber', process_existing_fiber,
+     ['process_country_shapes']),
+    ('find_nodes_on_existing_infrastructure',
+     find_nodes_on_existing_infrastructure,
+     ['process_existing_fiber', 'process_population_tif']),
+    ('process_regional_settlement_tifs',
+     by_country(process_regional_settlement_tifs),
+     ['process_population_tif']),
+    ('process_access_settlement_tifs',
+     by_country(process_access_settlement_tifs), ['process_population_tif']),
+    ('generate_access_settlement_lut',
+     by_country(generate_access_settlement_lut),
+     ['process_access_settlement_tifs']),
+    ('generate_regional_settlement_lut',
+     by_country(generate_regional_settlement_lut),
+     ['process_regional_settlement_tifs']),
+    ('generate_agglomeration_lut', by_country(generate_agglomeration_lut),
+     ['process_population_tif']),
+    ('find_largest_regional_settlement',
+     by_country(find_largest_regional_settlement),
+     ['generate_agglomeration_lut', 'generate_access_settlement_lut']),
+    ('get_settlement_routing_paths', by_country(get_settlement_routing_paths),
+     ['find_largest_regional_settlement',
+      'generate_regional_settlement_lut']),
+    ('create_regions_to_model', by_country(create_regions_to_model),
+     ['get_settlement_routing_paths']),
+    ('create_routing_buffer_zone', lambda country, workers:
+     create_routing_buffer_zone(country, workers),
+     ['create_regions_to_model']),
+    ('create_region_nodes', by_iso3(create_region_nodes),
+     ['generate_regional_settlement_lut']),
+    ('fit_regional_node_edges', by_iso3(fit_regional_node_edges),
+     ['create_region_nodes']),
+    ('combine_access_nodes', by_iso3(combine_access_nodes),
+     ['create_routing_buffer_zone']),
+    ('combine_access_edges', by_iso3(combine_access_edges),
+     ['create_routing_buffer_zone']),
+    ('generate_access_csv', by_iso3(generate_access_csv),
+     ['combine_access_nodes', 'combine_access_edges']),
+    ('combine_regional_nodes', by_iso3(combine_regional_nodes),
+     ['create_region_nodes']),
+    ('combine_regional_edges', by_iso3(combine_regional_edges),
+     ['fit_regional_node_edges']),
+    ('generate_regional_csv', by_iso3(generate_regional_csv),
+     ['combine_regional_nodes', 'combine_regional_edges']),
+    ('generate_existing_fiber_csv', by_iso3(generate_existing_fiber_csv),
+     ['find_nodes_on_existing_infrastructure']),
+    ('generate_region_nodes', by_iso3(generate_region_nodes),
+     ['combine_access_nodes']),
+    ('solve_pcsf', by_iso3(solve_pcsf), ['generate_region_nodes']),
+    ('combine_pcsf_access_edges', by_iso3(combine_pcsf_access_edges),
+     ['solve_pcsf']),
+    ('combine_pcsf_regional_nodes', by_iso3(combine_pcsf_regional_nodes),
+     ['solve_pcsf']),
+    ('generate_sub_region_nodes', by_iso3(generate_sub_region_nodes),
+     ['generate_access_settlement_lut', 'combine_pcsf_regional_nodes']),
+    ('generate_pcsf_regional_csv', by_iso3(generate_pcsf_regional_csv),
+     ['combine_pcsf_regional_nodes']),
+    ('generate_pcsf_access_csv', by_iso3(generate_pcsf_access_csv),
+     ['combine_pcsf_access_edges']),
+    ('export_shapefiles', export_country_shapefiles, []),
+    ('generate_street_graph', by_iso3(generate_street_graph), []),
+]
+
+# Stages only run when requested, and rerun every time they are.
+OPTIONAL_STAGES = ['export_shapefiles', 'generate_street_graph']
+
+# Stages whose outputs are cached, keyed on their input files and the
+# country parameters they depend on. Paths are relative to the country
+# folder and formatted with the country metadata.
+POPULATION = os.path.join('population', 'national',
+                          'ppp_2020_1km_Aggregated.tif')
+REGIONS = os.path.join('regions', 'regions_{lowest}_{iso3}.shp')
+ROUTING = 'network_routing_structure'
+CACHED = {
+    'process_regional_settlement_tifs': {
+        'inputs': [os.path.join('regions', 'regions_1_{iso3}.shp'),
+                   POPULATION],
+        'outputs': [os.path.join('settlements', 'reg_tifs')],
+        'params': []},
+    'process_access_settlement_tifs': {
+        'inputs': [REGIONS, POPULATION],
+        'outputs': [os.path.join('settlements', 'tifs')],
+        'params': ['lowest']},
+    'generate_access_settlement_lut': {
+        'inputs': [REGIONS, os.path.join('settlements', 'tifs')],
+        'outputs': [os.path.join('settlements', 'access_settlements.shp'),
+                    os.path.join(ROUTING, 'access_nodes.shp'),
+                    os.path.join(ROUTING, 'access_settlements.csv')],
+        'params': ['lowest', 'pop_density_km2', 'settlement_size',
+                   'main_settlement_size']},
+    'generate_regional_settlement_lut': {
+        'inputs': [os.path.join('regions', 'regions_1_{iso3}.shp'),
+                   os.path.join('settlements', 'reg_tifs')],
+        'outputs': [os.path.join('settlements', 'regional_settlements.shp'),
+                    os.path.join(ROUTING, 'regional_nodes.shp'),
+                    os.path.join(ROUTING, 'regional_settlements.csv')],
+        'params': ['pop_density_km2', 'settlement_size',
+                   'main_settlement_size']},
+    'generate_agglomeration_lut': {
+        'inputs': [REGIONS, POPULATION],
+        'outputs': ['agglomerations'],
+        'params': ['lowest', 'gid_region', 'pop_density_km2',
+                   'settlement_size']},
+    'find_largest_regional_settlement': {
+        'inputs': [os.path.join('settlements', 'access_settlements.shp')],
+        'outputs': [os.path.join(ROUTING, 'largest_regional_settlements.shp')],
+        'params': ['lowest']},
+    'get_settlement_routing_paths': {
+        'inputs': [os.path.join(ROUTING, 'largest_regional_settlements.shp'),
+                   os.path.join(ROUTING, 'regional_nodes.shp')],
+        'outputs': [os.path.join(ROUTING, 'settlement_routing.shp')],
+        'params': ['lowest', 'main_settlement_size']},
+    'create_regions_to_model': {
+        'inputs': [REGIONS, os.path.join(ROUTING, 'settlement_routing.shp')],
+        'outputs': [os.path.join('modeling_regions', 'modeling_regions.shp')],
+        'params': ['lowest']},
+    'create_routing_buffer_zone': {
+        'inputs': [os.path.join('settlements', 'access_settlements.shp'),
+                   os.path.join('modeling_regions', 'modeling_regions.shp')],
+        'outputs': ['buffer_routing_zones', 'modeling_regions'],
+        'exclude': [os.path.join('modeling_regions', 'modeling_regions.*')],
+        'params': ['lowest'],
+        'routing': [os.path.join('street_graph', '*')]},
+}
+CACHE_ROOT = os.path.join(BASE_PATH, '..', 'results', 'cache')
+
+STAGE_NAMES = [name for name, function, dependencies in STAGES]
+DEFAULT_STAGES = [name for name in STAGE_NAMES if name not in OPTIONAL_STAGES]
+STAGE_FUNCTIONS = {name: function for name, function, dependencies in STAGES}
+STAGE_DEPENDENCIES = {name: dependencies for name, function, dependencies
+                      in STAGES}
+STAGE_DEPENDENTS = {name: [other for other, function, dependencies in STAGES
+                           if name in dependencies] for name in STAGE_NAMES}
+
+
+def status_path(iso3):
+    """
+    This function returns the path of the stage status file of a country.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country ISO3 code
+
+    Returns
+    -------
+    path : string
+        Path to the status file.
+
+    """
+    folder = os.path.join(DATA_PROCESSED, iso3)
+    if not os.path.exists(folder):
+
+        os.makedirs(folder)
+
+
+    return os.path.join(folder, 'pipeline_status.json')
+
+
+def load_status(iso3):
+    """
+    This function loads the completed stages of a country.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country ISO3 code
+
+    Returns
+    -------
+    status : dict
+        Stage names mapped to their completion record.
+
+    """
+    path_status = status_path(iso3)
+    if not os.path.exists(path_status):
+
+        return {}
+
+    with open(path_status) as source:
+
+        status = json.load(source)
+
+
+    return status
+
+
+def save_status(iso3, status):
+    """
+    This function atomically writes the stage status of a country.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country ISO3 code
+    status : dict
+        Stage names mapped to their completion record.
+
+    """
+    path_status = status_path(iso3)
+    path_temp = path_status + '.tmp'
+
+    with open(path_temp, 'w') as sink:
+
+        json.dump(status, sink, indent = 2)
+
+    os.replace(path_temp, path_status)
+
+
+def resolve_stages(requested, completed, force = False):
+    """
+    This function expands the requested stages with any missing
+    dependencies and orders them for execution.
+
+    Parameters
+    ----------
+    requested : list
+        Stage names requested on the command line.
+    completed : set
+        Stages already completed for the country.
+    force : bool
+        Rerun requested stages even if they are completed.
+
+    Returns
+    -------
+    stages : list
+        Stage names to run, in pipeline order.
+
+    """
+    to_run = set()
+    pending = list(requested)
+
+    while pending:
+
+        stage = pending.pop()
+        if stage in to_run:
+
+            continue
+
+        if stage in completed and not (force and stage in requested):
+
+            continue
+
+        to_run.add(stage)
+        pending.extend(STAGE_DEPENDENCIES[stage])
+
+
+    return [stage for stage in STAGE_NAMES if stage in to_run]
+
+
+def stale_dependents(stage, status, rekeyed = ()):
+    """
+    This function finds the completed stages downstream of a stage whose
+    outputs changed.
+
+    Parameters
+    ----------
+    stage : string
+        Stage whose outputs changed.
+    status : dict
+        Stage names mapped to their completion record.
+    rekeyed : list
+        Stages that check the key of their own inputs when run, so the
+        search does not continue past them.
+
+    Returns
+    -------
+    stale : set
+        Completed stages depending on the stage, directly or not.
+
+    """
+    stale = set()
+    pending = list(STAGE_DEPENDENTS[stage])
+
+    while pending:
+
+        dependent = pending.pop()
+        if dependent in stale:
+
+            continue
+
+        stale.add(dependent)
+        if dependent not in rekeyed:
+
+            pending.extend(STAGE_DEPENDENTS[dependent])
+
+
+    return {dependent for dependent in stale if dependent in status}
+
+
+def limit_memory(memory_gb):
+    """
+    This function caps the address space of a worker process.
+
+    Parameters
+    ----------
+    memory_gb : float
+        Memory cap in gigabytes, no cap when None.
+
+    """
+    if memory_gb is None:
+
+        return None
+
+    try:
+
+        import resource
+
+    except ImportError:
+
+        print('Memory caps are not supported on this platform')
+
+        return None
+
+    limit = int(memory_gb * 1024 ** 3)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+    return None
+
+
+def run_country(country, requested, force = False, workers = 1,
+                cache_gb = None):
+    """
+    This function runs the requested stages of a country, recording each
+    completed stage so that a failed run can be resumed.
+
+    Cached stages are rerun only when the key of their inputs and
+    parameters changed, and are restored from the cache when an earlier
+    run already produced outputs for that key. When their key changed,
+    the completed stages depending on them are rerun as well.
+
+    Parameters
+    ----------
+    country : dict
+        Contains all country-specific information for modeling.
+    requested : list
+        Stage names to run.
+    force : bool
+        Rerun requested stages even if they are completed.
+    workers : int
+        Worker processes available to stages that parallelize internally.
+    cache_gb : float
+        Disk budget of the stage cache, no caching when None.
+
+    Returns
+    -------
+    result : dict
+        Country ISO3 code, stages run and the error raised, if any.
+
+    """
+    iso3 = country['iso3']
+    base = os.path.join(DATA_PROCESSED, iso3)
+    status = load_status(iso3)
+    cache = None
+    completed = set(status) - set(OPTIONAL_STAGES)
+
+    if cache_gb is not None:
+
+        cache = StageCache(CACHE_ROOT, cache_gb, os.path.join(base,
+                           'file_hashes.json'))
+        completed -= set(CACHED)
+
+    stages = resolve_stages(requested, completed, force)
+    result = {'iso3': iso3, 'stages': [], 'error': None}
+
+    position = 0
+
+    while position < len(stages):
+
+        stage = stages[position]
+        position += 1
+        start = time.time()
+        spec = CACHED.get(stage) if cache is not None else None
+        key = None
+
+        try:
+
+            if spec is not None:
+
+                inputs = [pattern.format(**country) for pattern in
+                          spec['inputs']]
+                outputs = [pattern.format(**country) for pattern in
+                           spec['outputs']]
+                exclude = [pattern.format(**country) for pattern in
+                           spec.get('exclude', [])]
+                params = {name: country[name] for name in spec['params']}
+                params['storage'] = get_storage_format()
+
+                if 'routing' in spec:
+
+                    # Road routing also depends on the street graph.
+                    params['routing'] = get_routing_mode()
+                    if params['routing'] == 'road':
+
+                        inputs += [pattern.format(**country) for pattern in
+                                   spec['routing']]
+
+                key = cache.key(stage, base, inputs, params)
+                rerun = force and stage in requested
+
+                if (not rerun and status.get(stage, {}).get('key') == key
+                    and expand_paths(base, outputs, exclude)):
+
+                    print('{}: {} is up to date'.format(iso3, stage))
+                    continue
+
+                if not rerun and cache.restore(key, base):
+
+                    print('{}: restored {} from cache'.format(iso3, stage))
+
+                else:
+
+                    remove_outputs(expand_paths(base, outputs, exclude))
+                    print('{}: running {}'.format(iso3, stage))
+                    STAGE_FUNCTIONS[stage](country, workers)
+                    cache.store(key, base, expand_paths(base, outputs,
+                                                        exclude))
+
+                if key != status.get(stage, {}).get('key'):
+
+                    # Later stages were built from the previous outputs.
+                    stale = stale_dependents(stage, status, CACHED)
+                    for dependent in stale - set(CACHED):
+
+                        del status[dependent]
+
+                    remaining = set(stages[position:]) | stale
+                    stages = stages[:position] + [name for name in
+                        STAGE_NAMES if name in remaining]
+
+            else:
+
+                print('{}: running {}'.format(iso3, stage))
+                STAGE_FUNCTIONS[stage](country, workers)
+
+        except Exception:
+
+            result['error'] = '{} failed:\n{}'.format(stage,
+                                                     traceback.format_exc())
+
+            return result
+
+        status[stage] = {
+            'completed': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'seconds': round(time.time() - start, 1),
+            'key': key}
+        save_status(iso3, status)
+        result['stages'].append(stage)
+
+
+    return result
+
+
+def select_countries(iso3 = None):
+    """
+    This function selects the countries to run.
+
+    Parameters
+    ----------
+    iso3 : list
+        Country ISO3 codes. Defaults to the Sub-Saharan African countries
+        that are not excluded.
+
+    Returns
+    -------
+    countries : list of dicts
+        Country metadata records.
+
+    """
+    countries = pd.read_csv(path, encoding = 'utf-8-sig')
+
+    if iso3:
+
+        countries = countries[countries['iso3'].isin(iso3)]
+
+    else:
+
+        countries = countries[(countries['region'] == 'Sub-Saharan Africa') &
+                              (countries['Exclude'] != 1)]
+
+
+    return countries.to_dict('records')
+
+
+def parse_args():
+    """
+    This function parses the command line arguments.
+
+    """
+    parser = argparse.ArgumentParser(description =
+                                     'Run the glassfibre processing pipeline.')
+    parser.add_argument('--stages', nargs = '+', choices = STAGE_NAMES,
+                        default = DEFAULT_STAGES, metavar = 'STAGE',
+                        help = 'Stages to run, dependencies are added.')
+    parser.add_argument('--iso3', nargs = '+',
+                        help = 'Countries to run, defaults to all of SSA.')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(),
+                        help = 'Countries processed in parallel.')
+    parser.add_argument('--memory-gb', type = float,
+                        help = 'Memory cap of each country process.')
+    parser.add_argument('--force', action = 'store_true',
+                        help = 'Rerun requested stages already completed.')
+    parser.add_argument('--cache-gb', type = float, default = 50,
+                        help = 'Disk budget of the stage output cache.')
+    parser.add_argument('--no-cache', action = 'store_true',
+                        help = 'Disable the stage output cache.')
+    parser.add_argument('--storage', choices = list(FORMATS),
+                        help = 'Format of the intermediate layers, '
+                        'defaults to the script_config.ini setting.')
+    parser.add_argument('--routing', choices = ROUTING_MODES,
+                        help = 'Fiber routing between settlements, defaults '
+                        'to the script_config.ini setting.')
+    parser.add_argument('--list', action = 'store_true',
+                        help = 'List the stages and their dependencies.')
+
+
+    return parser.parse_args()
+
+
+def main():
+
+    args = parse_args()
+
+    if args.list:
+
+        for name, function, dependencies in STAGES:
+
+            print('{} <- {}'.format(name, ', '.join(dependencies) or '-'))
+
+        return None
+
+    if args.storage is not None:
+
+        # Inherited by the country worker processes.
+        os.environ['GLASSFIBRE_STORAGE'] = args.storage
+
+    if args.routing is not None:
+
+        os.environ['GLASSFIBRE_ROUTING'] = args.routing
+
+    countries = select_countries(args.iso3)
+    workers = max(1, min(args.workers, len(countries)))
+    inner_workers = max(1, (os.cpu_count() or 1) // workers)
+    print('Running {} stages for {} countries on {} workers'.format(
+        len(args.stages), len(countries), workers))
+
+    cache_gb = None if args.no_cache else args.cache_gb
+
+    failed = []
+    with ProcessPoolExecutor(max_workers = workers, initializer = limit_memory,
+                             initargs = (args.memory_gb,)) as executor:
+
+        futures = [executor.submit(run_country, country, args.stages,
+                                   args.force, inner_workers, cache_gb)
+                   for country in countries]
+
+        for future in as_completed(futures):
+
+            try:
+
+                result = future.result()
+
+            except Exception as error:
+
+                # A worker killed by the memory cap breaks the pool.
+                failed.append(str(error))
+                print('Worker failed: {}'.format(error))
+                continue
+
+            if result['error'] is not None:
+
+                failed.append(result['iso3'])
+                print('{}: {}'.format(result['iso3'], result['error']))
+
+            else:
+
+                print('{}: completed {} stages'.format(result['iso3'],
+                                                       len(result['stages'])))
+
+    if failed:
+
+        print('Failed: {}'.format(', '.join(failed)))
+
+
+    return None
+
+
+if __name__ == '__main__':
+
+    main()
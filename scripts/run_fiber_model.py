@@ -10,18 +10,34 @@ import configparser
 import os
 import math
 import time
+import numpy as np
 import pandas as pd
 import glassfibre.fiber as fb
-from tqdm import tqdm
-from inputs import maritime, electricity_costs
+from concurrent.futures import ProcessPoolExecutor
+from glassfibre.uq_stats import GroupedSummary
+from inputs import maritime, electricity_costs, parameters
+from scipy.stats import qmc
+from fiber_montecarlo import (COST_SPECS, COST_CONSTANTS, EMISSION_SPECS, 
+                              EMISSION_CONSTANTS, deciles, generate_batch, 
+                              iter_parameters)
 pd.options.mode.chained_assignment = None 
 
+try:
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+except ImportError:
+
+    pa = pq = None
+
 CONFIG = configparser.ConfigParser()
 CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
 BASE_PATH = CONFIG['file_locations']['base_path']
 RESULTS = os.path.join(BASE_PATH, '..', 'results', 'fiber')
 SSA_RESULTS = os.path.join(BASE_PATH, '..', 'results', 'SSA')
 VALID = os.path.join(BASE_PATH, '..', '..', 'geosafi-consav', 'results', 'SSA')
+SUMMARY_KEYS = ['decile', 'strategy', 'algorithm']
 
 
 def generate_ssa_costs():
@@ -38,15 +54,8 @@ def generate_ssa_costs():
     """
     ssa = os.path.join(SSA_RESULTS, 'SSA_subregional_population_deciles.csv')
     df = pd.read_csv(ssa)
-    df[['maritime_km', 'cost_kWh']] = ''
-
-    for i in range(len(df)):
-
-        df.loc[i, 'maritime_km'] = fb.maritime_distance(df.loc[i, 'iso3'], 
-                                                        maritime)
-        
-        df.loc[i, 'cost_kWh'] = fb.electricity_cost(df.loc[i, 'iso3'], 
-                                                    electricity_costs)
+    df['maritime_km'] = df['iso3'].map(maritime)
+    df['cost_kWh'] = df['iso3'].map(electricity_costs)
 
     df = df.groupby(['decile']).agg(maritime_km = ('maritime_km', 'mean'),
                                     cost_kWh = ('cost_kWh', 'mean')
@@ -56,93 +65,238 @@ def generate_ssa_costs():
     return df
 
 
-def run_uq_processing_cost():
+def calculate_costs(df):
     """
-    Run the UQ inputs through the fiber broadband model. 
+    This function evaluates the fiber broadband cost model for all rows at 
+    once.
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe containing the uncertainty cost parameters merged with the 
+        decile demand and electricity cost data.
+
+    Returns
+    -------
+    results : dataframe
+        Dataframe containing the cost results of every row.
+    """
+    capex_cost_usd = fb.capex_cost(df['olt_usd'], df['installation_usd'], 
+                    df['otc_usd'], df['wan_unit_usd'], df['wdm_usd'], 
+                    df['mean_distance_km'], df['nodes'])
     
+    opex_cost_usd = fb.opex_cost(df['staff_usd'], df['cost_kWh'], 
+                    df['regulatory_usd'], df['customer_usd'], 
+                    df['other_costs_usd'], df['nodes'], df['assessment_years'], 
+                    df['node_power_kWh_per_km_gbps'], df['fiber_speed_gbps'], 
+                    df['mean_distance_km'])
+    
+    total_cost_ownership = fb.total_cost_ownership(capex_cost_usd, 
+            opex_cost_usd, df['discount_rate'], df['assessment_years'])
+    
+    per_user_tco = ((total_cost_ownership / (df['total_population'] 
+    * (df['adoption_rate_perc'] / 100))))
+
+    total_ssa_tco_usd = (((per_user_tco * df['population'])) 
+    * (df['adoption_rate_perc'] / 100))
+
+    per_user_annualized_usd = (per_user_tco / df['assessment_years'])
+
+    per_monthly_tco_usd = per_user_annualized_usd / 12
+
+    percent_gni = per_monthly_tco_usd / df['monthly_income_usd'] * 100
+
+    results = pd.DataFrame({
+        'capex_cost_usd' : capex_cost_usd,
+        'opex_cost_usd' : opex_cost_usd,
+        'total_cost_ownership' : total_cost_ownership,
+        'mean_connected' : df['total_population'],
+        'per_user_tco' : per_user_tco,
+        'total_ssa_tco_usd' : total_ssa_tco_usd,
+        'per_user_annualized_usd' : per_user_annualized_usd,
+        'per_monthly_tco_usd' : per_monthly_tco_usd,
+        'monthly_income_usd' : df['monthly_income_usd'],
+        'cost_per_1GB_usd' : df['cost_per_1GB_usd'],
+        'cost_per_month_usd' : df['cost_per_month_usd'],
+        'adoption_rate_perc' : df['adoption_rate_perc'],
+        'arpu_usd' : df['arpu_usd'],
+        'percent_gni' : percent_gni,
+        'algorithm' : df['algorithm'],
+        'strategy' : df['strategy'],
+        'decile' : df['decile']
+    })
+    results['technology'] = 'fiber'
+
+
+    return results
+
+
+def calculate_emissions(df):
+    """
+    This function evaluates the fiber broadband emissions model for all rows 
+    at once.
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe containing the uncertainty emission parameters merged with 
+        the decile demand and maritime distance data.
+
+    Returns
+    -------
+    results : dataframe
+        Dataframe containing the emission results of every row.
+    """
+    lca_mfg = fb.lca_manufacturing(df['fiber_cable_kg_per_km'], 
+                df['pcb_kg'], df['pvc_kg'], df['steel_kg'], 
+                df['concrete_kg'], df['glass_kg_co2e'], 
+                df['pcb_kg_co2e'], df['steel_kg_co2e'], 
+                df['concrete_kg_co2e'], df['pvc_kg_co2e'], 
+                df['mean_distance_km'], df['nodes'])
+    
+    lca_trans = fb.lca_transportation(df['mean_distance_km'], 
+                                      df['truck_fuel_efficiency'], 
+                                      df['diesel_factor_kgco2e'],
+                                      df['maritime_km'],
+                                      df['container_ship_kgco2e'])
+
+    lca_constr = fb.lca_construction(df['mean_distance_km'], 
+                                     df['trench_percent'],
+                                     df['hours_per_km'],
+                                     df['fuel_efficiency'], 
+                                     df['diesel_factor_kgco2e'])
+
+    lca_ops = fb.lca_operations(df['node_power_kWh_per_km_gbps'], 
+                                df['fiber_speed_gbps'],
+                                df['cost_kWh'],
+                                df['assessment_years'],
+                                df['electricity_kg_co2e'], 
+                                df['mean_distance_km'])
+
+    lca_eolts = fb.lca_eolt(df['fiber_cable_kg_per_km'], df['pcb_kg'], 
+                df['pvc_kg'], df['steel_kg'], df['router'], 
+                df['glass_eolt_kg_co2e'], df['plastics_factor_kgco2e'], 
+                df['metals_factor_kgco2e'], df['mean_distance_km'], 
+                df['nodes'])
+    
+    total_emissions_ghg_kg = (lca_mfg + lca_trans + lca_constr + lca_ops 
+                              + lca_eolts) 
+    
+    user_emissions_kg_per_user = (total_emissions_ghg_kg / 
+                                  df['total_population'])
+    
+    total_emissions_ssa_kg = user_emissions_kg_per_user * df['population']
+    
+    annualized_per_user_emissions = (user_emissions_kg_per_user / 
+                                     df['assessment_years'])
+    
+    social_carbon_cost = fb.social_carbon_cost(total_emissions_ghg_kg, 
+                                        df['social_carbon_cost_usd'])
+    
+    per_user_scc_usd = (social_carbon_cost / df['total_population'])
+
+    total_ssa_scc_usd = per_user_scc_usd * df['population']
+    
+    per_user_annualized_scc_usd = (per_user_scc_usd / df['assessment_years'])
+    
+    results = pd.DataFrame({
+        'lca_mfg_kg' : lca_mfg,
+        'lca_trans_kg' : lca_trans,
+        'lca_constr_kg' : lca_constr,
+        'lca_ops_kg' : lca_ops,
+        'lca_eolts_kg' : lca_eolts,
+        'total_emissions_ghg_kg' : total_emissions_ghg_kg,
+        'total_emissions_ssa_kg' : total_emissions_ssa_kg,
+        'total_population' : df['total_population'],
+        'social_carbon_cost_usd' : social_carbon_cost,
+        'user_emissions_kg_per_user' : user_emissions_kg_per_user,
+        'annualized_per_user_emissions' : annualized_per_user_emissions,
+        'per_user_scc_usd' : per_user_scc_usd,
+        'total_ssa_scc_usd' : total_ssa_scc_usd, 
+        'per_user_annualized_scc_usd' : per_user_annualized_scc_usd,
+        'decile' : df['decile'],
+        'strategy' : df['strategy'],
+        'algorithm' : df['algorithm']
+    })
+    results['technology'] = 'fiber'
+
+
+    return results
+
+
+def cost_decile_inputs():
+    """
+    This function combines the decile demand, GNI and electricity cost data 
+    used by the cost model.
+
+    Returns
+    -------
+    df : dataframe
+        Dataframe containing the decile inputs of the cost model.
     """
-    path = os.path.join(RESULTS, 'uq_parameters_cost.csv') 
     ssa = os.path.join(SSA_RESULTS, 'SSA_decile_summary_stats.csv')
     gni_data = os.path.join(VALID, 'SSA_decile_summary_stats.csv')
 
-    if not os.path.exists(path):
-        print('Cannot locate uq_parameters_cost.csv')
-
-    df = pd.read_csv(path)
-    df1 = pd.read_csv(ssa)
+    df = pd.read_csv(ssa)
     gni = pd.read_csv(gni_data)
     gni = gni[['decile', 'cost_per_1GB_usd', 'monthly_income_usd', 
                'cost_per_month_usd', 'adoption_rate_perc', 'arpu_usd']]
 
-    df1 = df1.drop(columns = ['total_poor_unconnected'])
-    df1 = df1.rename(columns = {'total_population': 'population'})
-    df = pd.merge(df, df1, on = 'decile', how = 'inner')
+    df = df.drop(columns = ['total_poor_unconnected'])
+    df = df.rename(columns = {'total_population': 'population'})
     df = pd.merge(df, gni, on = 'decile')
     electricity_cost = generate_ssa_costs()
     df = pd.merge(df, electricity_cost, on = 'decile', how = 'inner')
-    df = df.to_dict('records')
-
-    results = []
-
-    for item in tqdm(df, desc = "Processing uncertainty fiber cost results"):
-        
-
-        capex_cost_usd = fb.capex_cost(item['olt_usd'], item['installation_usd'], 
-                        item['otc_usd'], item['wan_unit_usd'], 
-                        item['wdm_usd'], item['mean_distance_km'], item['nodes'])
-        
-        opex_cost_usd = fb.opex_cost(item['staff_usd'], 
-                        item['cost_kWh'], item['regulatory_usd'], 
-                        item['customer_usd'], item['other_costs_usd'], 
-                        item['nodes'], item['assessment_years'], 
-                        item['node_power_kWh_per_km_gbps'], 
-                        item['fiber_speed_gbps'], item['mean_distance_km'])
-        
-        total_cost_ownership = fb.total_cost_ownership(capex_cost_usd, 
-                opex_cost_usd, item['discount_rate'], item['assessment_years'])
-        
-        per_user_tco = ((total_cost_ownership / (item['total_population'] 
-        * (item['adoption_rate_perc'] / 100))))
-
-        total_ssa_tco_usd = (((per_user_tco * item['population'])) 
-        * (item['adoption_rate_perc'] / 100))
-
-        per_user_annualized_usd = (per_user_tco / item['assessment_years'])
-
-        per_monthly_tco_usd = per_user_annualized_usd / 12
-
-        percent_gni = per_monthly_tco_usd / item['monthly_income_usd'] * 100
-        
-        results.append({
-            'capex_cost_usd' : capex_cost_usd,
-            'opex_cost_usd' : opex_cost_usd,
-            'total_cost_ownership' : total_cost_ownership,
-            'mean_connected' : item['total_population'],
-            'per_user_tco' : per_user_tco,
-            'total_ssa_tco_usd' : total_ssa_tco_usd,
-            'per_user_annualized_usd' : per_user_annualized_usd,
-            'per_monthly_tco_usd' : per_monthly_tco_usd,
-            'monthly_income_usd' : item['monthly_income_usd'],
-            'cost_per_1GB_usd' : item['cost_per_1GB_usd'],
-            'cost_per_month_usd' : item['cost_per_month_usd'],
-            'adoption_rate_perc' : item['adoption_rate_perc'],
-            'arpu_usd' : item['arpu_usd'],
-            'percent_gni' : percent_gni,
-            'algorithm' : item['algorithm'],
-            'strategy' : item['strategy'],
-            'decile' : item['decile']
-        })
-
-        df = pd.DataFrame.from_dict(results)
-        df['technology'] = 'fiber'
-
-        filename = 'SSA_fiber_cost_results.csv' 
-        if not os.path.exists(SSA_RESULTS):
-
-            os.makedirs(SSA_RESULTS)
-
-        path_out = os.path.join(SSA_RESULTS, filename)
-        df.to_csv(path_out, index = False)
+
+
+    return df
+
+
+def emission_decile_inputs():
+    """
+    This function combines the decile demand and maritime distance data 
+    used by the emissions model.
+
+    Returns
+    -------
+    df : dataframe
+        Dataframe containing the decile inputs of the emissions model.
+    """
+    ssa = os.path.join(SSA_RESULTS, 'SSA_decile_summary_stats.csv')
+
+    df = pd.read_csv(ssa)
+    df = df.drop(columns = ['total_poor_unconnected'])
+    df = df.rename(columns = {'total_population': 'population'})
+    maritime_distance_results = generate_ssa_costs()
+    df = pd.merge(df, maritime_distance_results, on = 'decile', how = 'inner')
+
+
+    return df
+
+
+def run_uq_processing_cost():
+    """
+    Run the UQ inputs through the fiber broadband model. 
+    
+    """
+    path = os.path.join(RESULTS, 'uq_parameters_cost.csv') 
+
+    if not os.path.exists(path):
+        print('Cannot locate uq_parameters_cost.csv')
+
+    df = pd.read_csv(path)
+    df = pd.merge(df, cost_decile_inputs(), on = 'decile', how = 'inner')
+
+    print('Processing {} uncertainty fiber cost results'.format(len(df)))
+    df = calculate_costs(df)
+
+    filename = 'SSA_fiber_cost_results.csv' 
+    if not os.path.exists(SSA_RESULTS):
+
+        os.makedirs(SSA_RESULTS)
+
+    path_out = os.path.join(SSA_RESULTS, filename)
+    df.to_csv(path_out, index = False)
 
 
     return
@@ -154,108 +308,441 @@ def run_uq_processing_emission():
     
     """
     path = os.path.join(RESULTS, 'uq_parameters_emission.csv') 
-    ssa = os.path.join(SSA_RESULTS, 'SSA_decile_summary_stats.csv')
 
     if not os.path.exists(path):
         print('Cannot locate uq_parameters_emission.csv')
 
     df = pd.read_csv(path)
-    df1 = pd.read_csv(ssa)
-    df1 = df1.drop(columns = ['total_poor_unconnected'])
-    df1 = df1.rename(columns = {'total_population': 'population'})
-    df = pd.merge(df, df1, on = 'decile', how = 'inner')
-    maritime_distance_results = generate_ssa_costs()
-    df = pd.merge(df, maritime_distance_results, on = 'decile', how = 'inner')
- 
-    df = df.to_dict('records')
-
-    results = []
-
-    for item in tqdm(df, desc = "Processing uncertainty fiber results"):
-
-        lca_mfg = fb.lca_manufacturing(item['fiber_cable_kg_per_km'], 
-                    item['pcb_kg'], item['pvc_kg'], item['steel_kg'], 
-                    item['concrete_kg'], item['glass_kg_co2e'], 
-                    item['pcb_kg_co2e'], item['steel_kg_co2e'], 
-                    item['concrete_kg_co2e'], item['pvc_kg_co2e'], 
-                    item['mean_distance_km'], item['nodes'])
-        
-        lca_trans = fb.lca_transportation(item['mean_distance_km'], 
-                                          item['truck_fuel_efficiency'], 
-                                          item['diesel_factor_kgco2e'],
-                                          item['maritime_km'],
-                                          item['container_ship_kgco2e'])
-
-        lca_constr = fb.lca_construction(item['mean_distance_km'], 
-                                         item['trench_percent'],
-                                         item['hours_per_km'],
-                                         item['fuel_efficiency'], 
-                                         item['diesel_factor_kgco2e'])
-
-        lca_ops = fb.lca_operations(item['node_power_kWh_per_km_gbps'], 
-                                    item['fiber_speed_gbps'],
-                                    item['cost_kWh'],
-                                    item['assessment_years'],
-                                    item['electricity_kg_co2e'], 
-                                    item['mean_distance_km'])
-
-        lca_eolts = fb.lca_eolt(item['fiber_cable_kg_per_km'], item['pcb_kg'], 
-                    item['pvc_kg'], item['steel_kg'], item['router'], 
-                    item['glass_eolt_kg_co2e'], item['plastics_factor_kgco2e'], 
-                    item['metals_factor_kgco2e'], item['mean_distance_km'], 
-                    item['nodes'])
-        
-        total_emissions_ghg_kg = (lca_mfg + lca_trans + lca_constr + lca_ops 
-                                  + lca_eolts) 
-        
-        user_emissions_kg_per_user = (total_emissions_ghg_kg / 
-                                      item['total_population'])
-        
-        total_emissions_ssa_kg = user_emissions_kg_per_user * item['population']
-        
-        annualized_per_user_emissions = (user_emissions_kg_per_user / 
-                                         item['assessment_years'])
-        
-        social_carbon_cost = fb.social_carbon_cost(total_emissions_ghg_kg, 
-                                            item['social_carbon_cost_usd'])
-        
-        per_user_scc_usd = (social_carbon_cost / item['total_population'])
-
-        total_ssa_scc_usd = per_user_scc_usd * item['population']
-        
-        per_user_annualized_scc_usd = (per_user_scc_usd / 
-                                       item['assessment_years'])
-        
-        results.append({
-            'lca_mfg_kg' : lca_mfg,
-            'lca_trans_kg' : lca_trans,
-            'lca_constr_kg' : lca_constr,
-            'lca_ops_kg' : lca_ops,
-            'lca_eolts_kg' : lca_eolts,
-            'total_emissions_ghg_kg' : total_emissions_ghg_kg,
-            'total_emissions_ssa_kg' : total_emissions_ssa_kg,
-            'total_population' : item['total_population'],
-            'social_carbon_cost_usd' : social_carbon_cost,
-            'user_emissions_kg_per_user' : user_emissions_kg_per_user,
-            'annualized_per_user_emissions' : annualized_per_user_emissions,
-            'per_user_scc_usd' : per_user_scc_usd,
-            'total_ssa_scc_usd' : total_ssa_scc_usd, 
-            'per_user_annualized_scc_usd' : per_user_annualized_scc_usd,
-            'decile' : item['decile'],
-            'strategy' : item['strategy'],
-            'algorithm' : item['algorithm']
-        })
-
-        df = pd.DataFrame.from_dict(results)
-        df['technology'] = 'fiber'
-
-        filename = 'SSA_fiber_emission_results.csv'
-        if not os.path.exists(SSA_RESULTS):
-
-            os.makedirs(SSA_RESULTS)
-
-        path_out = os.path.join(SSA_RESULTS, filename)
-        df.to_csv(path_out, index = False)
+    df = pd.merge(df, emission_decile_inputs(), on = 'decile', how = 'inner')
+
+    print('Processing {} uncertainty fiber results'.format(len(df)))
+    df = calculate_emissions(df)
+
+    filename = 'SSA_fiber_emission_results.csv'
+    if not os.path.exists(SSA_RESULTS):
+
+        os.makedirs(SSA_RESULTS)
+
+    path_out = os.path.join(SSA_RESULTS, filename)
+    df.to_csv(path_out, index = False)
+
+
+    return None
+
+
+def stream_uq_results(chunks, decile_inputs, calculate, filename, 
+                      aggregate = False):
+    """
+    This function evaluates parameter chunks as they are generated and 
+    appends the results to a Parquet file, so memory use is bounded by the 
+    chunk size rather than the number of draws.
+
+    In aggregate mode no draws are written. The results are folded into 
+    streaming summaries per decile, strategy and algorithm, and only the 
+    summary table is written as a csv.
+
+    Parameters
+    ----------
+    chunks : iterable
+        Dataframes of parameter draws.
+    decile_inputs : dataframe
+        Decile data merged onto every chunk.
+    calculate : function
+        Model evaluating a merged chunk, calculate_costs or 
+        calculate_emissions.
+    filename : string
+        Name of the output, without extension.
+    aggregate : bool
+        Write the summary table instead of every draw.
+
+    Returns
+    -------
+    rows : int
+        Number of results evaluated.
+    """
+    if pq is None and not aggregate:
+
+        raise ImportError('pyarrow is required to stream UQ results')
+
+    if not os.path.exists(SSA_RESULTS):
+
+        os.makedirs(SSA_RESULTS)
+
+    writer = None
+    summary = None
+    rows = 0
+
+    try:
+
+        for chunk in chunks:
+
+            df = pd.merge(chunk, decile_inputs, on = 'decile', how = 'inner')
+            df = calculate(df)
+            rows += len(df)
+
+            if aggregate:
+
+                if summary is None:
+
+                    metrics = [column for column in df.columns if column not 
+                               in SUMMARY_KEYS and pd.api.types.is_numeric_dtype(
+                               df[column])]
+                    summary = GroupedSummary(SUMMARY_KEYS, metrics)
+
+                summary.update(df)
+                continue
+
+            table = pa.Table.from_pandas(df, preserve_index = False)
+
+            if writer is None:
+
+                writer = pq.ParquetWriter(os.path.join(SSA_RESULTS, 
+                                          filename + '.parquet'), table.schema)
+
+            writer.write_table(table.cast(writer.schema))
+
+    finally:
+
+        if writer is not None:
+
+            writer.close()
+
+    if summary is not None:
+
+        path_out = os.path.join(SSA_RESULTS, filename + '_summary.csv')
+        summary.summary().to_csv(path_out, index = False)
+
+
+    return rows
+
+
+def run_streaming_cost(parameters, method = 'random', chunk_size = 100000, 
+                       aggregate = False):
+    """
+    Generate cost parameter draws chunk by chunk and stream them through the 
+    fiber broadband cost model into SSA_fiber_cost_results.parquet, or into 
+    SSA_fiber_cost_results_summary.csv in aggregate mode.
+
+    Parameters
+    ----------
+    parameters : dict
+        dictionary of dictionary containing fiber cost values.
+    method : string
+        'random', 'lhs' or 'sobol'.
+    chunk_size : int.
+        Number of parameter draws evaluated at once.
+    aggregate : bool
+        Write summary statistics instead of every draw.
+
+    """
+    users = pd.read_csv(os.path.join(SSA_RESULTS, 
+                                     'population_connected_fiber.csv'))
+    decile_inputs = pd.merge(users, cost_decile_inputs(), on = 'decile', 
+                             how = 'inner')
+    fiber_params = parameters['regional']
+    rng = np.random.default_rng(fiber_params['seed_value'])
+
+    chunks = iter_parameters(COST_SPECS, COST_CONSTANTS, fiber_params, rng, 
+                             method, chunk_size)
+    rows = stream_uq_results(chunks, decile_inputs, calculate_costs, 
+                             'SSA_fiber_cost_results', aggregate)
+    print('Processed {} fiber cost results'.format(rows))
+
+
+    return None
+
+
+def run_streaming_emission(parameters, method = 'random', chunk_size = 100000,
+                           aggregate = False):
+    """
+    Generate emission parameter draws chunk by chunk and stream them through 
+    the fiber broadband emissions model into 
+    SSA_fiber_emission_results.parquet, or into 
+    SSA_fiber_emission_results_summary.csv in aggregate mode.
+
+    Parameters
+    ----------
+    parameters : dict
+        dictionary of dictionary containing fiber emission values.
+    method : string
+        'random', 'lhs' or 'sobol'.
+    chunk_size : int.
+        Number of parameter draws evaluated at once.
+    aggregate : bool
+        Write summary statistics instead of every draw.
+
+    """
+    users = pd.read_csv(os.path.join(SSA_RESULTS, 
+                                     'population_connected_fiber.csv'))
+    decile_inputs = pd.merge(users, emission_decile_inputs(), on = 'decile', 
+                             how = 'inner')
+    fiber_params = parameters['regional']
+    rng = np.random.default_rng(fiber_params['seed_value'])
+
+    chunks = iter_parameters(EMISSION_SPECS, EMISSION_CONSTANTS, fiber_params, 
+                             rng, method, chunk_size)
+    rows = stream_uq_results(chunks, decile_inputs, calculate_emissions, 
+                             'SSA_fiber_emission_results', aggregate)
+    print('Processed {} fiber emission results'.format(rows))
+
+
+    return None
+
+
+def decile_convergence(summary, metrics):
+    """
+    This function finds the largest relative standard error of the given 
+    metrics across the strategies and algorithms of each decile.
+
+    Parameters
+    ----------
+    summary : GroupedSummary
+        Streaming summaries keyed by decile, strategy and algorithm.
+    metrics : list
+        Metrics to check.
+
+    Returns
+    -------
+    errors : dict
+        Decile mapped to a dict of metric and largest relative standard error.
+    """
+    errors = {}
+    for metric in metrics:
+
+        for group, error in summary.relative_standard_error(metric).items():
+
+            decile = group[SUMMARY_KEYS.index('decile')]
+            decile_errors = errors.setdefault(decile, {})
+            decile_errors[metric] = np.nanmax([decile_errors.get(metric, 
+                                               np.nan), error])
+
+
+    return errors
+
+
+def run_adaptive_uq(parameters, method = 'random'):
+    """
+    Run cost and emission draws in batches until the relative standard error 
+    of per_user_tco, total_cost_ownership and user_emissions_kg_per_user is 
+    below the tolerance for every decile, or the maximum number of 
+    iterations is reached.
+
+    Converged deciles stop drawing, so the remaining draws go to the deciles 
+    whose outputs are most uncertain. The summary tables and a convergence 
+    report with the draws each decile needed are written to SSA_RESULTS.
+
+    Parameters
+    ----------
+    parameters : dict
+        dictionary of dictionary containing fiber values, including 
+        rse_tolerance, batch_iterations and max_iterations.
+    method : string
+        'random', 'lhs' or 'sobol'.
+
+    """
+    fiber_params = parameters['regional']
+    tolerance = fiber_params['rse_tolerance']
+    batch = fiber_params['batch_iterations']
+    maximum = fiber_params['max_iterations']
+
+    users = pd.read_csv(os.path.join(SSA_RESULTS, 
+                                     'population_connected_fiber.csv'))
+    cost_inputs = pd.merge(users, cost_decile_inputs(), on = 'decile', 
+                           how = 'inner')
+    emission_inputs = pd.merge(users, emission_decile_inputs(), on = 'decile', 
+                               how = 'inner')
+
+    seeds = np.random.SeedSequence(fiber_params['seed_value']).spawn(2)
+    cost_rng, emission_rng = [np.random.default_rng(seed) for seed in seeds]
+    cost_engine = emission_engine = None
+
+    if method == 'sobol':
+
+        cost_engine = qmc.Sobol(d = len(COST_SPECS), scramble = True, 
+                                seed = cost_rng)
+        emission_engine = qmc.Sobol(d = len(EMISSION_SPECS), scramble = True, 
+                                    seed = emission_rng)
+
+    cost_metrics = ['per_user_tco', 'total_cost_ownership']
+    emission_metrics = ['user_emissions_kg_per_user']
+    cost_summary = emission_summary = None
+    draws = {decile: 0 for decile in deciles}
+    active = list(deciles)
+    errors = {}
+
+    while active:
+
+        costs = generate_batch(COST_SPECS, COST_CONSTANTS, fiber_params, 
+                               cost_rng, batch, active, method, cost_engine)
+        costs = calculate_costs(pd.merge(costs, cost_inputs, on = 'decile', 
+                                         how = 'inner'))
+        emissions = generate_batch(EMISSION_SPECS, EMISSION_CONSTANTS, 
+                                   fiber_params, emission_rng, batch, active, 
+                                   method, emission_engine)
+        emissions = calculate_emissions(pd.merge(emissions, emission_inputs, 
+                                                 on = 'decile', how = 'inner'))
+
+        if cost_summary is None:
+
+            cost_summary = GroupedSummary(SUMMARY_KEYS, [column for column in 
+                costs.columns if column not in SUMMARY_KEYS and 
+                pd.api.types.is_numeric_dtype(costs[column])])
+            emission_summary = GroupedSummary(SUMMARY_KEYS, [column for column 
+                in emissions.columns if column not in SUMMARY_KEYS and 
+                pd.api.types.is_numeric_dtype(emissions[column])])
+
+        cost_summary.update(costs)
+        emission_summary.update(emissions)
+
+        errors = decile_convergence(cost_summary, cost_metrics)
+        for decile, decile_errors in decile_convergence(emission_summary, 
+                                                        emission_metrics).items():
+
+            errors.setdefault(decile, {}).update(decile_errors)
+
+        for decile in active:
+
+            draws[decile] += batch
+
+        active = [decile for decile in active if draws[decile] < maximum and 
+                  not max(errors[decile].values()) < tolerance]
+
+    report = []
+    for decile in deciles:
+
+        report.append({
+            'decile': decile,
+            'draws': draws[decile],
+            'converged': max(errors[decile].values()) < tolerance,
+            **{'rse_' + metric: error for metric, error in 
+               errors[decile].items()}})
+
+        print('{}: {} draws'.format(decile, draws[decile]))
+
+    if not os.path.exists(SSA_RESULTS):
+
+        os.makedirs(SSA_RESULTS)
+
+    cost_summary.summary().to_csv(os.path.join(SSA_RESULTS, 
+        'SSA_fiber_cost_results_summary.csv'), index = False)
+    emission_summary.summary().to_csv(os.path.join(SSA_RESULTS, 
+        'SSA_fiber_emission_results_summary.csv'), index = False)
+    pd.DataFrame(report).to_csv(os.path.join(SSA_RESULTS, 
+        'SSA_fiber_uq_convergence.csv'), index = False)
+
+
+    return None
+
+
+def evaluate_shard(job):
+    """
+    This function draws the parameters of one decile and evaluates the cost 
+    and emissions models for one of its strategies.
+
+    The draws only depend on the decile seed, so every strategy of a decile 
+    sees the same draws and the result does not depend on which process 
+    evaluates the shard.
+
+    Parameters
+    ----------
+    job : tuple
+        Decile, strategy, decile seed sequence, fiber parameters, cost and emission 
+        inputs of the shard and the sampling method.
+
+    Returns
+    -------
+    results : tuple
+        Cost and emission results of the shard.
+    """
+    (decile, strategy, seed, fiber_params, cost_inputs, emission_inputs, 
+     method) = job
+    # Children are built from the decile seed rather than spawned from it, 
+    # so they do not depend on how many shards of the decile ran before.
+    cost_rng, emission_rng = [np.random.default_rng(np.random.SeedSequence(
+        seed.entropy, spawn_key = seed.spawn_key + (child,))) 
+        for child in range(2)]
+    iterations = fiber_params['iterations']
+
+    costs = generate_batch(COST_SPECS, COST_CONSTANTS, fiber_params, cost_rng, 
+                           iterations, [decile], method)
+    costs = calculate_costs(pd.merge(costs, cost_inputs, on = 'decile', 
+                                     how = 'inner'))
+    emissions = generate_batch(EMISSION_SPECS, EMISSION_CONSTANTS, 
+                               fiber_params, emission_rng, iterations, 
+                               [decile], method)
+    emissions = calculate_emissions(pd.merge(emissions, emission_inputs, 
+                                             on = 'decile', how = 'inner'))
+
+
+    return costs, emissions
+
+
+def run_sharded_uq(parameters, workers = None, method = 'random'):
+    """
+    Run the cost and emission models sharded by decile and strategy across a 
+    process pool.
+
+    Each decile gets its own seed from the seed_value seed sequence and the 
+    shard outputs are merged in decile, then strategy order, so parallel 
+    runs reproduce serial runs exactly.
+
+    Parameters
+    ----------
+    parameters : dict
+        dictionary of dictionary containing fiber values.
+    workers : int
+        Number of worker processes, 1 runs the shards serially.
+    method : string
+        'random', 'lhs' or 'sobol'.
+
+    """
+    fiber_params = parameters['regional']
+    users = pd.read_csv(os.path.join(SSA_RESULTS, 
+                                     'population_connected_fiber.csv'))
+    cost_inputs = pd.merge(users, cost_decile_inputs(), on = 'decile', 
+                           how = 'inner')
+    emission_inputs = pd.merge(users, emission_decile_inputs(), on = 'decile', 
+                               how = 'inner')
+    seeds = np.random.SeedSequence(fiber_params['seed_value']).spawn(
+        len(deciles))
+
+    jobs = []
+    for decile, seed in zip(deciles, seeds):
+
+        for strategy in sorted(users.loc[users['decile'] == decile, 
+                                         'strategy'].unique()):
+
+            shard_costs = cost_inputs[(cost_inputs['decile'] == decile) & 
+                                      (cost_inputs['strategy'] == strategy)]
+            shard_emissions = emission_inputs[
+                (emission_inputs['decile'] == decile) & 
+                (emission_inputs['strategy'] == strategy)]
+            jobs.append((decile, strategy, seed, fiber_params, shard_costs, 
+                         shard_emissions, method))
+
+    if workers == 1:
+
+        results = [evaluate_shard(job) for job in jobs]
+
+    else:
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+
+            results = list(executor.map(evaluate_shard, jobs))
+
+    if not os.path.exists(SSA_RESULTS):
+
+        os.makedirs(SSA_RESULTS)
+
+    costs = pd.concat([cost for cost, emission in results], 
+                      ignore_index = True)
+    costs.to_csv(os.path.join(SSA_RESULTS, 'SSA_fiber_cost_results.csv'), 
+                 index = False)
+    emissions = pd.concat([emission for cost, emission in results], 
+                          ignore_index = True)
+    emissions.to_csv(os.path.join(SSA_RESULTS, 
+                     'SSA_fiber_emission_results.csv'), index = False)
+    print('Processed {} shards'.format(len(jobs)))
 
 
     return None
@@ -267,4 +754,14 @@ if __name__ == '__main__':
     #run_uq_processing_cost()
 
     print('Running fiber broadband emissions model')
-    run_uq_processing_emission()
\ No newline at end of file
+    run_uq_processing_emission()
+
+    #print('Streaming fiber broadband cost and emissions draws')
+    #run_streaming_cost(parameters, method = 'sobol')
+    #run_streaming_emission(parameters, method = 'sobol')
+
+    #print('Running fiber broadband model until the deciles converge')
+    #run_adaptive_uq(parameters, method = 'sobol')
+
+    #print('Running fiber broadband model sharded by decile and strategy')
+    #run_sharded_uq(parameters)
\ No newline at end of file
@@ -0,0 +1,262 @@
+"""
+Aggregation of many per-country or per-region files into one output.
+
+Every input is read once. The frames are either concatenated once and
+written once or, for outputs larger than memory, appended to the output
+as they are read. A progress bar tracks the inputs and a final report
+gives the rows, bytes and throughput of the aggregation.
+
+"""
+import os
+import json
+import time
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tqdm import tqdm
+from glassfibre.storage import (find_layer, get_storage_format, layer_path,
+                                read_layer, remove_layer, write_layer)
+
+
+def read_input(path):
+    """
+    This function reads a CSV file or a layer.
+
+    """
+    if path.endswith('.csv'):
+
+        return pd.read_csv(path)
+
+
+    return read_layer(path)
+
+
+def input_size(path):
+    """
+    This function returns the size in bytes of a CSV file or stored layer.
+
+    """
+    found = path if path.endswith('.csv') else find_layer(path)
+    if found is None or not os.path.isfile(found):
+
+        return 0
+
+
+    return os.path.getsize(found)
+
+
+class StreamWriter:
+
+    """
+    This class appends frames to a CSV file or a layer, writing the header
+    or schema from the first frame.
+    """
+
+    def __init__(self, path):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        path : string
+            CSV path or Shapefile path of the output layer.
+        """
+        self.path = path
+        self.columns = None
+        self.writer = None
+        self.buffer = []
+        self.rows = 0
+
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+
+            os.makedirs(folder, exist_ok = True)
+
+
+    def write(self, df):
+        """
+        Append a frame to the output.
+
+        Parameters
+        ----------
+        df : dataframe
+            Frame to append. Columns missing from the first frame are
+            dropped and columns it lacks are left empty.
+
+        """
+        if len(df) == 0:
+
+            return None
+
+        first = self.columns is None
+        if first:
+
+            self.columns = list(df.columns)
+
+        df = df.reindex(columns = self.columns)
+        self.rows += len(df)
+
+        if self.path.endswith('.csv'):
+
+            df.to_csv(self.path, mode = 'w' if first else 'a', header = first,
+                      index = False)
+
+        elif get_storage_format() == 'geoparquet':
+
+            self.write_parquet(df)
+
+        elif get_storage_format() == 'shapefile':
+
+            if first:
+
+                write_layer(df, self.path, index = False)
+
+            else:
+
+                df.to_file(layer_path(self.path), mode = 'a')
+
+        else:
+
+            # FlatGeobuf files are written in one go.
+            self.buffer.append(df)
+
+
+    def write_parquet(self, gdf):
+        """
+        Append a geodataframe to a GeoParquet file.
+
+        """
+        geometry = gdf.geometry.name
+        df = pd.DataFrame(gdf)
+        df[geometry] = gdf.geometry.to_wkb().values
+        table = pa.Table.from_pandas(df, preserve_index = False)
+
+        if self.writer is None:
+
+            crs = gdf.crs.to_json_dict() if gdf.crs is not None else None
+            metadata = dict(table.schema.metadata or {})
+            metadata[b'geo'] = json.dumps({
+                'version': '1.0.0',
+                'primary_column': geometry,
+                'columns': {geometry: {'encoding': 'WKB',
+                                       'geometry_types': [], 'crs': crs}},
+            }).encode()
+            remove_layer(self.path)
+            self.schema = table.schema.with_metadata(metadata)
+            self.writer = pq.ParquetWriter(layer_path(self.path), self.schema)
+
+        self.writer.write_table(table.cast(self.schema))
+
+
+    def close(self):
+        """
+        Finish the output.
+
+        """
+        if self.writer is not None:
+
+            self.writer.close()
+
+        if self.buffer:
+
+            write_layer(gpd.GeoDataFrame(pd.concat(self.buffer,
+                        ignore_index = True)), self.path, index = False)
+            self.buffer = []
+
+
+def aggregate(paths, path_out = None, transform = None, stream = False,
+              description = 'Combining'):
+    """
+    This function combines CSV files or layers into a single output.
+
+    Parameters
+    ----------
+    paths : list
+        CSV files or Shapefile paths of the layers to combine.
+    path_out : string
+        CSV path or Shapefile path of the output layer. Nothing is written
+        when None.
+    transform : function
+        Applied to each frame with its path before it is combined.
+    stream : bool
+        Append each frame to the output as it is read, so the combined
+        output never has to fit in memory.
+    description : string
+        Label of the progress bar and report.
+
+    Returns
+    -------
+    df : dataframe
+        The combined frame, or None when it was streamed or there were no
+        inputs.
+
+    """
+    start = time.time()
+    writer = StreamWriter(path_out) if stream and path_out else None
+    frames = []
+    rows = 0
+    size = 0
+
+    for path in tqdm(paths, desc = description, unit = 'file'):
+
+        df = read_input(path)
+        size += input_size(path)
+
+        if transform is not None:
+
+            df = transform(df, path)
+
+        rows += len(df)
+        if writer is not None:
+
+            writer.write(df)
+
+        else:
+
+            frames.append(df)
+
+    df = None
+
+    if writer is not None:
+
+        writer.close()
+
+    elif frames:
+
+        df = pd.concat(frames, ignore_index = True)
+        if isinstance(frames[0], gpd.GeoDataFrame):
+
+            df = gpd.GeoDataFrame(df, geometry = frames[0].geometry.name,
+                                  crs = frames[0].crs)
+
+        if path_out is not None:
+
+            write_output(df, path_out)
+
+    seconds = max(time.time() - start, 1e-9)
+    print('{}: {} files, {} rows, {:.1f} MB in {:.1f} s '
+          '({:.0f} rows/s, {:.1f} MB/s)'.format(description, len(paths), rows,
+          size / 1e6, seconds, rows / seconds, size / 1e6 / seconds))
+
+
+    return df
+
+
+def write_output(df, path_out):
+    """
+    This function writes a combined frame to a CSV file or a layer.
+
+    """
+    folder = os.path.dirname(path_out)
+    if folder and not os.path.exists(folder):
+
+        os.makedirs(folder, exist_ok = True)
+
+    if path_out.endswith('.csv'):
+
+        df.to_csv(path_out, index = False)
+
+    else:
+
+        write_layer(df, path_out, index = False)
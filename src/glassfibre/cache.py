@@ -0,0 +1,358 @@
+"""
+Content-addressed cache of pipeline stage outputs.
+
+A stage is keyed on the SHA-256 of its input files together with the
+country parameters it depends on. Outputs of a completed stage are copied
+into an object store under that key, so a rerun with unchanged inputs and
+parameters restores copies of them instead of recomputing, while a changed
+threshold or raster produces a new key and reruns only the stages it
+affects. Entries are evicted least recently used first once the store
+exceeds its disk budget.
+
+"""
+import os
+import glob
+import json
+import shutil
+import hashlib
+import time
+
+
+def expand_paths(base, patterns, exclude = None):
+    """
+    This function expands stage path patterns into the files they cover.
+
+    Directories expand to every file below them and shapefiles to all of
+    their sidecar files, or to the layer in whichever format it is stored.
+
+    Parameters
+    ----------
+    base : string
+        Folder the patterns are relative to.
+    patterns : list
+        Relative file, folder or glob patterns.
+    exclude : list
+        Relative glob patterns of files to leave out.
+
+    Returns
+    -------
+    paths : list
+        Sorted absolute file paths.
+
+    """
+    paths = set()
+    for pattern in patterns:
+
+        if pattern.endswith('.shp'):
+
+            # Layers may be stored as GeoParquet or FlatGeobuf instead.
+            matches = glob.glob(os.path.join(base, pattern[:-4] + '.*'))
+
+        else:
+
+            matches = glob.glob(os.path.join(base, pattern))
+
+        for match in matches:
+
+            if os.path.isdir(match):
+
+                for folder, dirs, files in os.walk(match):
+
+                    paths.update(os.path.join(folder, name) for name in files)
+
+            else:
+
+                paths.add(match)
+
+    excluded = set()
+    for pattern in exclude or []:
+
+        excluded.update(expand_paths(base, [pattern]))
+
+
+    return sorted(paths - excluded)
+
+
+class StageCache:
+
+    """
+    This class keys stage outputs on their inputs and parameters and
+    keeps them in a disk-budgeted object store.
+    """
+
+    def __init__(self, root, budget_gb = 50, hash_index = None):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        root : string
+            Folder of the object store.
+        budget_gb : float
+            Disk budget of the object store in gigabytes.
+        hash_index : string
+            Optional JSON file remembering file digests by size and
+            modification time, so unchanged inputs are not re-hashed.
+        """
+        self.root = root
+        self.budget = int(budget_gb * 1024 ** 3)
+        self.hash_index = hash_index
+        self.hashes = {}
+
+        if hash_index is not None and os.path.exists(hash_index):
+
+            with open(hash_index) as source:
+
+                self.hashes = json.load(source)
+
+
+    def hash_file(self, path):
+        """
+        Hash a file, reusing the stored digest when its size and
+        modification time are unchanged.
+
+        """
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        known = self.hashes.get(path)
+
+        if known is not None and known[:2] == stamp:
+
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as source:
+
+            for block in iter(lambda: source.read(1 << 20), b''):
+
+                digest.update(block)
+
+        self.hashes[path] = stamp + [digest.hexdigest()]
+
+
+        return digest.hexdigest()
+
+
+    def save_hashes(self):
+        """
+        Persist the file digest index.
+
+        """
+        if self.hash_index is None:
+
+            return None
+
+        path_temp = self.hash_index + '.tmp'
+        with open(path_temp, 'w') as sink:
+
+            json.dump(self.hashes, sink)
+
+        os.replace(path_temp, self.hash_index)
+
+
+    def key(self, stage, base, inputs, params):
+        """
+        Compute the cache key of a stage.
+
+        Parameters
+        ----------
+        stage : string
+            Stage name.
+        base : string
+            Folder the input patterns are relative to.
+        inputs : list
+            Input file, folder or glob patterns.
+        params : dict
+            Parameters the stage output depends on.
+
+        Returns
+        -------
+        key : string
+            Hex digest identifying the stage output.
+
+        """
+        digest = hashlib.sha256()
+        digest.update(stage.encode())
+        digest.update(json.dumps(params, sort_keys = True,
+                                 default = str).encode())
+
+        for pattern in inputs:
+
+            paths = expand_paths(base, [pattern])
+            digest.update(pattern.encode())
+
+            if len(paths) == 0:
+
+                digest.update(b'missing')
+
+            for path in paths:
+
+                digest.update(os.path.relpath(path, base).encode())
+                digest.update(self.hash_file(path).encode())
+
+        self.save_hashes()
+
+
+        return digest.hexdigest()
+
+
+    def entry_path(self, key):
+        """
+        Return the folder of a cache entry.
+
+        """
+        return os.path.join(self.root, key[:2], key)
+
+
+    def restore(self, key, base):
+        """
+        Restore the outputs of a cache entry into the base folder.
+
+        Returns
+        -------
+        restored : bool
+            True when the entry exists and was restored.
+
+        """
+        entry = self.entry_path(key)
+        path_manifest = os.path.join(entry, 'manifest.json')
+
+        if not os.path.exists(path_manifest):
+
+            return False
+
+        with open(path_manifest) as source:
+
+            manifest = json.load(source)
+
+        for name in manifest['files']:
+
+            path_out = os.path.join(base, name)
+            folder = os.path.dirname(path_out)
+            if not os.path.exists(folder):
+
+                os.makedirs(folder)
+
+            if os.path.lexists(path_out):
+
+                os.remove(path_out)
+
+            # Restored outputs are copies, not links, so rewriting them in
+            # place leaves the cache entry intact.
+            shutil.copy2(os.path.join(entry, 'files', name), path_out)
+
+        os.utime(path_manifest)
+
+
+        return True
+
+
+    def store(self, key, base, paths):
+        """
+        Copy freshly computed stage outputs into a cache entry, then evict
+        old entries beyond the disk budget.
+
+        Parameters
+        ----------
+        key : string
+            Cache key of the stage.
+        base : string
+            Folder the outputs are stored relative to.
+        paths : list
+            Absolute output file paths.
+
+        """
+        entry = self.entry_path(key)
+        staging = '{}.{}.tmp'.format(entry, os.getpid())
+        files = []
+        size = 0
+
+        for path in paths:
+
+            name = os.path.relpath(path, base)
+            path_object = os.path.join(staging, 'files', name)
+            folder = os.path.dirname(path_object)
+            if not os.path.exists(folder):
+
+                os.makedirs(folder)
+
+            shutil.copy2(path, path_object)
+            files.append(name)
+            size += os.path.getsize(path)
+
+        if not os.path.exists(staging):
+
+            os.makedirs(staging)
+
+        with open(os.path.join(staging, 'manifest.json'), 'w') as sink:
+
+            json.dump({'files': files, 'bytes': size,
+                       'created': time.strftime('%Y-%m-%d %H:%M:%S')},
+                      sink, indent = 2)
+
+        if os.path.exists(entry):
+
+            shutil.rmtree(entry)
+
+        os.replace(staging, entry)
+        self.evict()
+
+
+        return None
+
+
+    def evict(self):
+        """
+        Remove least recently used entries until the store fits the
+        disk budget.
+
+        """
+        entries = []
+        for path_manifest in glob.glob(os.path.join(self.root, '*', '*',
+                                                    'manifest.json')):
+
+            try:
+
+                with open(path_manifest) as source:
+
+                    size = json.load(source)['bytes']
+
+                entries.append((os.path.getmtime(path_manifest), size,
+                                os.path.dirname(path_manifest)))
+
+            except (OSError, ValueError, KeyError):
+
+                continue
+
+        total = sum(size for used, size, entry in entries)
+        for used, size, entry in sorted(entries):
+
+            if total <= self.budget:
+
+                break
+
+            shutil.rmtree(entry, ignore_errors = True)
+            total -= size
+
+
+        return None
+
+
+def remove_outputs(paths):
+    """
+    This function removes stale stage outputs before a stage is rerun.
+
+    Parameters
+    ----------
+    paths : list
+        Absolute output file paths.
+
+    """
+    for path in paths:
+
+        if os.path.lexists(path):
+
+            os.remove(path)
+
+
+    return None
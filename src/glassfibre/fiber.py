@@ -109,6 +109,10 @@ def total_cost_ownership(total_capex, total_opex, discount_rate,
     """
     Calculate the total cost of ownership(TCO) in US$:
 
+    The operating expenditure of the first year is undiscounted and that of 
+    the remaining years is discounted with the closed-form annuity factor, 
+    so the inputs can be scalars or arrays of Monte Carlo draws.
+
     Parameters
     ----------
     total_capex : int.
@@ -126,15 +130,19 @@ def total_cost_ownership(total_capex, total_opex, discount_rate,
             The total cost of ownership.
 
     """
+    rate = np.asarray(discount_rate, dtype = float) / 100
+    years = np.maximum(np.asarray(assessment_period, dtype = float) - 1, 0)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
 
-    year_costs = []
+        annuity = np.where(rate == 0, years, 
+                           (1 - (1 + rate) ** -years) / rate)
 
-    for time in np.arange(1, assessment_period):  
+    total_cost_ownership = total_capex + total_opex * annuity + total_opex
 
-        yearly_opex = total_opex / (((discount_rate / 100) + 1) ** time)
-        year_costs.append(yearly_opex)
+    if np.ndim(total_cost_ownership) == 0:
 
-    total_cost_ownership = total_capex + sum(year_costs) + total_opex
+        return float(total_cost_ownership)
 
 
     return total_cost_ownership
@@ -17,6 +17,9 @@ from shapely.geometry import Polygon, MultiPolygon, mapping, shape, MultiLineStr
 from shapely.ops import transform, unary_union, nearest_points
 import fiona
 import fiona.crs
+from glassfibre.settlements import detect_settlements
+from glassfibre.spanning_tree import fit_tree_edges
+from glassfibre.storage import read_layer, write_layer, layer_exists
 pd.options.mode.chained_assignment = None
 warnings.filterwarnings('ignore')
 
@@ -54,62 +57,20 @@ def find_nodes(country, regions):
 
             with rasterio.open(path) as src:
                 data = src.read()
-                data[data < threshold] = 0
-                data[data >= threshold] = 1
-                polygons = rasterio.features.shapes(data, transform=src.transform)
-                shapes_df = gpd.GeoDataFrame.from_features(
-                    [
-                        {'geometry': poly, 'properties':{'value':value}}
-                        for poly, value in polygons
-                        if value > 0
-                    ],
-                    crs='epsg:4326'
-                )
-
-            geojson_region = [
-                {
-                    'geometry': region['geometry'],
-                    'properties': {
-                        GID_level: region[GID_level]
-                    }
-                }
-            ]
-
-            gpd_region = gpd.GeoDataFrame.from_features(
-                    [
-                        {'geometry': poly['geometry'],
-                        'properties':{
-                            GID_level: poly['properties'][GID_level]
-                            }}
-                        for poly in geojson_region
-                    ], crs='epsg:4326'
-                )
-
-            if len(shapes_df) == 0:
-                continue
-
-            nodes = gpd.overlay(shapes_df, gpd_region, how = 'intersection')
-
-            stats = zonal_stats(shapes_df['geometry'], path, stats =[ 'count', 
-                                                                     'sum'])
-
-            stats_df = pd.DataFrame(stats)
-
-            nodes = pd.concat([shapes_df, stats_df], axis=1).drop(columns = 
-                                                                  'value')
-
-            nodes_subset = nodes[nodes['sum'] >= settlement_size]
+                settlements = detect_settlements(data, src.transform, 
+                    threshold, settlement_size, nodata = src.nodata, 
+                    inclusive = True)
 
-            if len(nodes_subset) == 0:
+            if len(settlements) == 0:
                 missing_nodes.add(region[GID_level])
 
-            for idx, item in nodes_subset.iterrows():
+            for item in settlements:
                 interim.append({
-                        'geometry': item['geometry'].centroid,
+                        'geometry': item['geometry'],
                         'properties': {
                             GID_level: region[GID_level],
-                            'count': item['count'],
-                            'sum': item['sum']
+                            'count': item['properties']['count'],
+                            'sum': item['properties']['sum']
                         }
                 })
 
@@ -143,56 +104,24 @@ def get_missing_nodes(country, regions, missing_nodes, threshold, settlement_siz
 
         with rasterio.open(path) as src:
             data = src.read()
-            data[data < threshold] = 0
-            data[data >= threshold] = 1
-            polygons = rasterio.features.shapes(data, transform=src.transform)
-            shapes_df = gpd.GeoDataFrame.from_features(
-                [
-                    {'geometry': poly, 'properties':{'value':value}}
-                    for poly, value in polygons
-                    if value > 0
-                ],
-                crs='epsg:4326'
-            )
-
-        geojson_region = [
-            {
-                'geometry': region['geometry'],
-                'properties': {
-                    GID_level: region[GID_level]
-                }
-            }
-        ]
-
-        gpd_region = gpd.GeoDataFrame.from_features(
-                [
-                    {'geometry': poly['geometry'],
-                    'properties':{
-                        GID_level: poly['properties'][GID_level]
-                        }}
-                    for poly in geojson_region
-                ], crs='epsg:4326'
-            )
-
-        nodes = gpd.overlay(shapes_df, gpd_region, how = 'intersection')
-
-        stats = zonal_stats(shapes_df['geometry'], path, stats = ['count', 'sum'])
-
-        stats_df = pd.DataFrame(stats)
-
-        nodes = pd.concat([shapes_df, stats_df], axis = 1).drop(columns = 'value')
-
-        max_sum = nodes['sum'].max()
-
-        nodes = nodes[nodes['sum'] > max_sum - 1]
-
-        for idx, item in nodes.iterrows():
+            settlements = detect_settlements(data, src.transform, threshold, 
+                nodata = src.nodata, inclusive = True)
+
+        if len(settlements) == 0:
+            continue
+
+        max_sum = max(item['properties']['sum'] for item in settlements)
+
+        for item in settlements:
+            if not item['properties']['sum'] > max_sum - 1:
+                continue
+
             interim.append({
-                    'geometry': item['geometry'].centroid,
+                    'geometry': item['geometry'],
                     'properties': {
                         GID_level: region[GID_level],
-                        'count': item['count'],
-                        'sum': item['sum']
+                        'count': item['properties']['count'],
+                        'sum': item['properties']['sum']
                     }
             })
 
@@ -214,64 +143,18 @@ def fit_edges(input_path, output_path):
 
         os.makedirs(folder)
 
-    nodes = gpd.read_file(input_path, crs='epsg:4326')
+    nodes = read_layer(input_path)
     nodes = nodes.to_crs('epsg:3857')
 
-    all_possible_edges = []
-
-    for node1_id, node1 in nodes.iterrows():
-
-        for node2_id, node2 in nodes.iterrows():
-
-            if node1_id != node2_id:
-
-                geom1 = shape(node1['geometry'])
-                geom2 = shape(node2['geometry'])
-                line = LineString([geom1, geom2])
-                all_possible_edges.append({
-                    'type': 'Feature',
-                    'geometry': mapping(line),
-                    'properties':{
-                        # 'network_layer': 'core',
-                        'from': node1_id,
-                        'to':  node2_id,
-                        'length': line.length,
-                        'source': 'new',
-                    }
-                })
-    if len(all_possible_edges) == 0:
-
-        return
-
-    G = nx.Graph()
-
-    for node_id, node in enumerate(nodes):
-
-        G.add_node(node_id, object = node)
-
-    for edge in all_possible_edges:
-
-        G.add_edge(edge['properties']['from'], edge['properties']['to'],
-            object=edge, weight=edge['properties']['length'])
-
-    tree = nx.minimum_spanning_edges(G)
-
-    edges = []
-
-    for branch in tree:
-
-        link = branch[2]['object']
-        if link['properties']['length'] > 0:
-
-            edges.append(link)
+    edges = fit_tree_edges(nodes)
+    edges['source'] = 'new'
 
     try:
-        edges = gpd.GeoDataFrame.from_features(edges, crs = 'epsg:3857')
 
         if len(edges) > 0:
 
             edges = edges.to_crs('epsg:4326')
-            edges.to_file(output_path)
+            write_layer(edges, output_path)
 
     except:
 
@@ -324,7 +207,7 @@ class FiberProcess:
         filename = '{}_core_edges_existing.shp'.format(iso3)
         path_output = os.path.join(folder, filename)
 
-        if os.path.exists(path_output):
+        if layer_exists(path_output):
 
             return print('Existing fiber already processed')
 
@@ -379,7 +262,7 @@ class FiberProcess:
                 return print('No existing infrastructure')
 
             data = gpd.GeoDataFrame.from_features(data)
-            data.to_file(path_output, crs='epsg:4326')
+            write_layer(data, path_output)
 
         return print('Existing fiber processed')
 
@@ -405,7 +288,7 @@ class FiberProcess:
             filename = '{}_core_nodes_existing.shp'.format(iso3)
             path_output = os.path.join(folder, filename)
 
-            if os.path.exists(path_output):
+            if layer_exists(path_output):
 
                 return print('Already found nodes on existing infrastructure')
             
@@ -417,18 +300,18 @@ class FiberProcess:
 
             path = os.path.join(folder, '{}_core_edges_existing.shp').format(iso3)
 
-            if not os.path.exists(path):
+            if not layer_exists(path):
 
                 return print('No existing infrastructure')
 
-            existing_infra = gpd.read_file(path, crs='epsg:4326')
+            existing_infra = read_layer(path)
 
             existing_infra = existing_infra.to_crs(epsg=3857)
             existing_infra['geometry'] = existing_infra['geometry'].buffer(5000)
             existing_infra = existing_infra.to_crs(epsg=4326)
 
             path = os.path.join(DATA_PROCESSED, iso3, 'agglomerations', 'agglomerations.shp').format(iso3)
-            agglomerations = gpd.read_file(path, crs='epsg:4326')
+            agglomerations = read_layer(path)
 
             bool_list = agglomerations.intersects(existing_infra.unary_union)
 
@@ -438,7 +321,7 @@ class FiberProcess:
 
             agglomerations['source'] = 'existing'
 
-            agglomerations.to_file(path_output, crs='epsg:4326')
+            write_layer(agglomerations, path_output)
 
 
         return print('Found nodes on existing infrastructure')
\ No newline at end of file
@@ -4,6 +4,7 @@ import warnings
 import random
 import math
 import json
+import time
 import rasterio
 import fiona
 import fiona.crs
@@ -14,12 +15,23 @@ import geopandas as gpd
 import networkx as nx
 
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
 from rtree import index
 from rasterio.mask import mask
 from rasterstats import zonal_stats
+from shapely import STRtree
 from shapely.ops import transform, unary_union, nearest_points
 from shapely.geometry import (Polygon, MultiPolygon, mapping, shape, 
-                              MultiLineString, LineString, Point)
+                              MultiLineString, LineString)
+
+from glassfibre.raster_clip import clip_regional_rasters, read_region_raster
+from glassfibre.settlements import detect_settlements
+from glassfibre.spanning_tree import fit_tree_edges
+from glassfibre.road_routing import fit_road_edges, get_routing_mode
+from glassfibre.street_graph import load_street_graph, street_graph_exists
+from glassfibre.storage import (read_layer, write_layer, layer_exists,
+                                write_region_layer, read_region_layer,
+                                list_regions, combine_regions)
 
 
 pd.options.mode.chained_assignment = None
@@ -36,7 +48,7 @@ path = os.path.join(DATA_RAW, 'countries.csv')
 countries = pd.read_csv(path, encoding = 'utf-8-sig')
 
 
-def process_regional_settlement_tifs(country):
+def process_regional_settlement_tifs(country, in_memory = False):
     """
     This function generates settlement rasters for regions.
 
@@ -44,61 +56,43 @@ def process_regional_settlement_tifs(country):
     ----------
     country : dict
         Contains all country-specific information for modeling.
+    in_memory : bool
+        Keep the regional rasters in memory instead of writing GeoTIFFs.
+
+    Returns
+    -------
+    rasters : dict
+        Regional (array, transform) tuples keyed by GID_1 when in_memory
+        is True, otherwise None.
 
     """
 
     iso3 = country['iso3']
     GID_level = 'GID_1'
-    main_settlement_size = country['main_settlement_size']
 
-    folder = os.path.join(DATA_PROCESSED, iso3, 'settlements')
-    if not os.path.exists(folder):
-
-        os.makedirs(folder)
-
-    path_output = os.path.join(folder, 'regional_settlements.shp')
     filename = 'regions_1_{}.shp'.format(iso3)
     folder = os.path.join(DATA_PROCESSED, iso3, 'regions')
     path = os.path.join(folder, filename)
-    regions = gpd.read_file(path, crs = "epsg:4326")#[:20]
+    regions = read_layer(path)#[:20]
     regions = regions.loc[regions.is_valid]
 
     path_settlements = os.path.join(DATA_PROCESSED, iso3, 'population', 
                        'national', 'ppp_2020_1km_Aggregated.tif')
-    settlements = rasterio.open(path_settlements, 'r+')
-    settlements.nodata = 0
-    settlements.crs = {"init": "epsg:4326"}
-
-    folder_tifs = os.path.join(DATA_PROCESSED, iso3, 'settlements', 'reg_tifs')
-    if not os.path.exists(folder_tifs):
-
-        os.makedirs(folder_tifs)
-
-    for idx, region in regions.iterrows():
-
-        path_output = os.path.join(folder_tifs, region[GID_level] + '.tif')
 
-        bbox = region['geometry'].envelope
+    folder_tifs = None
+    if not in_memory:
 
-        geo = gpd.GeoDataFrame()
-        geo = gpd.GeoDataFrame({'geometry': bbox}, index = [idx], crs = 
-                               'epsg:4326')
-        coords = [json.loads(geo.to_json())['features'][0]['geometry']]
-        out_img, out_transform = mask(settlements, coords, crop = True)
-        out_meta = settlements.meta.copy()
+        folder_tifs = os.path.join(DATA_PROCESSED, iso3, 'settlements', 
+                                   'reg_tifs')
 
-        out_meta.update({'driver': 'GTiff',
-                        'height': out_img.shape[1],
-                        'width': out_img.shape[2],
-                        'transform': out_transform})
-       
-        with rasterio.open(path_output, 'w', **out_meta) as dest:
-                dest.write(out_img) 
+    rasters = clip_regional_rasters(path_settlements, regions, GID_level, 
+                                    folder_tifs, nodata = 0, 
+                                    in_memory = in_memory)
 
-    return None
+    return rasters
 
 
-def process_access_settlement_tifs(country):
+def process_access_settlement_tifs(country, in_memory = False):
     """
     This function generates settlement rasters for access (gid 2 levels)
 
@@ -106,60 +100,42 @@ def process_access_settlement_tifs(country):
     ----------
     country : dict
         Contains all country-specific information for modeling.
+    in_memory : bool
+        Keep the regional rasters in memory instead of writing GeoTIFFs.
+
+    Returns
+    -------
+    rasters : dict
+        Regional (array, transform) tuples keyed by GID when in_memory
+        is True, otherwise None.
     """
 
     iso3 = country['iso3']
     regional_level = country['lowest']
     GID_level = 'GID_{}'.format(regional_level)
 
-    folder = os.path.join(DATA_PROCESSED, iso3, 'settlements')
-    if not os.path.exists(folder):
-
-        os.makedirs(folder)
-
-    path_output = os.path.join(folder, 'access_settlements.shp')
     filename = 'regions_{}_{}.shp'.format(regional_level, iso3)
     folder = os.path.join(DATA_PROCESSED, iso3, 'regions')
     path = os.path.join(folder, filename)
-    regions = gpd.read_file(path, crs = "epsg:4326")#[:20]
+    regions = read_layer(path)#[:20]
     regions = regions.loc[regions.is_valid]
 
     path_settlements = os.path.join(DATA_PROCESSED, iso3, 'population', 
                        'national', 'ppp_2020_1km_Aggregated.tif')
-    settlements = rasterio.open(path_settlements, 'r+')
-    settlements.nodata = 0
-    settlements.crs = {"init": "epsg:4326"}
 
-    folder_tifs = os.path.join(DATA_PROCESSED, iso3, 'settlements', 'tifs')
-    if not os.path.exists(folder_tifs):
-
-        os.makedirs(folder_tifs)
+    folder_tifs = None
+    if not in_memory:
 
-    for idx, region in regions.iterrows():
+        folder_tifs = os.path.join(DATA_PROCESSED, iso3, 'settlements', 'tifs')
 
-        path_output = os.path.join(folder_tifs, region[GID_level] + '.tif')
+    rasters = clip_regional_rasters(path_settlements, regions, GID_level, 
+                                    folder_tifs, nodata = 0, 
+                                    in_memory = in_memory)
 
-        bbox = region['geometry'].envelope
+    return rasters
 
-        geo = gpd.GeoDataFrame()
-        geo = gpd.GeoDataFrame({'geometry': bbox}, index = [idx], crs = 
-                               'epsg:4326')
-        coords = [json.loads(geo.to_json())['features'][0]['geometry']]
-        out_img, out_transform = mask(settlements, coords, crop = True)
-        out_meta = settlements.meta.copy()
 
-        out_meta.update({'driver': 'GTiff',
-                        'height': out_img.shape[1],
-                        'width': out_img.shape[2],
-                        'transform': out_transform})
-       
-        with rasterio.open(path_output, 'w', **out_meta) as dest:
-                dest.write(out_img) 
-
-    return None
-
-
-def generate_regional_settlement_lut(country):
+def generate_regional_settlement_lut(country, rasters = None):
     """
     Generate a lookup table of all settlements over the defined
     settlement thresholds for the country being modeled.
@@ -168,105 +144,27 @@ def generate_regional_settlement_lut(country):
     ----------
     country : dict
         Contains all country-specific information for modeling.
+    rasters : dict
+        Optional in-memory regional rasters from 
+        process_regional_settlement_tifs.
 
     """
     iso3 = country['iso3']
-    GID_level = 'GID_1'
-    main_settlement_size = country['main_settlement_size']
-
-    folder = os.path.join(DATA_PROCESSED, iso3, 'settlements')
-    if not os.path.exists(folder):
-
-        os.makedirs(folder)
-
-    path_output = os.path.join(folder, 'regional_settlements.shp')
 
     filename = 'regions_1_{}.shp'.format(iso3)
     folder = os.path.join(DATA_PROCESSED, iso3, 'regions')
     path = os.path.join(folder, filename)
-    regions = gpd.read_file(path, crs = "epsg:4326")#[:20]
+    regions = read_layer(path)#[:20]
     regions = regions.loc[regions.is_valid]
 
-    folder_tifs = os.path.join(DATA_PROCESSED, iso3, 'settlements', 'reg_tifs')
-    if not os.path.exists(folder_tifs):
-
-        os.makedirs(folder_tifs)
-
     print('Working on gathering data from {} regional rasters'.format(iso3))
-    for idx, region in regions.iterrows():
-
-        nodes = find_regional_nodes(country, regions)
-        nodes = gpd.GeoDataFrame.from_features(nodes, crs = 'epsg:4326')
-        bool_list = nodes.intersects(regions['geometry'].unary_union)
-        nodes = pd.concat([nodes, bool_list], axis = 1)
-        nodes = nodes[nodes[0] == True].drop(columns = 0)
-        
-        settlements = []
-        for idx1, region in regions.iterrows():
-
-            seen = set()
-            for idx2, node in nodes.iterrows():
-
-                if node['geometry'].intersects(region['geometry']):
-
-                    if node['sum'] > 0:
-
-                        settlements.append({
-                            'type': 'Feature',
-                            'geometry': mapping(node['geometry']),
-                            'properties': {
-                                'id': idx1,
-                                'GID_0': region['GID_0'],
-                                GID_level: region[GID_level],
-                                'population': node['sum'],
-                                'type': node['type'],
-                            }
-                        })
-                        seen.add(region[GID_level])
-
-        settlements = gpd.GeoDataFrame.from_features(
-                [
-                    {
-                        'geometry': item['geometry'],
-                        'properties': {
-                            'iso3': iso3,
-                            'id': item['properties']['id'],
-                            'GID_0':item['properties']['GID_0'],
-                            GID_level: item['properties'][GID_level],
-                            'population': item['properties']['population'],
-                            'type': item['properties']['type'],
-                        }
-                    }
-                    for item in settlements
-                ],
-                crs='epsg:4326'
-            )
-        settlements['lon'] = round(settlements['geometry'].x, 5)
-        settlements['lat'] = round(settlements['geometry'].y, 5)
-        settlements = settlements.drop_duplicates(subset=['lon', 'lat'])
-
-        folder = os.path.join(DATA_PROCESSED, iso3, 'settlements')
-        path_output = os.path.join(folder, 'regional_settlements' + '.shp')
-        settlements.to_file(path_output)
-
-        folder = os.path.join(DATA_PROCESSED, iso3, 'network_routing_structure')
-        if not os.path.exists(folder):
-            
-            os.makedirs(folder)
-
-        path_output = os.path.join(folder, 'regional_nodes' + '.shp')
-        main_nodes = settlements.loc[settlements['population'] >= 
-                                     main_settlement_size]
-        main_nodes.to_file(path_output)
-        settlements = settlements[['iso3', 'lon', 'lat', GID_level, 'population'
-                                   , 'type']]
-        settlements.to_csv(os.path.join(folder, 'regional_settlements.csv'), index = 
-                           False)
+    generate_settlement_lut(country, regions, 'GID_1', find_regional_nodes, 
+                            'regional', 'regional_nodes', rasters)
     
     return None
 
 
-def generate_access_settlement_lut(country):
+def generate_access_settlement_lut(country, rasters = None):
     """
     Generate a lookup table of all settlements over the defined
     settlement thresholds for the country being modeled.
@@ -275,106 +173,162 @@ def generate_access_settlement_lut(country):
     ----------
     country : dict
         Contains all country-specific information for modeling.
+    rasters : dict
+        Optional in-memory regional rasters from 
+        process_access_settlement_tifs.
 
     """
     iso3 = country['iso3']
     regional_level = country['lowest']
     GID_level = 'GID_{}'.format(regional_level)
+
+    filename = 'regions_{}_{}.shp'.format(regional_level, iso3)
+    folder = os.path.join(DATA_PROCESSED, iso3, 'regions')
+    path = os.path.join(folder, filename)
+    regions = read_layer(path)#[:20]
+    regions = regions.loc[regions.is_valid]
+
+    print('Working on gathering data from {} sub-regional rasters'.format(iso3))
+    generate_settlement_lut(country, regions, GID_level, find_access_nodes, 
+                            'access', 'access_nodes', rasters)
+    
+    return None
+
+
+def generate_settlement_lut(country, regions, GID_level, find_nodes, 
+                            settlement_name, node_name, rasters = None):
+    """
+    Build the settlement lookup table of a country in a single pass.
+
+    Settlement nodes are found once for all regions and assigned to the 
+    regions they intersect with one spatial join. Where a node touches 
+    several regions the first region is kept, as before.
+
+    Parameters
+    ----------
+    country : dict
+        Contains all country-specific information for modeling.
+    regions : geodataframe
+        Valid regions of the country.
+    GID_level : string
+        Region identifier column.
+    find_nodes : function
+        Settlement node finder, find_regional_nodes or find_access_nodes.
+    settlement_name : string
+        Prefix of the settlement shapefile and csv, e.g. 'access'.
+    node_name : string
+        Name of the main node shapefile, e.g. 'access_nodes'.
+    rasters : dict
+        Optional in-memory regional rasters.
+
+    """
+    iso3 = country['iso3']
     main_settlement_size = country['main_settlement_size']
+    timings = {}
+    start = time.time()
+
+    nodes = find_nodes(country, regions, rasters)
+    timings['find_nodes_s'] = time.time() - start
 
+    if len(nodes) == 0:
+
+        return print('No settlements found for {}'.format(iso3))
+
+    step = time.time()
+    nodes = gpd.GeoDataFrame.from_features(nodes, crs = 'epsg:4326')
+    nodes = nodes.loc[nodes['sum'] > 0, ['sum', 'type', 'geometry']]
+    nodes['node_order'] = np.arange(len(nodes))
+
+    regions = regions[['GID_0', GID_level, 'geometry']].copy()
+    regions['id'] = regions.index
+    regions['region_order'] = np.arange(len(regions))
+
+    settlements = gpd.sjoin(nodes, regions, how = 'inner', 
+                            predicate = 'intersects')
+    settlements = settlements.sort_values(['region_order', 'node_order'], 
+                                          kind = 'stable')
+    settlements = settlements.rename(columns = {'sum': 'population'})
+    settlements['iso3'] = iso3
+    settlements = settlements[['geometry', 'iso3', 'id', 'GID_0', GID_level, 
+                               'population', 'type']].reset_index(drop = True)
+    settlements['lon'] = round(settlements['geometry'].x, 5)
+    settlements['lat'] = round(settlements['geometry'].y, 5)
+    settlements = settlements.drop_duplicates(subset=['lon', 'lat'])
+    timings['assign_s'] = time.time() - step
+
+    step = time.time()
     folder = os.path.join(DATA_PROCESSED, iso3, 'settlements')
     if not os.path.exists(folder):
 
         os.makedirs(folder)
 
-    path_output = os.path.join(folder, 'access_settlements.shp')
+    path_output = os.path.join(folder, settlement_name + '_settlements.shp')
+    write_layer(settlements, path_output)
 
-    filename = 'regions_{}_{}.shp'.format(regional_level, iso3)
-    folder = os.path.join(DATA_PROCESSED, iso3, 'regions')
-    path = os.path.join(folder, filename)
-    regions = gpd.read_file(path, crs = "epsg:4326")#[:20]
-    regions = regions.loc[regions.is_valid]
+    folder = os.path.join(DATA_PROCESSED, iso3, 'network_routing_structure')
+    if not os.path.exists(folder):
+        
+        os.makedirs(folder)
 
-    folder_tifs = os.path.join(DATA_PROCESSED, iso3, 'settlements', 'tifs')
-    if not os.path.exists(folder_tifs):
+    path_output = os.path.join(folder, node_name + '.shp')
+    main_nodes = settlements.loc[settlements['population'] >= 
+                                 main_settlement_size]
+    write_layer(main_nodes, path_output)
+    csv_settlements = settlements[['iso3', 'lon', 'lat', GID_level, 
+                                   'population', 'type']]
+    csv_settlements.to_csv(os.path.join(folder, settlement_name + 
+                           '_settlements.csv'), index = False)
+    timings['write_s'] = time.time() - step
+    timings['total_s'] = time.time() - start
 
-        os.makedirs(folder_tifs)
+    record_lut_timing(iso3, settlement_name, len(regions), len(nodes), 
+                      len(settlements), timings)
 
-    print('Working on gathering data from {} sub-regional rasters'.format(iso3))
-    for idx, region in regions.iterrows():
+    return None
+
+
+def record_lut_timing(iso3, settlement_name, regions, nodes, settlements, 
+                      timings):
+    """
+    Append the timing of a settlement lookup table run to the country 
+    timing report.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country ISO3 code
+    settlement_name : string
+        Lookup table being timed, e.g. 'access'.
+    regions : int
+        Number of regions processed.
+    nodes : int
+        Number of settlement nodes found.
+    settlements : int
+        Number of settlements written.
+    timings : dict
+        Elapsed seconds of each step.
+
+    """
+    report = pd.DataFrame([{
+        'iso3': iso3,
+        'lut': settlement_name,
+        'regions': regions,
+        'nodes': nodes,
+        'settlements': settlements,
+        **{key: round(value, 3) for key, value in timings.items()},
+        'completed': time.strftime('%Y-%m-%d %H:%M:%S')}])
+
+    path_out = os.path.join(DATA_PROCESSED, iso3, 'settlements', 
+                            'lut_timing.csv')
+    report.to_csv(path_out, mode = 'a', index = False, 
+                  header = not os.path.exists(path_out))
+    print('{} {} lookup table built in {:.1f}s'.format(iso3, settlement_name, 
+                                                      timings['total_s']))
 
-        nodes = find_access_nodes(country, regions)
-        nodes = gpd.GeoDataFrame.from_features(nodes, crs = 'epsg:4326')
-        bool_list = nodes.intersects(regions['geometry'].unary_union)
-        nodes = pd.concat([nodes, bool_list], axis = 1)
-        nodes = nodes[nodes[0] == True].drop(columns = 0)
-        
-        settlements = []
-        for idx1, region in regions.iterrows():
-
-            seen = set()
-            for idx2, node in nodes.iterrows():
-
-                if node['geometry'].intersects(region['geometry']):
-
-                    if node['sum'] > 0:
-
-                        settlements.append({
-                            'type': 'Feature',
-                            'geometry': mapping(node['geometry']),
-                            'properties': {
-                                'id': idx1,
-                                'GID_0': region['GID_0'],
-                                GID_level: region[GID_level],
-                                'population': node['sum'],
-                                'type': node['type'],
-                            }
-                        })
-                        seen.add(region[GID_level])
-
-        settlements = gpd.GeoDataFrame.from_features(
-                [
-                    {
-                        'geometry': item['geometry'],
-                        'properties': {
-                            'iso3': iso3,
-                            'id': item['properties']['id'],
-                            'GID_0':item['properties']['GID_0'],
-                            GID_level: item['properties'][GID_level],
-                            'population': item['properties']['population'],
-                            'type': item['properties']['type'],
-                        }
-                    }
-                    for item in settlements
-                ],
-                crs='epsg:4326'
-            )
-        settlements['lon'] = round(settlements['geometry'].x, 5)
-        settlements['lat'] = round(settlements['geometry'].y, 5)
-        settlements = settlements.drop_duplicates(subset=['lon', 'lat'])
-
-        folder = os.path.join(DATA_PROCESSED, iso3, 'settlements')
-        path_output = os.path.join(folder, 'access_settlements' + '.shp')
-        settlements.to_file(path_output)
-
-        folder = os.path.join(DATA_PROCESSED, iso3, 'network_routing_structure')
-        if not os.path.exists(folder):
-            
-            os.makedirs(folder)
-
-        path_output = os.path.join(folder, 'access_nodes' + '.shp')
-        main_nodes = settlements.loc[settlements['population'] >= 
-                                     main_settlement_size]
-        main_nodes.to_file(path_output)
-        settlements = settlements[['iso3', 'lon', 'lat', GID_level, 'population'
-                                   , 'type']]
-        settlements.to_csv(os.path.join(folder, 'access_settlements.csv'), index = 
-                           False)
-    
     return None
 
 
-def find_regional_nodes(country, regions):
+def find_regional_nodes(country, regions, rasters = None):
     """
     Find key nodes in each region.
 
@@ -384,6 +338,8 @@ def find_regional_nodes(country, regions):
         Contains all country-specific information for modeling.
     regions : dataframe
         Pandas df containing all regions for modeling.
+    rasters : dict
+        Optional in-memory regional rasters from the settlement tif stage.
 
     Returns
     -------
@@ -400,88 +356,22 @@ def find_regional_nodes(country, regions):
     interim = []
     for idx, region in regions.iterrows():
         
-        path = os.path.join(folder_tifs, region[GID_level] + '.tif')
-        with rasterio.open(path) as src: # convert raster to pandas geodataframe
-
-            data = src.read()
-            data[data < threshold] = 0
-            data[data >= threshold] = 1
-            polygons = rasterio.features.shapes(data, transform = src.transform)
-            shapes_df = gpd.GeoDataFrame.from_features(
-                [{'geometry': poly, 'properties':{'value':value}}
-                    for poly, value in polygons if value > 0])
-
-        if len(shapes_df) == 0: #if you put the crs in the preceeding function
-                                #there is an error for an empty df
-            continue            
-
-        shapes_df = shapes_df.set_crs('epsg:4326')
-
-        geojson_region = [
-            {'geometry': region['geometry'],
-            'properties': {GID_level: region[GID_level]}}]
-        
-        gpd_region = gpd.GeoDataFrame.from_features(
-                [{'geometry': poly['geometry'],
-                    'properties':{GID_level: poly['properties'][GID_level]}}
-                    for poly in geojson_region])
-        
-        if len(gpd_region) == 0: 
+        data, affine = read_region_raster(folder_tifs, region[GID_level],
+                                          rasters)
+        settlements = detect_settlements(data, affine, threshold, 
+                                         settlement_size, region = 
+                                         region['geometry'], nodata = 0)
 
-            continue      
+        for item in settlements:
 
-        gpd_region = gpd_region.set_crs('epsg:4326')
-        nodes = gpd.overlay(shapes_df, gpd_region, how = 'intersection')
-        
-        results = []
-        for idx, node in nodes.iterrows():
-
-            pop = zonal_stats(node['geometry'], path, nodata = 0,
-                              stats = ['sum'])
-            
-            if not pop[0]['sum'] == None and pop[0]['sum'] > settlement_size:
+            if item['properties']['sum'] > 0:
 
-                results.append({'geometry': node['geometry'], 
-                                'properties': {'{}'.format(GID_level): 
-                                               node[GID_level], 
-                                               'sum': pop[0]['sum']},})
-                
-        nodes = gpd.GeoDataFrame.from_features([{
-                'geometry': item['geometry'],
-                'properties': {
-                        '{}'.format(GID_level): item['properties'][GID_level],
-                        'sum': item['properties']['sum'],},}
-                for item in results])
-        
-        nodes = nodes.drop_duplicates()
-        if len(nodes) == 0: 
-
-            continue    
-
-        nodes = nodes.set_crs('epsg:4326')
-        nodes.loc[(nodes['sum'] >= 20000), 'type'] = '>20k'
-        nodes.loc[(nodes['sum'] <= 10000) | (nodes['sum'] < 20000), 
-                  'type'] = '10-20k'
-        nodes.loc[(nodes['sum'] <= 5000) | (nodes['sum'] < 10000), 
-                  'type'] = '5-10k'
-        nodes.loc[(nodes['sum'] <= 1000) | (nodes['sum'] < 5000), 
-                  'type'] = '1-5k'
-        nodes.loc[(nodes['sum'] <= 500) | (nodes['sum'] < 1000), 
-                  'type'] = '0.5-1k'
-        nodes.loc[(nodes['sum'] <= 250) | (nodes['sum'] < 500), 
-                  'type'] = '0.25-0.5k'
-        nodes.loc[(nodes['sum'] <= 250), 'type'] = '<0.25k'
-
-        nodes = nodes.dropna()
-
-        for idx, item in nodes.iterrows():
-            if item['sum'] > 0:
                 interim.append({
-                        'geometry': item['geometry'].centroid,
+                        'geometry': item['geometry'],
                         'properties': {
                             GID_level: region[GID_level],
-                            'sum': item['sum'],
-                            'type': item['type'],
+                            'sum': item['properties']['sum'],
+                            'type': item['properties']['type'],
                         },
                 })
 
@@ -489,7 +379,7 @@ def find_regional_nodes(country, regions):
     return interim
 
 
-def find_access_nodes(country, regions):
+def find_access_nodes(country, regions, rasters = None):
     """
     Find key nodes in each region.
 
@@ -499,6 +389,8 @@ def find_access_nodes(country, regions):
         Contains all country-specific information for modeling.
     regions : dataframe
         Pandas df containing all regions for modeling.
+    rasters : dict
+        Optional in-memory regional rasters from the settlement tif stage.
 
     Returns
     -------
@@ -516,88 +408,22 @@ def find_access_nodes(country, regions):
     interim = []
     for idx, region in regions.iterrows():
         
-        path = os.path.join(folder_tifs, region[GID_level] + '.tif')
-        with rasterio.open(path) as src: # convert raster to pandas geodataframe
-
-            data = src.read()
-            data[data < threshold] = 0
-            data[data >= threshold] = 1
-            polygons = rasterio.features.shapes(data, transform = src.transform)
-            shapes_df = gpd.GeoDataFrame.from_features(
-                [{'geometry': poly, 'properties':{'value':value}}
-                    for poly, value in polygons if value > 0])
-
-        if len(shapes_df) == 0: #if you put the crs in the preceeding function
-                                #there is an error for an empty df
-            continue            
-
-        shapes_df = shapes_df.set_crs('epsg:4326')
-
-        geojson_region = [
-            {'geometry': region['geometry'],
-            'properties': {GID_level: region[GID_level]}}]
-        
-        gpd_region = gpd.GeoDataFrame.from_features(
-                [{'geometry': poly['geometry'],
-                    'properties':{GID_level: poly['properties'][GID_level]}}
-                    for poly in geojson_region])
-        
-        if len(gpd_region) == 0: 
+        data, affine = read_region_raster(folder_tifs, region[GID_level],
+                                          rasters)
+        settlements = detect_settlements(data, affine, threshold, 
+                                         settlement_size, region = 
+                                         region['geometry'], nodata = 0)
 
-            continue      
+        for item in settlements:
 
-        gpd_region = gpd_region.set_crs('epsg:4326')
-        nodes = gpd.overlay(shapes_df, gpd_region, how = 'intersection')
-        
-        results = []
-        for idx, node in nodes.iterrows():
+            if item['properties']['sum'] > 0:
 
-            pop = zonal_stats(node['geometry'], path, nodata = 0,
-                              stats = ['sum'])
-            
-            if not pop[0]['sum'] == None and pop[0]['sum'] > settlement_size:
-
-                results.append({'geometry': node['geometry'], 
-                                'properties': {'{}'.format(GID_level): 
-                                               node[GID_level], 
-                                               'sum': pop[0]['sum']},})
-                
-        nodes = gpd.GeoDataFrame.from_features([{
-                'geometry': item['geometry'],
-                'properties': {
-                        '{}'.format(GID_level): item['properties'][GID_level],
-                        'sum': item['properties']['sum'],},}
-                for item in results])
-        
-        nodes = nodes.drop_duplicates()
-        if len(nodes) == 0: 
-
-            continue    
-
-        nodes = nodes.set_crs('epsg:4326')
-        nodes.loc[(nodes['sum'] >= 20000), 'type'] = '>20k'
-        nodes.loc[(nodes['sum'] <= 10000) | (nodes['sum'] < 20000), 
-                  'type'] = '10-20k'
-        nodes.loc[(nodes['sum'] <= 5000) | (nodes['sum'] < 10000), 
-                  'type'] = '5-10k'
-        nodes.loc[(nodes['sum'] <= 1000) | (nodes['sum'] < 5000), 
-                  'type'] = '1-5k'
-        nodes.loc[(nodes['sum'] <= 500) | (nodes['sum'] < 1000), 
-                  'type'] = '0.5-1k'
-        nodes.loc[(nodes['sum'] <= 250) | (nodes['sum'] < 500), 
-                  'type'] = '0.25-0.5k'
-        nodes.loc[(nodes['sum'] <= 250), 'type'] = '<0.25k'
-
-        nodes = nodes.dropna()
-
-        for idx, item in nodes.iterrows():
-            if item['sum'] > 0:
                 interim.append({
-                        'geometry': item['geometry'].centroid,
+                        'geometry': item['geometry'],
                         'properties': {
                             GID_level: region[GID_level],
-                            'sum': item['sum'],
-                            'type': item['type'],
+                            'sum': item['properties']['sum'],
+                            'type': item['properties']['type'],
                         },
                 })
 
@@ -622,7 +448,7 @@ def generate_agglomeration_lut(country):
         os.makedirs(folder)
 
     path_output = os.path.join(folder, 'agglomerations.shp')
-    if os.path.exists(path_output):
+    if layer_exists(path_output):
 
         return print('Agglomeration processing has {} already completed'.format(
             iso3))
@@ -631,41 +457,14 @@ def generate_agglomeration_lut(country):
     filename = 'regions_{}_{}.shp'.format(regional_level, iso3)
     folder = os.path.join(DATA_PROCESSED, iso3, 'regions')
     path = os.path.join(folder, filename)
-    regions = gpd.read_file(path, crs = 'epsg:4326')
+    regions = read_layer(path)
 
     path_settlements = os.path.join(DATA_PROCESSED, iso3, 'population', 
                                     'national', 'ppp_2020_1km_Aggregated.tif')
-    settlements = rasterio.open(path_settlements, 'r+')
-    settlements.nodata = 255
-    settlements.crs = {'init': 'epsg:4326'}
     
     folder_tifs = os.path.join(DATA_PROCESSED, iso3, 'agglomerations', 'tifs')
-    if not os.path.exists(folder_tifs):
-
-        os.makedirs(folder_tifs)
-
-    for idx, region in regions.iterrows():
-
-        path_output = os.path.join(folder_tifs, region[GID_level] + '.tif')
-
-        if os.path.exists(path_output):
-
-            continue
-
-        geo = gpd.GeoDataFrame(geometry = gpd.GeoSeries(region['geometry']))
-        coords = [json.loads(geo.to_json())['features'][0]['geometry']]
-        out_img, out_transform = mask(settlements, coords, crop = True)
-        out_meta = settlements.meta.copy()
-
-        out_meta.update({'driver': 'GTiff',
-                        'height': out_img.shape[1],
-                        'width': out_img.shape[2],
-                        'transform': out_transform,
-                        'crs': 'epsg:4326'})
-        
-        with rasterio.open(path_output, 'w', **out_meta) as dest:
-                
-                dest.write(out_img)
+    clip_regional_rasters(path_settlements, regions, GID_level, folder_tifs, 
+                          nodata = 255, envelope = False, skip_existing = True)
 
     print('Completed settlement.tif regional segmentation')
 
@@ -767,7 +566,7 @@ def generate_agglomeration_lut(country):
     
     folder = os.path.join(DATA_PROCESSED, iso3, 'agglomerations')
     path_output = os.path.join(folder, 'agglomerations' + '.shp')
-    agglomerations.to_file(path_output)
+    write_layer(agglomerations, path_output)
 
     agglomerations['lon'] = agglomerations['geometry'].x
     agglomerations['lat'] = agglomerations['geometry'].y
@@ -781,9 +580,23 @@ def generate_agglomeration_lut(country):
     return print('Agglomerations layer complete for {}'.format(iso3))
 
 
-def find_settlement_nodes(country, regions):
+def find_settlement_nodes(country, regions, rasters = None):
     """
     Find key nodes.
+
+    Parameters
+    ----------
+    country : dict
+        Contains all country-specific information for modeling.
+    regions : dataframe
+        Pandas df containing all regions for modeling.
+    rasters : dict
+        Optional in-memory agglomeration rasters keyed by region.
+
+    Returns
+    -------
+    interim : list of dicts
+    missing_nodes : set
     """
     iso3 = country['iso3']
     regional_level = country['lowest']
@@ -802,68 +615,26 @@ def find_settlement_nodes(country, regions):
     print('Working on gathering data from regional rasters') 
     for idx, region in regions.iterrows():
         
-        path = os.path.join(folder_tifs, region[GID_level] + '.tif')
-
-        with rasterio.open(path) as src:
-
-            data = src.read()
-            data[data < threshold] = 0
-            data[data >= threshold] = 1
-            polygons = rasterio.features.shapes(data, transform = src.transform)
-            shapes_df = gpd.GeoDataFrame.from_features(
-                [{'geometry': poly, 'properties':{'value':value}}
-                    for poly, value in polygons
-                    if value > 0])
-        
-        if len(shapes_df) == 0:
-
-            continue
-
-        shapes_df = shapes_df.set_crs('epsg:4326')
-        geojson_region = [
-            {'geometry': region['geometry'],
-                'properties': {
-                    GID_level: region[GID_level],
-                    core_node_level: region[core_node_level],
-                    regional_node_level: region[regional_node_level],}}]   
-        
-        gpd_region = gpd.GeoDataFrame.from_features(
-                [{'geometry': poly['geometry'],
-                    'properties':{
-                        GID_level: poly['properties'][GID_level],
-                        core_node_level: region[core_node_level],
-                        regional_node_level: region[regional_node_level],
-                        }}
-                    for poly in geojson_region
-                ], crs = 'epsg:4326')   
-        
-        if len(shapes_df) == 0:
+        data, affine = read_region_raster(folder_tifs, region[GID_level],
+                                          rasters)
+        settlements = detect_settlements(data, affine, threshold, 
+                                         settlement_size, nodata = 255, 
+                                         inclusive = True)
 
-            continue
-
-        nodes = gpd.overlay(shapes_df, gpd_region, how = 'intersection')
-        stats = zonal_stats(shapes_df['geometry'], path, stats = ['count', 
-                                                                  'sum'])
-        stats_df = pd.DataFrame(stats)
-
-        nodes = pd.concat([shapes_df, stats_df], axis = 1).drop(columns = 
-                                                                'value')
-        nodes_subset = nodes[nodes['sum'] >= settlement_size]
-
-        if len(nodes_subset) == 0:
+        if len(settlements) == 0:
 
             missing_nodes.add(region[GID_level])
 
-        for idx, item in nodes_subset.iterrows():
+        for item in settlements:
 
             interim.append({
-                    'geometry': item['geometry'].centroid,
+                    'geometry': item['geometry'],
                     'properties': {
                         GID_level: region[GID_level],
                         core_node_level: region[core_node_level],
                         regional_node_level: region[regional_node_level],
-                        'count': item['count'],
-                        'sum': item['sum']}})
+                        'count': item['properties']['count'],
+                        'sum': item['properties']['sum']}})
         
     return interim, missing_nodes
 
@@ -888,11 +659,11 @@ def find_largest_regional_settlement(country):
 
     folder = os.path.join(DATA_PROCESSED, iso3, 'settlements')
     path_input = os.path.join(folder, 'access_settlements' + '.shp')
-    nodes = gpd.read_file(path_input, crs = 'epsg:4326')
+    nodes = read_layer(path_input)
     
     nodes = nodes.loc[nodes.reset_index().groupby([GID_level])['population'
                                                                ].idxmax()]
-    nodes.to_file(path_output, crs = 'epsg:4326')
+    write_layer(nodes, path_output)
 
     return None
 
@@ -923,30 +694,39 @@ def get_settlement_routing_paths(country):
 
     folder = os.path.join(DATA_PROCESSED, iso3, 'network_routing_structure')
     path_input = os.path.join(folder, 'largest_regional_settlements.shp')
-    regional_nodes = gpd.read_file(path_input, crs = 'epsg:4326')
+    regional_nodes = read_layer(path_input)
 
     folder = os.path.join(DATA_PROCESSED, iso3, 'network_routing_structure')
     path_input = os.path.join(folder, 'regional_nodes.shp')
-    main_nodes = gpd.read_file(path_input, crs = 'epsg:4326')
+    main_nodes = read_layer(path_input)
+
+    regional_nodes = regional_nodes.loc[regional_nodes['population'] >= 
+                                        main_settlement_size]
+    if len(regional_nodes) == 0 or len(main_nodes) == 0:
+
+        return print('No settlement routing paths for {}'.format(iso3))
+
+    # The tree over the main nodes is built once and queried for all
+    # regional nodes in a single batch.
+    tree = STRtree(main_nodes['geometry'].values)
+    node_idx, main_idx = tree.query_nearest(regional_nodes['geometry'].values, 
+                                            all_matches = False)
+    nearest = main_nodes['geometry'].values[main_idx]
+    regional = regional_nodes.iloc[node_idx]
 
     paths = []
 
-    for idx, regional_node in regional_nodes.iterrows():
-       
-        if regional_node['population'] < main_settlement_size:
-            
-            continue
-        
-        nearest = nearest_points(regional_node.geometry, main_nodes.unary_union
-                                 )[1]
+    for idx, regional_node, main_node in zip(regional.index, 
+        regional.itertuples(), nearest):
+
         geom = LineString([
                     (
-                        regional_node['geometry'].coords[0][0],
-                        regional_node['geometry'].coords[0][1]
+                        regional_node.geometry.x,
+                        regional_node.geometry.y
                     ),
                     (
-                        nearest.coords[0][0],
-                        nearest.coords[0][1]
+                        main_node.x,
+                        main_node.y
                     ),
                 ])
         paths.append({
@@ -954,7 +734,7 @@ def get_settlement_routing_paths(country):
             'geometry': mapping(geom),
             'properties': {
                 'id': idx,
-                'source': regional_node[GID_level],}})
+                'source': getattr(regional_node, GID_level),}})
 
     paths = gpd.GeoDataFrame.from_features(
         [{
@@ -970,10 +750,10 @@ def get_settlement_routing_paths(country):
     paths['geometry'] = paths['geometry'].to_crs('epsg:4326')
     paths['distance'] = paths['geometry'].length
     geoms = paths.geometry.unary_union
-    paths = gpd.GeoDataFrame(geometry = [geoms])
+    paths = gpd.GeoDataFrame(geometry = [geoms], crs = 'epsg:4326')
     #paths = gpd.GeoDataFrame({'geometry': [geoms], 'distance': [paths['distance'].sum()]})
     paths = paths.explode().reset_index(drop = True) 
-    paths.to_file(path_output, crs = 'epsg:4326') 
+    write_layer(paths, path_output) 
     
     return None
 
@@ -997,31 +777,57 @@ def create_regions_to_model(country):
 
     filename = 'regions_{}_{}.shp'.format(country['lowest'], iso3)
     path = os.path.join(DATA_PROCESSED, iso3, 'regions', filename)
-    regions = gpd.read_file(path, crs = 'epsg:4326')
+    regions = read_layer(path)
     regions = regions.drop_duplicates()
     regions = regions.loc[regions.is_valid]
 
     filename = 'settlement_routing.shp'
     path = os.path.join(DATA_PROCESSED, iso3, 'network_routing_structure', 
                         filename)
-    settlement_routing = gpd.read_file(path, crs = 'epsg:4326')
-    seen = set()
-
-    output = []
-    for idx, regions_to_model in settlement_routing.iterrows():
+    settlement_routing = read_layer(path)
+    regions = regions.reset_index(drop = True)
+
+    # A single bulk query pairs every routing geometry with the regions it 
+    # intersects. Regions sharing a route are then merged with a union-find, 
+    # so overlapping routes collapse into one modeling region.
+    route_idx, region_idx = regions.sindex.query(
+        settlement_routing['geometry'].values, predicate = 'intersects')
+    order = np.argsort(route_idx, kind = 'stable')
+    route_idx, region_idx = route_idx[order], region_idx[order]
+    routes, starts = np.unique(route_idx, return_index = True)
+    route_members = dict(zip(routes, np.split(region_idx, starts[1:])))
+    parents = np.arange(len(regions))
+    
+    for members in route_members.values():
 
-        regions_to_model = gpd.GeoDataFrame(
-            {'geometry': unary_union(regions_to_model['geometry'])},
-            crs = 'epsg:4326', index = [0])
-        
-        regions_to_model = regions[regions.geometry.map(
-            lambda x: x.intersects(regions_to_model.geometry.any()))]
+        root = find_region_root(parents, members[0])
         
-        if len(regions_to_model) == 0:
-            
+        for member in members[1:]:
+
+            parents[find_region_root(parents, member)] = root
+
+    components = {}
+    for route in range(len(settlement_routing)):
+
+        if route not in route_members:
+
             print('no matching')
             continue
-        
+
+        root = find_region_root(parents, route_members[route][0])
+        components.setdefault(root, [])
+
+    for member in range(len(regions)):
+
+        root = find_region_root(parents, member)
+        if root in components:
+
+            components[root].append(member)
+
+    output = []
+    for members in components.values():
+
+        regions_to_model = regions.iloc[members]
         unique_list = regions_to_model[GID_level].unique()
         unique_names = regions_to_model['NAME_1'].unique()
         unique_regions = str(unique_list).replace('[', '').replace(']', ''
@@ -1029,24 +835,17 @@ def create_regions_to_model(country):
         unique_names = str(unique_names).replace('[', '').replace(']', ''
                          ).replace(' ', '-')
         
-        regions_to_model = regions_to_model.copy()
-        regions_to_model['modeled_regions'] = unique_regions
-        regions_to_model['unique_names'] = unique_names
-        regions_to_model = regions_to_model.dissolve(by = ['modeled_regions'])
-        
         output.append({
-            'geometry': regions_to_model['geometry'][0],
+            'geometry': unary_union(regions_to_model['geometry'].values),
             'properties': {
                 'regions': unique_regions,
                 'names': unique_names,}})
-        
-        for item in unique_list:
-
-            seen.add(item)
 
+    seen = set(regions.loc[[member for members in components.values() 
+                            for member in members], GID_level])
     for idx, region in regions.iterrows():
 
-        if not region[GID_level] in list(seen):
+        if not region[GID_level] in seen:
 
             output.append({
                 'geometry': region['geometry'],
@@ -1056,20 +855,51 @@ def create_regions_to_model(country):
   
             seen.add(region[GID_level])
 
-    output = gpd.GeoDataFrame.from_features(output)
+    output = gpd.GeoDataFrame.from_features(output, crs = 'epsg:4326')
     filename = 'modeling_regions.shp'
     folder = os.path.join(DATA_PROCESSED, iso3, 'modeling_regions')
     if not os.path.exists(folder):
 
         os.makedirs(folder)
 
-    output.to_file(os.path.join(folder, filename), crs = 'epsg:4326')
+    write_layer(output, os.path.join(folder, filename))
 
 
     return None
 
 
-def create_routing_buffer_zone(country):
+def find_region_root(parents, region):
+    """
+    Find the root of a region in the union-find forest of merged 
+    regions, compressing the path on the way.
+
+    Parameters
+    ----------
+    parents : numpy array
+        Parent of each region, updated in place.
+    region : int
+        Position of the region.
+
+    Returns
+    -------
+    root : int
+        Position of the root region.
+
+    """
+    root = region
+    while parents[root] != root:
+
+        root = parents[root]
+
+    while parents[region] != root:
+
+        parents[region], region = root, parents[region]
+
+
+    return root
+
+
+def create_routing_buffer_zone(country, workers = None):
     """
     A routing buffer is required to reduce the size of the problem.
 
@@ -1077,10 +907,17 @@ def create_routing_buffer_zone(country):
     between the desired settlements, with a buffer and union consequently
     being added.
 
+    All settlements are assigned to their modeling regions with a single 
+    spatial join, and each modeling region is then processed in a 
+    process pool.
+
     Parameters
     ----------
     country : dict
         Contains all country-specific information for modeling.
+    workers : int
+        Number of worker processes. Defaults to the number of cores, with 
+        1 processing the regions serially.
 
     """
     iso3 = country['iso3']
@@ -1090,6 +927,7 @@ def create_routing_buffer_zone(country):
     folder = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones')
     folder_nodes = os.path.join(folder, 'nodes')
     folder_edges = os.path.join(folder, 'edges')
+    folder_regions = os.path.join(DATA_PROCESSED, iso3, 'modeling_regions')
 
     if not os.path.exists(folder_nodes):
 
@@ -1101,116 +939,169 @@ def create_routing_buffer_zone(country):
 
     filename = 'access_settlements.shp'
     path = os.path.join(DATA_PROCESSED, iso3, 'settlements', filename)
-    settlements = gpd.read_file(path, crs = 'epsg:4326')
+    settlements = read_layer(path)
 
     filename = 'modeling_regions.shp'
-    path = os.path.join(DATA_PROCESSED, iso3, 'modeling_regions', filename)
-    modeling_regions = gpd.read_file(path, crs = 'epsg:4326')
+    path = os.path.join(folder_regions, filename)
+    modeling_regions = read_layer(path)
+    modeling_regions = modeling_regions[['regions', 'geometry']]
+    modeling_regions['region_order'] = np.arange(len(modeling_regions))
 
-    for idx, region in modeling_regions.iterrows():
+    nodes = gpd.sjoin(settlements, modeling_regions, how = 'inner', 
+                      predicate = 'intersects')
+    nodes = nodes.drop(columns = ['index_right'])
 
-        modeling_region = gpd.GeoDataFrame.from_features([{
-            'geometry': mapping(region['geometry']),
-            'properties': {
-                'regions': region['regions']
-            }
-        }], crs = 'epsg:4326')
+    jobs = []
+    for order, region_nodes in nodes.groupby('region_order', sort = True):
 
-        nodes = gpd.overlay(settlements, modeling_region, how = 'intersection')
-        main_node = (nodes[nodes['population'] == nodes['population'].max()])
+        region_nodes = region_nodes.drop(columns = ['region_order'])
+        region_nodes = region_nodes.reset_index(drop = True)
+        modeling_region = modeling_regions.iloc[[order]].drop(
+            columns = ['region_order']).reset_index(drop = True)
 
-        if not len(main_node) > 0:
+        main_node = region_nodes.loc[region_nodes['population'].idxmax()]
+        jobs.append((region_nodes, modeling_region, main_node[GID_level],
+                     folder_nodes, folder_edges, folder_regions))
 
-            continue
+    if workers == 1:
+
+        for job in jobs:
+
+            write_routing_zone(job)
+
+    else:
 
-        #export nodes
-        path_nodes = os.path.join(folder_nodes, main_node.iloc[0][GID_level] + 
-                                  '.shp')
-        nodes.to_file(path_nodes, crs = 'epsg:4326')
+        with ProcessPoolExecutor(max_workers = workers) as executor:
 
-        #export edges
-        path_edges = os.path.join(folder_edges, main_node.iloc[0][GID_level] + 
-                                  '.shp')
-        fit_edges(path_nodes, path_edges, modeling_region)
-        folder_regions = os.path.join(DATA_PROCESSED, iso3, 'modeling_regions')
-        path = os.path.join(folder_regions, main_node.iloc[0][GID_level] + '.shp')
-        modeling_region.to_file(path, crs = 'epsg:4326')
+            list(executor.map(write_routing_zone, jobs))
 
 
     return None
 
 
-def fit_edges(input_path, output_path, modeling_region):
+def write_routing_zone(job):
     """
-    Fit edges to nodes using a minimum spanning tree.
+    Write the nodes, spanning tree edges and boundary of a modeling 
+    region.
 
     Parameters
     ----------
-    input_path : string
-        Path to the node shapefiles.
-    output_path : string
-        Path for writing the network edge shapefiles.
-    modeling_region : geojson
-        The modeling region being assessed.
+    job : tuple
+        Nodes of the modeling region, the modeling region, the GID it is 
+        written under and the folders of the nodes, edges and region 
+        datasets.
 
     """
-    folder = os.path.dirname(output_path)
-    if not os.path.exists(folder):
+    (nodes, modeling_region, region, folder_nodes, folder_edges, 
+     folder_regions) = job
+
+    write_region_layer(nodes, folder_nodes, region)
+    fit_edges(None, os.path.join(folder_edges, region + '.shp'), 
+              modeling_region, nodes)
+    write_region_layer(modeling_region, folder_regions, region)
 
-        os.makedirs(folder)
 
-    nodes = gpd.read_file(input_path, crs = 'epsg:4326')
-    nodes = nodes.to_crs('epsg:3857')
+    return None
 
-    all_possible_edges = []
-    for node1_id, node1 in nodes.iterrows():
 
-        for node2_id, node2 in nodes.iterrows():
+def load_routing_graph(iso3):
+    """
+    This function loads the street graph of a country for road routing.
 
-            if node1_id != node2_id:
+    Parameters
+    ----------
+    iso3 : string
+        Country ISO3 code
 
-                geom1 = shape(node1['geometry'])
-                geom2 = shape(node2['geometry'])
-                line = LineString([geom1, geom2])
-                all_possible_edges.append({
-                    'type': 'Feature',
-                    'geometry': mapping(line),
-                    'properties':{
-                        'from': node1_id,
-                        'to':  node2_id,
-                        'length': line.length,
-                        'regions': modeling_region['regions'].iloc()[0],}})
-                
-    if len(all_possible_edges) == 0:
+    Returns
+    -------
+    graph : StreetGraph
+        The street graph, or None when the country has none.
+
+    """
+    folder = os.path.join(DATA_PROCESSED, iso3, 'street_graph')
+    if not street_graph_exists(folder):
 
-        return
-    G = nx.Graph()
+        print('No street graph for {}, routing fiber in straight lines'.format(
+            iso3))
 
-    for node_id, node in enumerate(nodes):
+        return None
 
-        G.add_node(node_id, object = node)
 
-    for edge in all_possible_edges:
+    return load_street_graph(folder)
 
-        G.add_edge(edge['properties']['from'], edge['properties']['to'],
-            object = edge, weight = edge['properties']['length'])
-        
-    tree = nx.minimum_spanning_edges(G)
-    edges = []
 
-    for branch in tree:
+def fit_tree(nodes, routing = None):
+    """
+    Fit minimum spanning tree edges to nodes in the routing mode.
+
+    Parameters
+    ----------
+    nodes : geodataframe
+        Nodes with an 'iso3' column, in EPSG:4326.
+    routing : string
+        'euclidean' for straight edges or 'road' for edges along the street 
+        graph. Defaults to the pipeline routing mode.
+
+    Returns
+    -------
+    edges : geodataframe
+        Edges in EPSG:4326.
+
+    """
+    routing = routing or get_routing_mode()
+    graph = None
+
+    if routing == 'road' and len(nodes) > 1:
+
+        graph = load_routing_graph(nodes['iso3'].iloc[0])
+
+    if graph is not None:
+
+        return fit_road_edges(nodes, graph)
+
+    edges = fit_tree_edges(nodes.to_crs('epsg:3857'))
+
+
+    return edges.to_crs('epsg:4326')
+
+
+def fit_edges(input_path, output_path, modeling_region, nodes = None, 
+              routing = None):
+    """
+    Fit edges to nodes using a minimum spanning tree.
+
+    Parameters
+    ----------
+    input_path : string
+        Path to the node shapefiles.
+    output_path : string
+        Path for writing the network edges, named after the region and
+        written as a region layer of its folder.
+    modeling_region : geojson
+        The modeling region being assessed.
+    nodes : geodataframe
+        Nodes already held in memory, read from input_path when None.
+    routing : string
+        'euclidean' or 'road', defaults to the pipeline routing mode.
+
+    """
+    folder = os.path.dirname(output_path)
+    if not os.path.exists(folder):
+
+        os.makedirs(folder)
 
-        link = branch[2]['object']
-        if link['properties']['length'] > 0:
+    if nodes is None:
 
-            edges.append(link)
+        nodes = read_layer(input_path)
 
-    edges = gpd.GeoDataFrame.from_features(edges, crs = 'epsg:3857')
+    edges = fit_tree(nodes, routing)
+    edges['regions'] = modeling_region['regions'].iloc()[0]
 
     if len(edges) > 0:
 
-        edges = edges.to_crs('epsg:4326')
-        edges.to_file(output_path)
+        folder, filename = os.path.split(output_path)
+        write_region_layer(edges, folder, os.path.splitext(filename)[0])
 
     return
 
@@ -1227,51 +1118,27 @@ def create_region_nodes(iso3):
     print('Creating individual regional nodes for {}'.format(iso3))
     file_in = os.path.join(DATA_PROCESSED, iso3, 'network_routing_structure', 
                                'regional_nodes.shp')
-    gdf = gpd.read_file(file_in) 
+    gdf = read_layer(file_in) 
     grouped_gdf = gdf.groupby('GID_1')
 
     for gid, group_df in grouped_gdf:
 
-        geometries = []
-        populations = []
-        types = []
-
-        for index, row in group_df.iterrows():
-            
-            point = Point(row['lon'], row['lat'])
-            geometries.append(point)
-
-            populations.append(row['population'])
-            types.append(row['type'])
-
-        group_gdf = gpd.GeoDataFrame(geometry = geometries, crs = gdf.crs)
-
-        group_gdf['population'] = populations
-        group_gdf['type'] = types
-        group_gdf[['iso3', 'GID_1']] = ''
-        for i in range(len(group_gdf)):
-
-            group_gdf['GID_1'].loc[i] = gid
-            group_gdf['iso3'].loc[i] = iso3
-
-        group_gdf = group_gdf[['iso3', 'GID_1', 'population', 'type', 'geometry'
-                               ]]
-        filename = f'{gid}.shp'    
+        group_gdf = gpd.GeoDataFrame({
+            'iso3': iso3,
+            'GID_1': gid,
+            'population': group_df['population'].values,
+            'type': group_df['type'].values},
+            geometry = gpd.points_from_xy(group_df['lon'], group_df['lat']),
+            crs = gdf.crs)
         folder_out = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
                                 'regions', 'nodes')
-        
-        if not os.path.exists(folder_out):
-
-            os.makedirs(folder_out)
-
-        path_out = os.path.join(folder_out, filename)
-        group_gdf.to_file(path_out, index = False)
+        write_region_layer(group_gdf, folder_out, gid)
 
 
     return None
 
 
-def fit_regional_node_edges(iso3):
+def fit_regional_node_edges(iso3, routing = None):
     """
     This function fits edges between geospatial points using minimum spanning 
     tree
@@ -1280,110 +1147,34 @@ def fit_regional_node_edges(iso3):
     ----------
     iso3 : string
         Country ISO3 code
+    routing : string
+        'euclidean' or 'road', defaults to the pipeline routing mode.
     """
     print('Fitting {} regional edges'.format(iso3))
     input_path = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
                                   'regions', 'nodes')
-    files = os.listdir(input_path)
-    for file in files:
-        
-        if file.endswith('.shp'): 
-
-            file_path = os.path.join(input_path, file)
-            nodes = gpd.read_file(file_path, crs = 'epsg:4326')
-            if len(nodes) == 1 and nodes.geometry.geom_type[0] == 'Point':
-
-                pass
-
-            else:
-
-                nodes = nodes.to_crs('epsg:3857')
-
-                all_possible_edges = []
-                try:
-                    for node1_id, node1 in nodes.iterrows():
-
-                        for node2_id, node2 in nodes.iterrows():
-
-                            if node1_id != node2_id:
-
-                                geom1 = shape(node1['geometry'])
-                                geom2 = shape(node2['geometry'])
-                                line = LineString([geom1, geom2])
-                                all_possible_edges.append({
-                                    'type': 'Feature',
-                                    'geometry': mapping(line),
-                                    'properties':{
-                                        'GID_1': node2['GID_2'],
-                                        'from': node1_id,
-                                        'to':  node2_id,
-                                        'length': line.length,
-                                        'source': 'new',
-                                    }
-                                })
-                except:
-                    for node1_id, node1 in nodes.iterrows():
-
-                        for node2_id, node2 in nodes.iterrows():
-
-                            if node1_id != node2_id:
-
-                                geom1 = shape(node1['geometry'])
-                                geom2 = shape(node2['geometry'])
-                                line = LineString([geom1, geom2])
-                                all_possible_edges.append({
-                                    'type': 'Feature',
-                                    'geometry': mapping(line),
-                                    'properties':{
-                                        'GID_1': node2['GID_1'],
-                                        'from': node1_id,
-                                        'to':  node2_id,
-                                        'length': line.length,
-                                        'source': 'new',
-                                    }
-                                })
-
-                if len(all_possible_edges) == 0:
-
-                    return
-                
-                G = nx.Graph()
-
-                for node_id, node in enumerate(nodes):
-
-                    G.add_node(node_id, object = node)
-
-                for edge in all_possible_edges:
-
-                    G.add_edge(edge['properties']['from'], edge['properties']['to'],
-                        object=edge, weight=edge['properties']['length'])
+    for region in list_regions(input_path):
 
-                tree = nx.minimum_spanning_edges(G)
+        nodes = read_region_layer(input_path, region)
+        if len(nodes) == 1 and nodes.geometry.geom_type[0] == 'Point':
 
-                edges = []
+            pass
 
-                for branch in tree:
+        else:
 
-                    link = branch[2]['object']
-                    if link['properties']['length'] > 0:
+            edges = fit_tree(nodes, routing)
 
-                        edges.append(link)
+            if len(edges) == 0:
 
-                edges = gpd.GeoDataFrame.from_features(edges, crs = 'epsg:3857')
+                continue
 
-                if len(edges) > 0:
+            gid = 'GID_2' if 'GID_2' in nodes.columns else 'GID_1'
+            edges.insert(0, 'GID_1', nodes.loc[edges['to'], gid].values)
+            edges['source'] = 'new'
 
-                    edges = edges.to_crs('epsg:4326')
-                    fileout = str(file)
-
-                folder_out = os.path.join(DATA_PROCESSED, iso3, 
-                            'buffer_routing_zones', 'regions', 'edges')
-                if not os.path.exists(folder_out):
-
-                    os.makedirs(folder_out)
-
-                path_out = os.path.join(folder_out, fileout)
-                edges.to_file(path_out, driver = 'ESRI Shapefile')
+            folder_out = os.path.join(DATA_PROCESSED, iso3, 
+                        'buffer_routing_zones', 'regions', 'edges')
+            write_region_layer(edges, folder_out, region)
 
 
     return None
@@ -1399,25 +1190,15 @@ def combine_access_nodes(iso3):
         Country ISO3 code
     """
     print('Combining access node shapefiles for {}'.format(iso3))
-    shapefile_dir = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                                 'nodes')
-    shapefiles = [os.path.join(shapefile_dir, f) for f in os.listdir(
-        shapefile_dir) if f.endswith('.shp')]
-    gdf_combined = gpd.GeoDataFrame(pd.concat([gpd.read_file(shp) for shp in 
-                                            shapefiles], ignore_index = True))
-
+    folder_in = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
+                             'nodes')
     folder_out = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                               'combined')
+                              'combined')
     fileout = '{}_combined_access_nodes.shp'.format(iso3)
-    if not os.path.exists(folder_out):
-        
-        os.makedirs(folder_out)
-
-    path_out = os.path.join(folder_out, fileout)
-    gdf_combined.to_file(path_out, index = False)
+    combine_regions(folder_in, os.path.join(folder_out, fileout))
 
 
-    return None 
+    return None
 
 
 def combine_access_edges(iso3):
@@ -1430,35 +1211,14 @@ def combine_access_edges(iso3):
         Country ISO3 code
     """
     print('Combining access edges shapefiles for {}'.format(iso3))
-    merged_shapefile = gpd.GeoDataFrame()
-    shapefile_dir = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                                 'edges')
-    for file_name in os.listdir(shapefile_dir):
-
-        if file_name.endswith('.shp'):
-
-            file_path = os.path.join(shapefile_dir, file_name)
-            shapefile = gpd.read_file(file_path)
-            shapefile[['GID_2', 'strategy']] = ''
-            base_name, extension = os.path.splitext(file_name)
-
-            for i in range(len(shapefile)):
-
-                shapefile['GID_2'].loc[i] = base_name  
-                shapefile['strategy'].loc[i] = 'access'
-
-            merged_shapefile = pd.concat([merged_shapefile, shapefile], 
-                                         ignore_index = True) 
-          
+    folder_in = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
+                             'edges')
     folder_out = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                               'combined')
+                              'combined')
     fileout = '{}_combined_access_edges.shp'.format(iso3)
-    if not os.path.exists(folder_out):
-        
-        os.makedirs(folder_out)
+    combine_regions(folder_in, os.path.join(folder_out, fileout), 'GID_2',
+                    {'strategy': 'access'})
 
-    path_out = os.path.join(folder_out, fileout)
-    merged_shapefile.to_file(path_out, index = False)
 
     return None
 
@@ -1480,10 +1240,10 @@ def generate_access_csv(iso3):
     edge_path = os.path.join(folder_in, '{}_combined_access_edges.shp'.format(
         iso3))
     
-    gdf = gpd.read_file(node_path)
+    gdf = read_layer(node_path)
     gdf = gdf.drop(columns = ['regions', 'id', 'GID_0', 'geometry'])
 
-    gdf1 = gpd.read_file(edge_path)
+    gdf1 = read_layer(edge_path)
     
     if iso3 == 'GMB':
 
@@ -1503,10 +1263,7 @@ def generate_access_csv(iso3):
             gdf.rename(columns = {'GID_1': 'GID_2'}, inplace = True)
             merged_df = pd.merge(gdf, gdf1, on = 'GID_2', how = 'inner')
 
-        merged_df['length_km'] = ''
-        for i in range(len(merged_df)):
-
-            merged_df['length_km'].loc[i] = merged_df['length'].loc[i] / 1000
+        merged_df['length_km'] = merged_df['length'] / 1000
         
         merged_df['algorithm'] = 'Dijkstras'
         merged_df = merged_df.drop(columns = ['length']).reset_index()
@@ -1534,25 +1291,15 @@ def combine_regional_nodes(iso3):
         Country ISO3 code
     """
     print('Combining regional node shapefiles for {}'.format(iso3))
-    shapefile_dir = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                                'regions', 'nodes')
-    shapefiles = [os.path.join(shapefile_dir, f) for f in os.listdir(
-        shapefile_dir) if f.endswith('.shp')]
-    gdf_combined = gpd.GeoDataFrame(pd.concat([gpd.read_file(shp) for shp in 
-                                            shapefiles], ignore_index = True))
-    
+    folder_in = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
+                             'regions', 'nodes')
     folder_out = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                            'combined')
+                              'combined')
     fileout = '{}_combined_regional_nodes.shp'.format(iso3)
-    if not os.path.exists(folder_out):
-        
-        os.makedirs(folder_out)
+    combine_regions(folder_in, os.path.join(folder_out, fileout))
 
-    path_out = os.path.join(folder_out, fileout)
-    gdf_combined.to_file(path_out, index = False)
 
-
-    return None 
+    return None
 
 
 def combine_regional_edges(iso3):
@@ -1565,42 +1312,18 @@ def combine_regional_edges(iso3):
         Country ISO3 code
     """
     print('Combining regional edges shapefiles for {}'.format(iso3))
-    merged_shapefile = gpd.GeoDataFrame()
-    shapefile_dir = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                                 'regions', 'edges')
-    try:
-        for file_name in os.listdir(shapefile_dir):
-
-            if file_name.endswith('.shp'):
-
-                file_path = os.path.join(shapefile_dir, file_name)
-                shapefile = gpd.read_file(file_path)
-                shapefile[['GID_2', 'strategy']] = ''
-                base_name, extension = os.path.splitext(file_name)
-
-                for i in range(len(shapefile)):
-
-                    shapefile['GID_2'].loc[i] = base_name  
-                    shapefile['strategy'].loc[i] = 'regional'
-
-                merged_shapefile = pd.concat([merged_shapefile, shapefile], 
-                                            ignore_index = True) 
-            
-        folder_out = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                                'combined')
-        fileout = '{}_combined_regional_edges.shp'.format(iso3)
-        if not os.path.exists(folder_out):
-            
-            os.makedirs(folder_out)
-
-        path_out = os.path.join(folder_out, fileout)
-        merged_shapefile.to_file(path_out, index = False)
-    except:
+    folder_in = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
+                             'regions', 'edges')
+    folder_out = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
+                              'combined')
+    fileout = '{}_combined_regional_edges.shp'.format(iso3)
+    combine_regions(folder_in, os.path.join(folder_out, fileout), 'GID_2',
+                    {'strategy': 'regional'})
 
-        print('Regional edges already fitted')
 
     return None
 
+
 def generate_regional_csv(iso3):
     """
     This function generates a csv file for regional level.
@@ -1618,12 +1341,12 @@ def generate_regional_csv(iso3):
     edge_path = os.path.join(folder_in, '{}_combined_regional_edges.shp'.format(
         iso3))
     
-    gdf = gpd.read_file(node_path)
+    gdf = read_layer(node_path)
     gdf = gdf.drop(columns = ['geometry'])
 
     try:
 
-        gdf1 = gpd.read_file(edge_path)
+        gdf1 = read_layer(edge_path)
         gdf1 = gdf1.drop(columns = ['geometry', 'to', 'from']
                         ).reset_index()
         gdf1 = gdf1.groupby(['GID_1', 'strategy'])['length'].sum().reset_index()
@@ -1637,10 +1360,7 @@ def generate_regional_csv(iso3):
             gdf.rename(columns = {'GID_1': 'GID_1'}, inplace = True)
             merged_df = pd.merge(gdf, gdf1, on = 'GID_1', how = 'inner')
 
-        merged_df['length_km'] = ''
-        for i in range(len(merged_df)):
-
-            merged_df['length_km'].loc[i] = merged_df['length'].loc[i] / 1000
+        merged_df['length_km'] = merged_df['length'] / 1000
         
         merged_df['algorithm'] = 'Dijkstras'
         merged_df = merged_df.drop(columns = ['length']).reset_index()
@@ -1677,21 +1397,18 @@ def generate_existing_fiber_csv(iso3):
     edge_path = os.path.join(folder_in, '{}_core_edges_existing.shp'.format(
         iso3))
     
-    if os.path.exists(edge_path):
+    if layer_exists(edge_path):
 
-        gdf = gpd.read_file(node_path)
+        gdf = read_layer(node_path)
         gdf = gdf.drop(columns = ['geometry'])
 
-        gdf1 = gpd.read_file(edge_path)
-        gdf1[['iso3', 'length_km', 'nodes', 'strategy']] = ''
+        gdf1 = read_layer(edge_path)
         #111.32km is equaivalent to 1 decimal degree. The distance calculated 
         #from EPSG:4326 coordinate system is always in decimal degrees
-        for i in range(len(gdf1)):
-
-            gdf1['iso3'].loc[i] = iso3
-            gdf1['nodes'].loc[i] = len(gdf1)
-            gdf1['length_km'].loc[i] = (gdf1['geometry'].loc[i]).length * 111.32
-            gdf1['strategy'].loc[i] = 'existing'
+        gdf1['iso3'] = iso3
+        gdf1['length_km'] = gdf1.geometry.length * 111.32
+        gdf1['nodes'] = len(gdf1)
+        gdf1['strategy'] = 'existing'
 
         gdf1 = gdf1.drop(columns = ['geometry', 'operators', 'source']
                         ).reset_index()
@@ -1732,42 +1449,15 @@ def combine_pcsf_access_edges(iso3):
     iso3 : string
         Country ISO3 code
     """
-    try: 
-        print('Combining PCSF access edges shapefiles for {}'.format(iso3))
-        merged_shapefile = gpd.GeoDataFrame()
-        shapefile_dir = os.path.join(DATA_RESULTS, iso3, 'pcsf_solutions', 
-                                    'regions_soln')
-        for file_name in os.listdir(shapefile_dir):
-
-            if file_name.endswith('.shp'):
-
-                file_path = os.path.join(shapefile_dir, file_name)
-                shapefile = gpd.read_file(file_path)
-                shapefile[['GID_2', 'strategy', 'algorithm']] = ''
-                base_name = '_'.join(file_name.split('_')[:-1])
-
-                for i in range(len(shapefile)):
-
-                    shapefile['GID_2'].loc[i] = base_name  
-                    shapefile['strategy'].loc[i] = 'access'
-                    shapefile['algorithm'].loc[i] = 'pcsf'
-
-                merged_shapefile = pd.concat([merged_shapefile, shapefile], 
-                                            ignore_index = True) 
-            
-        folder_out = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                                'combined')
-        fileout = '{}_combined_pcsf_access_edges.shp'.format(iso3)
-        if not os.path.exists(folder_out):
-            
-            os.makedirs(folder_out)
-
-        path_out = os.path.join(folder_out, fileout)
-        merged_shapefile.to_file(path_out, index = False)
-
-    except:
+    print('Combining PCSF access edges shapefiles for {}'.format(iso3))
+    folder_in = os.path.join(DATA_RESULTS, iso3, 'pcsf_solutions', 
+                             'regions_soln')
+    folder_out = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
+                              'combined')
+    fileout = '{}_combined_pcsf_access_edges.shp'.format(iso3)
+    combine_regions(folder_in, os.path.join(folder_out, fileout), 'GID_2',
+                    {'strategy': 'access', 'algorithm': 'pcsf'}, '_edges')
 
-        pass
 
     return None
 
@@ -1783,25 +1473,15 @@ def combine_pcsf_regional_nodes(iso3):
         Country ISO3 code
     """
     print('Combining PCSF regional node shapefiles for {}'.format(iso3))
-    shapefile_dir = os.path.join(DATA_PROCESSED, iso3, 'pcsf_region_nodes')
-
-    shapefiles = [os.path.join(shapefile_dir, files) for files in os.listdir(
-        shapefile_dir) if files.endswith('updated.shp')]
-    gdf_combined = gpd.GeoDataFrame(pd.concat([gpd.read_file(shp) for shp in 
-                                            shapefiles], ignore_index = True))
-    
+    folder_in = os.path.join(DATA_PROCESSED, iso3, 'pcsf_region_nodes')
     folder_out = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                            'combined')
+                              'combined')
     fileout = '{}_combined_pcsf_regional_nodes.shp'.format(iso3)
-    if not os.path.exists(folder_out):
-        
-        os.makedirs(folder_out)
-
-    path_out = os.path.join(folder_out, fileout)
-    gdf_combined.to_file(path_out, index = False)
+    combine_regions(folder_in, os.path.join(folder_out, fileout),
+                    suffix = '_updated')
 
 
-    return None 
+    return None
 
 
 def generate_pcsf_regional_csv(iso3):
@@ -1822,12 +1502,12 @@ def generate_pcsf_regional_csv(iso3):
     edge_path = os.path.join(folder_in, '{}_combined_pcsf_access_edges.shp'.format(
         iso3))
     
-    gdf = gpd.read_file(node_path)
+    gdf = read_layer(node_path)
     gdf = gdf.drop(columns = ['geometry'])
 
     try:
 
-        gdf1 = gpd.read_file(edge_path)
+        gdf1 = read_layer(edge_path)
         gdf1 = gdf1.drop(columns = ['id', 'start', 'strategy', 'end', 'type']
                         ).reset_index()
         gdf1.rename(columns = {'GID_2': 'GID_1'}, 
@@ -1846,10 +1526,7 @@ def generate_pcsf_regional_csv(iso3):
             gdf.rename(columns = {'GID_1': 'GID_1'}, inplace = True)
             merged_df = pd.merge(gdf, gdf1, on = 'GID_1', how = 'inner')
 
-        merged_df['length_km'] = ''
-        for i in range(len(merged_df)):
-
-            merged_df['length_km'].loc[i] = merged_df['length'].loc[i] * 110.567
+        merged_df['length_km'] = merged_df['length'] * 110.567
         
         merged_df = merged_df.drop(columns = ['length']).reset_index()
 
@@ -1887,12 +1564,12 @@ def generate_pcsf_access_csv(iso3):
     edge_path = os.path.join(folder_in, '{}_combined_pcsf_access_edges.shp'.format(
         iso3))
     
-    gdf = gpd.read_file(node_path)
+    gdf = read_layer(node_path)
     gdf = gdf.drop(columns = ['geometry'])
 
     try:
 
-        gdf1 = gpd.read_file(edge_path)
+        gdf1 = read_layer(edge_path)
         gdf1 = gdf1.drop(columns = ['id', 'start', 'strategy', 'end', 'type']
                         ).reset_index()
         gdf1.rename(columns = {'GID_2': 'GID_1'}, 
@@ -1913,10 +1590,7 @@ def generate_pcsf_access_csv(iso3):
             gdf.rename(columns = {'GID_1': 'GID_1'}, inplace = True)
             merged_df = pd.merge(gdf, gdf1, on = 'GID_1', how = 'inner')
 
-        merged_df['length_km'] = ''
-        for i in range(len(merged_df)):
-
-            merged_df['length_km'].loc[i] = merged_df['length'].loc[i] * 110.567
+        merged_df['length_km'] = merged_df['length'] * 110.567
         
         merged_df = merged_df.drop(columns = ['length']).reset_index()
         merged_df = merged_df[['iso3', 'GID_1', 'GID_2', 'population', 
@@ -0,0 +1,878 @@
+"""
+Prize-collecting Steiner forest solver for fiber access networks.
+
+Settlements are the nodes of the problem, their population times a value
+per person is the prize collected by connecting them, and the candidate
+trench routes between them are the edges, weighted by their cost. The
+candidate routes are the Delaunay edges of the settlements, which contain
+their Euclidean minimum spanning tree, so each region has O(n) edges.
+
+The forest is found with the Goemans-Williamson growth and pruning
+algorithm, in the form of Hegde, Indyk and Schmidt (2015): every cluster
+keeps the pending events of its edges in a pairing heap, which merges in
+O(1) when clusters merge and shifts all of its events in O(1) when an
+inactive cluster resumes growing. The next edge event and the next
+cluster deactivation are taken from two binary heaps over the clusters.
+Each event costs O(log n) amortised, so a region of n settlements is
+solved in O(n log n) time. The grown forest is then pruned strongly:
+every subtree whose prizes do not pay for the edge joining it is cut off,
+from the root giving the most valuable tree.
+
+Run the solver over the per-region node files of a country with
+
+    python src/glassfibre/pcst.py --iso3 KEN
+
+"""
+import argparse
+import configparser
+import heapq
+import os
+import time
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, connected_components
+from shapely import linestrings
+from glassfibre.spanning_tree import candidate_edges
+from glassfibre.street_graph import haversine
+from glassfibre.storage import (list_regions, read_region_layer,
+                                write_region_layer)
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+BASE_PATH = CONFIG['file_locations']['base_path']
+
+DATA_RAW = os.path.join(BASE_PATH, 'raw')
+DATA_PROCESSED = os.path.join(BASE_PATH, '..', 'results', 'processed')
+DATA_RESULTS = os.path.join(BASE_PATH, '..', 'results', 'final')
+
+COST_PER_KM = CONFIG.getfloat('pcst', 'cost_per_km', fallback = 2000)
+PRIZE_PER_PERSON = CONFIG.getfloat('pcst', 'prize_per_person', fallback = 10)
+
+# Folders of the region node files read and of the forests written, and
+# the strategy recorded on the edges, for each level of the network.
+LEVELS = {
+    'regional': {'nodes': 'pcsf_regional_nodes', 'edges': 'regions_soln',
+                 'solution': 'pcsf_region_nodes', 'strategy': 'regional'},
+    'access': {'nodes': 'pcsf_subregional_nodes', 'edges': 'subregions_soln',
+               'solution': 'pcsf_subregion_nodes', 'strategy': 'access'},
+}
+
+
+class PairingHeap:
+
+    """
+    This class holds a pool of pairing heaps sharing their nodes, each heap
+    being referred to by its root node (-1 when empty). A value can be
+    added to every key of a heap in O(1), the addition being pushed down
+    to the children of a root when it is removed.
+    """
+
+    def __init__(self):
+        """
+        A class constructor
+        """
+        self.value = []
+        self.offset = []
+        self.child = []
+        self.sibling = []
+        self.left_up = []
+        self.payload = []
+        self.free = []
+
+
+    def make_node(self, value, payload):
+        """
+        Return a new heap node holding a single key.
+
+        """
+        if self.free:
+
+            node = self.free.pop()
+            self.value[node] = value
+            self.offset[node] = 0.0
+            self.child[node] = -1
+            self.sibling[node] = -1
+            self.left_up[node] = -1
+            self.payload[node] = payload
+
+            return node
+
+        self.value.append(value)
+        self.offset.append(0.0)
+        self.child.append(-1)
+        self.sibling.append(-1)
+        self.left_up.append(-1)
+        self.payload.append(payload)
+
+
+        return len(self.value) - 1
+
+
+    def link(self, first, second):
+        """
+        Link two heap roots and return the root of the result.
+
+        """
+        if first == -1:
+
+            return second
+
+        if second == -1:
+
+            return first
+
+        value = self.value
+        if value[second] < value[first]:
+
+            first, second = second, first
+
+        # The second root now lies below the first, so it takes on the
+        # additions still pending on the children of the first.
+        offset = self.offset[first]
+        value[second] -= offset
+        self.offset[second] -= offset
+
+        child = self.child[first]
+        self.sibling[second] = child
+        if child != -1:
+
+            self.left_up[child] = second
+
+        self.left_up[second] = first
+        self.child[first] = second
+        self.sibling[first] = -1
+        self.left_up[first] = -1
+
+
+        return first
+
+
+    def insert(self, root, value, payload):
+        """
+        Insert a key into a heap.
+
+        Returns
+        -------
+        root : int
+            Root of the heap.
+        node : int
+            Node of the key.
+
+        """
+        node = self.make_node(value, payload)
+
+
+        return self.link(root, node), node
+
+
+    def add_to_all(self, root, amount):
+        """
+        Add a value to every key of a heap.
+
+        """
+        if root != -1:
+
+            self.value[root] += amount
+            self.offset[root] += amount
+
+
+    def delete_min(self, root):
+        """
+        Remove the smallest key of a heap.
+
+        Returns
+        -------
+        root : int
+            Root of the remaining heap.
+        value : float
+            The smallest key.
+        payload : int
+            Payload of the smallest key.
+
+        """
+        values, offsets, siblings = self.value, self.offset, self.sibling
+        value, payload = values[root], self.payload[root]
+        offset = offsets[root]
+        children = []
+        child = self.child[root]
+
+        while child != -1:
+
+            if offset:
+
+                values[child] += offset
+                offsets[child] += offset
+
+            children.append(child)
+            child = siblings[child]
+
+        self.free.append(root)
+
+        # Two pass pairing of the children.
+        link = self.link
+        paired = [link(children[i], children[i + 1]) for i in
+                  range(0, len(children) - 1, 2)]
+        root = -1
+        if len(children) % 2:
+
+            root = children[-1]
+            self.left_up[root] = -1
+
+        for child in reversed(paired):
+
+            root = link(child, root)
+
+
+        return root, value, payload
+
+
+    def decrease_key(self, root, node, from_value, to_value):
+        """
+        Lower the key of a heap node, returning the root of the heap.
+
+        Parameters
+        ----------
+        root : int
+            Root of the heap.
+        node : int
+            Node of the key.
+        from_value : float
+            Current key of the node, from which the additions pending on
+            its ancestors are recovered.
+        to_value : float
+            New key of the node.
+
+        """
+        # The node carries the additions of its ancestors to its subtree
+        # once it is cut out.
+        self.offset[node] += from_value - self.value[node]
+        self.value[node] = to_value
+        if node == root:
+
+            return root
+
+        left = self.left_up[node]
+        following = self.sibling[node]
+        if self.child[left] == node:
+
+            self.child[left] = following
+
+        else:
+
+            self.sibling[left] = following
+
+        if following != -1:
+
+            self.left_up[following] = left
+
+        self.sibling[node] = -1
+        self.left_up[node] = -1
+
+
+        return self.link(root, node)
+
+
+def grow_clusters(prizes, edges, costs, num_clusters = 1):
+    """
+    This function grows the moats of the Goemans-Williamson algorithm until
+    no more than a given number of clusters remain active.
+
+    Parameters
+    ----------
+    prizes : numpy array
+        Non-negative prize of each node.
+    edges : numpy array
+        Array of shape (m, 2) containing the node index pairs of the edges.
+    costs : numpy array
+        Non-negative cost of each edge.
+    num_clusters : int
+        Number of active clusters at which the growth stops, and so the
+        number of trees of the forest.
+
+    Returns
+    -------
+    chosen : numpy array
+        Edges that merged two clusters, in merge order.
+    good : numpy array
+        Boolean mask of the nodes of the clusters still active at the end.
+
+    """
+    n = len(prizes)
+    eu, ev = np.asarray(edges, dtype = np.int64).reshape(-1, 2).T.tolist()
+    costs = np.asarray(costs, dtype = float).tolist()
+
+    # Per cluster state. The first n clusters are the nodes, each merge
+    # appends a new cluster.
+    active = [True] * n
+    start = [0.0] * n
+    end = [0.0] * n
+    moat = [0.0] * n
+    prize_sum = np.asarray(prizes, dtype = float).tolist()
+    sub_moat = [0.0] * n
+    merged_into = [-1] * n
+    children = [None] * n
+    skip_up = [-1] * n
+    skip_up_sum = [0.0] * n
+    part_heap = [-1] * n
+    queue_version = [0] * n
+
+    # Edge parts 2e and 2e + 1 are the halves of edge e growing from its
+    # first and second node.
+    next_value = [0.0] * (2 * len(costs))
+    deleted = [False] * (2 * len(costs))
+    part_node = [-1] * (2 * len(costs))
+
+    parts = PairingHeap()
+
+    for e, cost in enumerate(costs):
+
+        next_value[2 * e] = next_value[2 * e + 1] = cost / 2
+        part_heap[eu[e]], part_node[2 * e] = parts.insert(
+            part_heap[eu[e]], cost / 2, 2 * e)
+        part_heap[ev[e]], part_node[2 * e + 1] = parts.insert(
+            part_heap[ev[e]], cost / 2, 2 * e + 1)
+
+    # The next event of each active cluster and the deactivation time of
+    # each active cluster, entries of clusters that have since changed being
+    # skipped when they come up.
+    queue = []
+    deactivation = [(prize, cluster) for cluster, prize in
+                    enumerate(prize_sum)]
+    heapq.heapify(deactivation)
+
+    def requeue(cluster):
+
+        queue_version[cluster] += 1
+        if part_heap[cluster] != -1:
+
+            heapq.heappush(queue, (parts.value[part_heap[cluster]],
+                                   queue_version[cluster], cluster))
+
+    for cluster in range(n):
+
+        requeue(cluster)
+
+    def sum_on_part(part, now):
+
+        node = eu[part >> 1] if part % 2 == 0 else ev[part >> 1]
+        total = 0.0
+        path = []
+
+        while merged_into[node] != -1:
+
+            path.append((node, total))
+            if skip_up[node] != -1:
+
+                total += skip_up_sum[node]
+                node = skip_up[node]
+
+            else:
+
+                total += moat[node]
+                node = merged_into[node]
+
+        for visited, before in path:
+
+            skip_up[visited] = node
+            skip_up_sum[visited] = total - before
+
+        if active[node]:
+
+            finished = total
+            total += now - start[node]
+
+        else:
+
+            total += moat[node]
+            finished = total
+
+
+        return total, finished, node
+
+    num_active = n
+    chosen = []
+
+    while num_active > num_clusters:
+
+        while queue and queue[0][1] != queue_version[queue[0][2]]:
+
+            heapq.heappop(queue)
+
+        while deactivation and not active[deactivation[0][1]]:
+
+            heapq.heappop(deactivation)
+
+        next_edge = queue[0][0] if queue else np.inf
+        next_deactivation = deactivation[0][0] if deactivation else np.inf
+
+        if next_edge == np.inf and next_deactivation == np.inf:
+
+            break
+
+        if next_edge < next_deactivation:
+
+            now = next_edge
+            value, version, cluster = heapq.heappop(queue)
+            part_heap[cluster], value, part = parts.delete_min(
+                part_heap[cluster])
+            part_node[part] = -1
+            requeue(cluster)
+
+            if deleted[part]:
+
+                continue
+
+            other = part ^ 1
+            total, finished, cluster = sum_on_part(part, now)
+            other_total, other_finished, other_cluster = sum_on_part(other, now)
+
+            if cluster == other_cluster:
+
+                deleted[other] = True
+                continue
+
+            e = part >> 1
+            remainder = costs[e] - total - other_total
+
+            if remainder <= 1e-9 * max(costs[e], 1.0):
+
+                chosen.append(e)
+                deleted[other] = True
+                merged = len(active)
+
+                for side in (cluster, other_cluster):
+
+                    merged_into[side] = merged
+                    queue_version[side] += 1
+                    if active[side]:
+
+                        active[side] = False
+                        end[side] = now
+                        moat[side] = now - start[side]
+                        num_active -= 1
+
+                    else:
+
+                        # Events of an inactive cluster resume from now.
+                        parts.add_to_all(part_heap[side], now - end[side])
+
+                active.append(True)
+                start.append(now)
+                end.append(0.0)
+                moat.append(0.0)
+                prize_sum.append(prize_sum[cluster] + prize_sum[other_cluster])
+                sub_moat.append(sub_moat[cluster] + moat[cluster] +
+                                sub_moat[other_cluster] + moat[other_cluster])
+                merged_into.append(-1)
+                children.append((cluster, other_cluster))
+                skip_up.append(-1)
+                skip_up_sum.append(0.0)
+                part_heap.append(parts.link(part_heap[cluster],
+                                            part_heap[other_cluster]))
+                queue_version.append(0)
+                heapq.heappush(deactivation, (now + max(
+                    prize_sum[merged] - sub_moat[merged], 0.0), merged))
+                num_active += 1
+                requeue(merged)
+
+            elif active[other_cluster]:
+
+                # Both sides grow towards each other.
+                next_time = now + remainder / 2
+                next_value[part] = total + remainder / 2
+                part_heap[cluster], part_node[part] = parts.insert(
+                    part_heap[cluster], next_time, part)
+                requeue(cluster)
+
+                previous = (start[other_cluster] + next_value[other] -
+                            other_finished)
+                part_heap[other_cluster] = parts.decrease_key(
+                    part_heap[other_cluster], part_node[other], previous,
+                    next_time)
+                requeue(other_cluster)
+                next_value[other] = other_total + remainder / 2
+
+            else:
+
+                # Only this side grows, the other side waits for its cluster
+                # to become active again.
+                next_time = now + remainder
+                next_value[part] = total + remainder
+                part_heap[cluster], part_node[part] = parts.insert(
+                    part_heap[cluster], next_time, part)
+                requeue(cluster)
+
+                previous = (end[other_cluster] + next_value[other] -
+                            other_finished)
+                part_heap[other_cluster] = parts.decrease_key(
+                    part_heap[other_cluster], part_node[other], previous,
+                    end[other_cluster])
+                next_value[other] = other_finished
+
+        else:
+
+            now = next_deactivation
+            value, cluster = heapq.heappop(deactivation)
+            active[cluster] = False
+            end[cluster] = now
+            moat[cluster] = now - start[cluster]
+            num_active -= 1
+            queue_version[cluster] += 1
+
+    good = np.zeros(n, dtype = bool)
+    stack = [cluster for cluster in range(len(active)) if active[cluster] and
+             merged_into[cluster] == -1]
+
+    while stack:
+
+        cluster = stack.pop()
+        if cluster < n:
+
+            good[cluster] = True
+
+        else:
+
+            stack.extend(children[cluster])
+
+
+    return np.array(chosen, dtype = np.int64), good
+
+
+def pair_key(u, v, n):
+    """
+    This function returns a key identifying each unordered node pair.
+
+    """
+    return np.minimum(u, v) * n + np.maximum(u, v)
+
+
+def subtree_values(order, parent, parent_cost, prizes):
+    """
+    This function computes the net value of the subtree below each node of
+    a tree, counting a child subtree only where it pays for its edge.
+
+    Parameters
+    ----------
+    order : numpy array
+        Nodes of the tree in breadth first order.
+    parent : numpy array
+        Parent of each node.
+    parent_cost : numpy array
+        Cost of the edge from each node to its parent.
+    prizes : numpy array
+        Prize of each node.
+
+    Returns
+    -------
+    value : numpy array
+        Net value of the subtree of each node of the tree.
+
+    """
+    value = np.array(prizes, dtype = float)
+    for node in order[:0:-1]:
+
+        gain = value[node] - parent_cost[node]
+        if gain > 0:
+
+            value[parent[node]] += gain
+
+
+    return value
+
+
+def strong_pruning(prizes, edges, costs, chosen, good):
+    """
+    This function prunes the grown forest, keeping in each tree the most
+    valuable subtree.
+
+    Edges leaving the good nodes are dropped first. Each remaining tree is
+    rooted at the node giving it the largest net value, found by rerooting
+    the subtree values, and every subtree whose value does not exceed the
+    cost of the edge above it is cut off.
+
+    Parameters
+    ----------
+    prizes : numpy array
+        Prize of each node.
+    edges : numpy array
+        Array of shape (m, 2) containing the node index pairs of the edges.
+    costs : numpy array
+        Cost of each edge.
+    chosen : numpy array
+        Edges of the grown forest.
+    good : numpy array
+        Boolean mask of the nodes that may be kept.
+
+    Returns
+    -------
+    nodes : numpy array
+        Sorted nodes of the pruned forest.
+    edges : numpy array
+        Sorted edges of the pruned forest.
+
+    """
+    n = len(prizes)
+    prizes = np.asarray(prizes, dtype = float)
+    edges = np.asarray(edges, dtype = np.int64).reshape(-1, 2)
+    costs = np.asarray(costs, dtype = float)
+    chosen = chosen[good[edges[chosen, 0]] & good[edges[chosen, 1]]]
+
+    u, v = edges[chosen, 0], edges[chosen, 1]
+    keys = pair_key(u, v, n)
+    order_keys = np.argsort(keys)
+    forest = csr_matrix((np.ones(2 * len(chosen)),
+                         (np.concatenate([u, v]), np.concatenate([v, u]))),
+                        shape = (n, n))
+    component = connected_components(forest, directed = False)[1]
+
+    kept_nodes, kept_edges = [], []
+    for first in np.flatnonzero(good)[np.unique(component[good],
+                                                return_index = True)[1]]:
+
+        root = first
+        for rerooted in (False, True):
+
+            order, parent = breadth_first_order(forest, root, directed = False)
+            edge = np.full(n, -1, dtype = np.int64)
+            edge[order[1:]] = chosen[order_keys[np.searchsorted(
+                keys[order_keys], pair_key(parent[order[1:]], order[1:], n))]]
+            parent_cost = np.zeros(n)
+            parent_cost[order[1:]] = costs[edge[order[1:]]]
+            value = subtree_values(order, parent, parent_cost, prizes)
+
+            if rerooted:
+
+                break
+
+            # Value of the whole tree rooted at each node, passing the rest
+            # of the tree down from the parent.
+            full = value.copy()
+            for node in order[1:]:
+
+                outside = full[parent[node]] - max(value[node] -
+                                                   parent_cost[node], 0)
+                full[node] = value[node] + max(outside - parent_cost[node], 0)
+
+            root = order[np.argmax(full[order])]
+
+        keep = np.zeros(n, dtype = bool)
+        keep[root] = True
+        for node in order[1:]:
+
+            if keep[parent[node]] and value[node] - parent_cost[node] > 0:
+
+                keep[node] = True
+                kept_edges.append(edge[node])
+
+        kept_nodes.extend(order[keep[order]])
+
+
+    return np.sort(np.array(kept_nodes, dtype = np.int64)), np.sort(
+        np.array(kept_edges, dtype = np.int64))
+
+
+def pcsf(prizes, edges, costs, num_clusters = 1):
+    """
+    This function solves the prize-collecting Steiner forest problem with
+    the Goemans-Williamson algorithm and strong pruning.
+
+    Parameters
+    ----------
+    prizes : numpy array
+        Non-negative prize of each node.
+    edges : numpy array
+        Array of shape (m, 2) containing the node index pairs of the edges.
+    costs : numpy array
+        Non-negative cost of each edge.
+    num_clusters : int
+        Maximum number of trees of the forest.
+
+    Returns
+    -------
+    nodes : numpy array
+        Sorted nodes of the forest.
+    edges : numpy array
+        Sorted edges of the forest, as positions in the input edges.
+
+    """
+    chosen, good = grow_clusters(prizes, edges, costs, num_clusters)
+
+
+    return strong_pruning(prizes, edges, costs, chosen, good)
+
+
+def settlement_edges(lon, lat):
+    """
+    This function generates the candidate trench routes between
+    settlements, joining settlements that share a location directly.
+
+    Parameters
+    ----------
+    lon : numpy array
+        Longitude of the settlements.
+    lat : numpy array
+        Latitude of the settlements.
+
+    Returns
+    -------
+    edges : numpy array
+        Array of shape (m, 2) containing settlement index pairs.
+    length_km : numpy array
+        Great-circle length of each edge in kilometres.
+
+    """
+    scale = np.cos(np.radians(np.mean(lat)))
+    coords = np.column_stack([lon * scale, lat])
+    unique, first, inverse = np.unique(coords, axis = 0, return_index = True,
+                                       return_inverse = True)
+    representative = first[inverse.ravel()]
+    duplicates = np.flatnonzero(representative != np.arange(len(lon)))
+
+    edges = np.concatenate([first[candidate_edges(unique)],
+                            np.column_stack([representative[duplicates],
+                                             duplicates])])
+    length_km = haversine(lon[edges[:, 0]], lat[edges[:, 0]],
+                          lon[edges[:, 1]], lat[edges[:, 1]]) / 1000
+
+
+    return edges, length_km
+
+
+def solve_region(nodes, cost_per_km = COST_PER_KM,
+                 prize_per_person = PRIZE_PER_PERSON, strategy = 'access'):
+    """
+    This function solves the prize-collecting Steiner tree of the
+    settlements of a region.
+
+    Parameters
+    ----------
+    nodes : geodataframe
+        Settlement points with a 'population' column.
+    cost_per_km : float
+        Trench cost of an edge per kilometre, in US$.
+    prize_per_person : float
+        Value of connecting one person, in US$.
+    strategy : string
+        Strategy recorded on the edges.
+
+    Returns
+    -------
+    nodes : geodataframe
+        Settlements connected by the tree, in EPSG:4326.
+    edges : geodataframe
+        Tree edges with 'id', 'start', 'end', 'type' and 'strategy'
+        columns, in EPSG:4326.
+
+    """
+    nodes = nodes.to_crs('epsg:4326').reset_index(drop = True)
+    lon = nodes.geometry.x.values
+    lat = nodes.geometry.y.values
+
+    edges, length_km = settlement_edges(lon, lat)
+    prizes = (pd.to_numeric(nodes['population'], errors = 'coerce').fillna(0)
+              .clip(lower = 0).values * prize_per_person)
+    kept, tree = pcsf(prizes, edges, length_km * cost_per_km)
+
+    start, end = edges[tree, 0], edges[tree, 1]
+    lines = linestrings(np.stack([np.column_stack([lon[start], lat[start]]),
+                                  np.column_stack([lon[end], lat[end]])],
+                                 axis = 1)) if len(tree) else []
+
+    edges = gpd.GeoDataFrame({
+        'id': np.arange(len(tree)),
+        'start': start,
+        'end': end,
+        'type': 'pcsf',
+        'strategy': strategy},
+        geometry = gpd.GeoSeries(lines, dtype = 'geometry'), crs = 'epsg:4326')
+
+
+    return nodes.iloc[kept], edges
+
+
+def solve_pcsf(iso3, level = 'regional', cost_per_km = COST_PER_KM,
+               prize_per_person = PRIZE_PER_PERSON):
+    """
+    This function solves the prize-collecting Steiner forest of a country,
+    one tree per region, over the region node files written by
+    generate_region_nodes or generate_sub_region_nodes.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country ISO3 code
+    level : string
+        'regional' for the region nodes or 'access' for the sub-region
+        nodes.
+    cost_per_km : float
+        Trench cost of an edge per kilometre, in US$.
+    prize_per_person : float
+        Value of connecting one person, in US$.
+
+    """
+    print('Solving {} {} PCSF'.format(iso3, level))
+    folders = LEVELS[level]
+    folder_in = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones',
+                             folders['nodes'])
+    folder_edges = os.path.join(DATA_RESULTS, iso3, 'pcsf_solutions',
+                                folders['edges'])
+    folder_nodes = os.path.join(DATA_PROCESSED, iso3, folders['solution'])
+
+    started = time.time()
+    settlements = 0
+    for gid in list_regions(folder_in):
+
+        nodes = read_region_layer(folder_in, gid)
+        if len(nodes) == 0:
+
+            continue
+
+        nodes, edges = solve_region(nodes, cost_per_km, prize_per_person,
+                                    folders['strategy'])
+        settlements += len(nodes)
+
+        if len(edges) > 0:
+
+            write_region_layer(edges, folder_edges, gid, '_edges')
+
+        write_region_layer(nodes, folder_nodes, gid, '_updated')
+
+    print('Connected {} settlements of {} in {:.1f} s'.format(settlements,
+          iso3, time.time() - started))
+
+
+    return None
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Solve the prize-'
+                                     'collecting Steiner forest of each '
+                                     'region of a country.')
+    parser.add_argument('--iso3', nargs = '*', help = 'Country ISO3 codes, '
+                        'defaults to the Sub-Saharan African countries that '
+                        'are not excluded.')
+    parser.add_argument('--level', choices = list(LEVELS), default =
+                        'regional', help = 'Network level to solve.')
+    parser.add_argument('--cost-per-km', type = float, default = COST_PER_KM,
+                        help = 'Trench cost per kilometre in US$.')
+    parser.add_argument('--prize-per-person', type = float, default =
+                        PRIZE_PER_PERSON, help = 'Value of connecting one '
+                        'person in US$.')
+    args = parser.parse_args()
+
+    iso3 = args.iso3
+    if not iso3:
+
+        countries = pd.read_csv(os.path.join(DATA_RAW, 'countries.csv'),
+                                encoding = 'utf-8-sig')
+        countries = countries[(countries['region'] == 'Sub-Saharan Africa') &
+                              (countries['Exclude'] != 1)]
+        iso3 = countries['iso3'].tolist()
+
+    for code in iso3:
+
+        solve_pcsf(code, args.level, args.cost_per_km, args.prize_per_person)
@@ -9,6 +9,7 @@ from rasterstats import zonal_stats
 from shapely.geometry import Polygon
 from shapely.geometry import MultiPolygon
 from tqdm import tqdm
+from glassfibre.storage import write_region_layer
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
@@ -16,6 +17,12 @@ BASE_PATH = CONFIG['file_locations']['base_path']
 DATA_PROCESSED = os.path.join(BASE_PATH, '..', 'results', 'processed')
 DATA_RAW = os.path.join(BASE_PATH, 'raw')
 
+#Decile categorization values 1 (least dense) to 9 mapped to their population 
+#decile category. Any other value is 'Decile 1'.
+DECILES = {1: 'Decile 10', 2: 'Decile 9', 3: 'Decile 8', 4: 'Decile 7',
+           5: 'Decile 6', 6: 'Decile 5', 7: 'Decile 4', 8: 'Decile 3',
+           9: 'Decile 2'}
+
 #### setup all the required folders ####
 if not os.path.exists(DATA_RAW):
     
@@ -269,18 +276,10 @@ class ProcessRegions:
 
             sub_region_shapefile = gpd.GeoDataFrame([row], crs = countries.crs)
 
-            filename = '{}.shp'.format(row[gid])    
-
             folder_out = os.path.join('results', 'processed', self.country_iso3, 
                                       'boundaries')
 
-            if not os.path.exists(folder_out):
-
-                os.makedirs(folder_out)
-
-            path_out = os.path.join(folder_out, filename)
-
-            sub_region_shapefile.to_file(path_out, driver = 'ESRI Shapefile')
+            write_region_layer(sub_region_shapefile, folder_out, row[gid])
 
         return None
 
@@ -475,44 +474,24 @@ def population_decile(decile_value):
         Population decile category where the region belongs
     """
 
-    if decile_value == 1:
-
-        decile = 'Decile 10'
-
-    elif decile_value == 2:
-
-        decile = 'Decile 9'
-
-    elif decile_value == 3:
-
-        decile = 'Decile 8'
-
-    elif decile_value == 4:
-
-        decile = 'Decile 7'
-
-    elif decile_value == 5:
+    return DECILES.get(decile_value, 'Decile 1')
 
-        decile = 'Decile 6'
 
-    elif decile_value == 6:
+def population_deciles(decile_values):
 
-        decile = 'Decile 5'
-
-    elif decile_value == 7:
-
-        decile = 'Decile 4'
-
-    elif decile_value == 8:
-
-        decile = 'Decile 3'
-
-    elif decile_value == 9:
-
-        decile = 'Decile 2'
+    """
+    This function determines the population decile of every value in a
+    column.
 
-    else:
+    Parameters
+    ----------
+    decile_values : series
+        Decile categorization values
 
-        decile = 'Decile 1'
+    Returns
+    -------
+    deciles : series
+        Population decile category where each region belongs
+    """
 
-    return decile 
\ No newline at end of file
+    return decile_values.map(DECILES).fillna('Decile 1')
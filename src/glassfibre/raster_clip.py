@@ -0,0 +1,276 @@
+"""
+Windowed clipping of the national population raster into regional rasters.
+
+The national raster is opened read-only and read once (or window by window
+for very large rasters). Pixel windows are computed directly from region
+bounds, so no GeoJSON round trip through rasterio.mask is needed, and the
+regional GeoTIFFs are written through a thread pool.
+
+"""
+import os
+import math
+import rasterio
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.features import geometry_mask
+from rasterio.windows import Window
+from rasterio.windows import transform as window_transform
+
+
+def bounds_window(bounds, transform, width, height):
+    """
+    This function computes the pixel window covering a bounding box, in the
+    same way rasterio.mask crops to a geometry.
+
+    Parameters
+    ----------
+    bounds : tuple
+        Bounding box as (minx, miny, maxx, maxy).
+    transform : affine
+        Affine transform of the raster.
+    width : int
+        Raster width in pixels.
+    height : int
+        Raster height in pixels.
+
+    Returns
+    -------
+    window : rasterio window
+        Window clipped to the raster extent.
+
+    """
+    minx, miny, maxx, maxy = bounds
+
+    col_start = math.floor((minx - transform.c) / transform.a)
+    col_stop = math.ceil((maxx - transform.c) / transform.a)
+    row_start = math.floor((maxy - transform.f) / transform.e)
+    row_stop = math.ceil((miny - transform.f) / transform.e)
+
+    return _clipped_window(col_start, col_stop, row_start, row_stop, width,
+                           height)
+
+
+def center_window(bounds, transform, width, height):
+    """
+    This function computes the pixel window holding every pixel whose centre
+    falls inside a bounding box.
+
+    These are exactly the pixels rasterio.mask keeps unmasked when clipping
+    to a rectangle, so the window can be served as a view without masking.
+
+    Parameters
+    ----------
+    bounds : tuple
+        Bounding box as (minx, miny, maxx, maxy).
+    transform : affine
+        Affine transform of the raster.
+    width : int
+        Raster width in pixels.
+    height : int
+        Raster height in pixels.
+
+    Returns
+    -------
+    window : rasterio window
+        Window clipped to the raster extent.
+
+    """
+    minx, miny, maxx, maxy = bounds
+
+    col_start = math.ceil((minx - transform.c) / transform.a - 0.5)
+    col_stop = math.floor((maxx - transform.c) / transform.a - 0.5) + 1
+    row_start = math.ceil((maxy - transform.f) / transform.e - 0.5)
+    row_stop = math.floor((miny - transform.f) / transform.e - 0.5) + 1
+
+    return _clipped_window(col_start, col_stop, row_start, row_stop, width,
+                           height)
+
+
+def _clipped_window(col_start, col_stop, row_start, row_stop, width, height):
+    """
+    Clip pixel offsets to the raster extent and return a window.
+
+    """
+    col_start, col_stop = max(col_start, 0), min(col_stop, width)
+    row_start, row_stop = max(row_start, 0), min(row_stop, height)
+
+    return Window(col_start, row_start, max(col_stop - col_start, 0),
+                  max(row_stop - row_start, 0))
+
+
+def clip_regional_rasters(path_raster, regions, gid_level, folder_out = None,
+                          nodata = 0, envelope = True, skip_existing = False,
+                          in_memory = False, workers = 4,
+                          max_pixels = 250000000):
+    """
+    This function clips the national raster into one raster per region.
+
+    Parameters
+    ----------
+    path_raster : string
+        Path to the national population raster.
+    regions : geodataframe
+        Regions to clip, in the raster coordinate reference system.
+    gid_level : string
+        Column holding the region identifier used to name the outputs.
+    folder_out : string
+        Folder for the regional GeoTIFFs. Nothing is written when None.
+    nodata : int
+        Nodata value of the regional rasters.
+    envelope : bool
+        Clip to the region bounding box when True, otherwise crop to the
+        bounding box and mask pixels outside the region geometry.
+    skip_existing : bool
+        Skip regions whose GeoTIFF already exists.
+    in_memory : bool
+        Return the regional arrays and transforms.
+    workers : int
+        Number of threads writing GeoTIFFs.
+    max_pixels : int
+        Largest raster read in one go. Bigger rasters are read by window.
+
+    Returns
+    -------
+    rasters : dict
+        Region identifier mapped to an (array, transform) tuple when
+        in_memory is True, otherwise None.
+
+    """
+    if folder_out is not None and not os.path.exists(folder_out):
+
+        os.makedirs(folder_out)
+
+    rasters = {}
+    jobs = []
+
+    with rasterio.open(path_raster, 'r') as src:
+
+        meta = src.meta.copy()
+        size = src.count * src.width * src.height
+        national = src.read() if size <= max_pixels else None
+
+        for idx, region in regions.iterrows():
+
+            gid = region[gid_level]
+            path_out = None
+
+            if folder_out is not None:
+
+                path_out = os.path.join(folder_out, gid + '.tif')
+
+                if skip_existing and os.path.exists(path_out):
+
+                    continue
+
+            geometry = region['geometry']
+            covered = True
+
+            if envelope:
+
+                window = center_window(geometry.bounds, src.transform,
+                                       src.width, src.height)
+                covered = window.width > 0 and window.height > 0
+
+            if not envelope or not covered:
+
+                window = bounds_window(geometry.bounds, src.transform,
+                                       src.width, src.height)
+
+            if window.width == 0 or window.height == 0:
+
+                print('{} does not overlap the raster'.format(gid))
+                continue
+
+            if national is not None:
+
+                rows, cols = window.toslices()
+                out_img = national[:, rows, cols]
+
+            else:
+
+                out_img = src.read(window = window)
+
+            out_transform = window_transform(window, src.transform)
+
+            if not envelope:
+
+                outside = geometry_mask([geometry], out_img.shape[1:],
+                                        out_transform)
+                out_img = np.where(outside, nodata, out_img).astype(
+                    out_img.dtype)
+
+            elif not covered:
+
+                out_img = np.full_like(out_img, nodata)
+
+            if in_memory:
+
+                rasters[gid] = (out_img, out_transform)
+
+            if path_out is not None:
+
+                jobs.append((path_out, out_img, out_transform))
+
+    meta.update({'driver': 'GTiff', 'nodata': nodata, 'crs': 'epsg:4326'})
+
+    def write(job):
+
+        path_out, out_img, out_transform = job
+        out_meta = meta.copy()
+        out_meta.update({'height': out_img.shape[1],
+                         'width': out_img.shape[2],
+                         'transform': out_transform})
+
+        with rasterio.open(path_out, 'w', **out_meta) as dest:
+
+            dest.write(out_img)
+
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+
+        list(pool.map(write, jobs))
+
+    if in_memory:
+
+        return rasters
+
+    return None
+
+
+def read_region_raster(folder_tifs, gid, rasters = None):
+    """
+    This function loads a regional raster either from the in-memory rasters
+    returned by clip_regional_rasters or from its GeoTIFF.
+
+    Parameters
+    ----------
+    folder_tifs : string
+        Folder containing the regional GeoTIFFs.
+    gid : string
+        Region identifier.
+    rasters : dict
+        Optional in-memory regional rasters keyed by region identifier.
+
+    Returns
+    -------
+    data : numpy array
+        Copy of the raster bands, safe to threshold in place.
+    affine : affine
+        Affine transform of the regional raster.
+
+    """
+    if rasters is not None:
+
+        array, affine = rasters[gid]
+
+        return array.copy(), affine
+
+    path = os.path.join(folder_tifs, gid + '.tif')
+
+    with rasterio.open(path) as src:
+
+        data = src.read()
+        affine = src.transform
+
+
+    return data, affine
@@ -0,0 +1,365 @@
+"""
+Road-constrained routing of fiber between settlements.
+
+Settlements are snapped to the nearest junction of the street graph. A
+single multi-source Dijkstra run from all of them splits the road network
+into the Voronoi regions of the settlements, and every road joining two
+regions gives the length of a road path between their settlements
+(Mehlhorn, 1988). The minimum spanning tree of these candidate paths is a
+minimum spanning tree of the road distances between all settlements, so
+the tree costs one shortest path run instead of one per settlement and
+stays tractable for thousands of settlements per region.
+
+Tree edges follow the roads and carry their true length in metres.
+Settlements that no road joins are connected with straight edges, and
+the routing mode can be switched back to straight Euclidean edges.
+
+"""
+import configparser
+import os
+import numpy as np
+import geopandas as gpd
+
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import dijkstra, minimum_spanning_tree
+from scipy.spatial import cKDTree
+from shapely import linestrings
+from glassfibre.spanning_tree import candidate_edges
+from glassfibre.street_graph import haversine
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+
+ROUTING_MODES = ['euclidean', 'road']
+
+
+def get_routing_mode():
+    """
+    This function returns the fiber routing mode of the pipeline, set in
+    script_config.ini or the GLASSFIBRE_ROUTING environment variable.
+
+    Returns
+    -------
+    routing : string
+        'euclidean' or 'road'.
+
+    """
+    routing = os.environ.get('GLASSFIBRE_ROUTING', CONFIG.get(
+        'routing', 'mode', fallback = 'euclidean')).lower()
+
+    if routing not in ROUTING_MODES:
+
+        raise ValueError('Unknown routing mode {}, expected one of {}'.format(
+            routing, ', '.join(ROUTING_MODES)))
+
+
+    return routing
+
+
+def region_subgraph(graph, bounds, margin = 0.05):
+    """
+    This function extracts the part of a street graph around a region.
+
+    Parameters
+    ----------
+    graph : StreetGraph
+        Street graph of the country.
+    bounds : tuple
+        Bounding box of the settlements as (minx, miny, maxx, maxy).
+    margin : float
+        Margin added around the bounding box, in decimal degrees.
+
+    Returns
+    -------
+    matrix : csr matrix
+        Road lengths between the junctions of the subgraph.
+    lon : numpy array
+        Longitude of the junctions.
+    lat : numpy array
+        Latitude of the junctions.
+
+    """
+    minx, miny, maxx, maxy = bounds
+    lon = np.asarray(graph.lon)
+    lat = np.asarray(graph.lat)
+    inside = ((lon >= minx - margin) & (lon <= maxx + margin) &
+              (lat >= miny - margin) & (lat <= maxy + margin))
+    keep = np.flatnonzero(inside)
+    position = np.full(len(lon), -1, dtype = np.int64)
+    position[keep] = np.arange(len(keep))
+
+    # Gather the edges of the kept junctions only, so the work and memory
+    # follow the region rather than the country.
+    indptr = np.asarray(graph.indptr)
+    starts = indptr[keep]
+    counts = indptr[keep + 1] - starts
+    offsets = np.cumsum(counts) - counts
+    edges = np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+
+    rows = np.repeat(np.arange(len(keep)), counts)
+    columns = position[np.asarray(graph.indices)[edges]]
+    within = columns >= 0
+
+    row_counts = np.bincount(rows[within], minlength = len(keep))
+    matrix = csr_matrix((np.asarray(graph.length)[edges[within]].astype(
+                             np.float64), columns[within],
+                         np.concatenate([[0], np.cumsum(row_counts)])),
+                        shape = (len(keep), len(keep)))
+
+
+    return matrix, lon[keep], lat[keep]
+
+
+def snap_to_graph(lon, lat, node_lon, node_lat):
+    """
+    This function snaps points to their nearest junction.
+
+    Parameters
+    ----------
+    lon : numpy array
+        Longitude of the points.
+    lat : numpy array
+        Latitude of the points.
+    node_lon : numpy array
+        Longitude of the junctions.
+    node_lat : numpy array
+        Latitude of the junctions.
+
+    Returns
+    -------
+    nodes : numpy array
+        Nearest junction of each point.
+    distance : numpy array
+        Distance in metres from each point to its junction.
+
+    """
+    scale = np.cos(np.radians(np.mean(lat)))
+    tree = cKDTree(np.column_stack([node_lon * scale, node_lat]))
+    nodes = tree.query(np.column_stack([lon * scale, lat]))[1]
+    distance = haversine(lon, lat, node_lon[nodes], node_lat[nodes])
+
+
+    return nodes, distance
+
+
+def walk(predecessors, node):
+    """
+    This function follows the shortest path tree back from a junction to
+    the settlement junction it was reached from.
+
+    Returns
+    -------
+    path : list
+        Junctions from the given one to the settlement junction.
+
+    """
+    path = [node]
+    while predecessors[node] >= 0:
+
+        node = predecessors[node]
+        path.append(node)
+
+
+    return path
+
+
+def road_tree(matrix, terminals, lon, lat):
+    """
+    This function computes the minimum spanning tree of the road distances
+    between terminal junctions.
+
+    Parameters
+    ----------
+    matrix : csr matrix
+        Road lengths between junctions.
+    terminals : numpy array
+        Unique terminal junctions.
+    lon : numpy array
+        Longitude of the terminals, for bridging unconnected terminals.
+    lat : numpy array
+        Latitude of the terminals.
+
+    Returns
+    -------
+    source : numpy array
+        First terminal (position in terminals) of each tree edge.
+    target : numpy array
+        Second terminal of each tree edge (source < target).
+    length : numpy array
+        Length of each tree edge in metres.
+    paths : list
+        Junctions from target to source along the roads, or None for
+        straight edges between unconnected terminals.
+
+    """
+    k = len(terminals)
+    if k < 2:
+
+        empty = np.empty(0, dtype = np.int64)
+
+        return empty, empty, np.empty(0, dtype = float), []
+
+    distance, predecessors, sources = dijkstra(matrix, indices = terminals,
+                                               min_only = True,
+                                               return_predecessors = True)
+    terminal_of = np.full(matrix.shape[0], -1, dtype = np.int64)
+    terminal_of[terminals] = np.arange(k)
+    region = np.where(sources >= 0, terminal_of[np.maximum(sources, 0)], -1)
+
+    roads = matrix.tocoo()
+    u, v, w = roads.row, roads.col, roads.data
+    boundary = (region[u] >= 0) & (region[v] >= 0) & (region[u] < region[v])
+    u, v, w = u[boundary], v[boundary], w[boundary]
+    a, b = region[u], region[v]
+    weight = distance[u] + w + distance[v]
+
+    order = np.lexsort((weight, b, a))
+    a, b, u, v, weight = a[order], b[order], u[order], v[order], weight[order]
+    first = np.concatenate([[True], (a[1:] != a[:-1]) | (b[1:] != b[:-1])])
+    a, b, u, v, weight = a[first], b[first], u[first], v[first], weight[first]
+
+    # Straight edges, weighted above any road path, join the terminals left
+    # unconnected by the roads.
+    scale = np.cos(np.radians(np.mean(lat)))
+    bridges = candidate_edges(np.column_stack([lon * scale, lat]))
+    bridge_length = haversine(lon[bridges[:, 0]], lat[bridges[:, 0]],
+                              lon[bridges[:, 1]], lat[bridges[:, 1]])
+    offset = (weight.max() if len(weight) else 0) + 1
+
+    rows = np.concatenate([a, bridges[:, 0]])
+    cols = np.concatenate([b, bridges[:, 1]])
+    weights = np.concatenate([weight, bridge_length + offset])
+    road = np.arange(len(rows)) < len(a)
+
+    order = np.lexsort((weights, cols, rows))
+    first = np.concatenate([[True], (rows[order][1:] != rows[order][:-1]) |
+                            (cols[order][1:] != cols[order][:-1])])
+    candidates = order[first]
+
+    graph = coo_matrix((np.maximum(weights[candidates], 1e-6),
+                        (rows[candidates], cols[candidates])),
+                       shape = (k, k)).tocsr()
+    position = coo_matrix((np.arange(1, len(candidates) + 1),
+                           (rows[candidates], cols[candidates])),
+                          shape = (k, k)).tocsr()
+    tree = minimum_spanning_tree(graph).tocoo()
+    chosen = candidates[np.asarray(position[
+        np.minimum(tree.row, tree.col), np.maximum(tree.row, tree.col)]
+        ).ravel() - 1]
+    chosen = chosen[np.lexsort((cols[chosen], rows[chosen]))]
+
+    source, target, length, paths = [], [], [], []
+    for candidate in chosen:
+
+        if road[candidate]:
+
+            path = walk(predecessors, u[candidate])[::-1]
+            path = path + walk(predecessors, v[candidate])
+            source.append(a[candidate])
+            target.append(b[candidate])
+            length.append(weight[candidate])
+            paths.append(path[::-1])
+
+        else:
+
+            bridge = candidate - len(a)
+            source.append(bridges[bridge, 0])
+            target.append(bridges[bridge, 1])
+            length.append(bridge_length[bridge])
+            paths.append(None)
+
+
+    return (np.array(source, dtype = np.int64), np.array(target, dtype = 
+            np.int64), np.array(length, dtype = float), paths)
+
+
+def fit_road_edges(nodes, graph, margin = 0.05):
+    """
+    This function fits minimum spanning tree edges between nodes along the
+    roads of a street graph.
+
+    Edges follow the orientation of fit_tree_edges, running from the later
+    node to the earlier node in the input frame.
+
+    Parameters
+    ----------
+    nodes : geodataframe
+        Point nodes.
+    graph : StreetGraph
+        Street graph of the country.
+    margin : float
+        Margin of the street graph kept around the nodes, in decimal
+        degrees.
+
+    Returns
+    -------
+    edges : geodataframe
+        Edge linestrings with 'from', 'to' and 'length' columns, in
+        EPSG:4326, the length being in metres along the roads.
+
+    """
+    nodes = nodes.to_crs('epsg:4326')
+    lon = nodes.geometry.x.values
+    lat = nodes.geometry.y.values
+    labels = np.asarray(nodes.index)
+
+    matrix, node_lon, node_lat = region_subgraph(graph, nodes.total_bounds,
+                                                 margin)
+    if matrix.shape[0] == 0:
+
+        node_lon, node_lat = lon, lat
+        matrix = csr_matrix((len(lon), len(lon)))
+
+    snapped, snap = snap_to_graph(lon, lat, node_lon, node_lat)
+    terminals, first, terminal = np.unique(snapped, return_index = True,
+                                           return_inverse = True)
+    order = np.argsort(first)
+    rank = np.empty(len(order), dtype = np.int64)
+    rank[order] = np.arange(len(order))
+    terminals, first, terminal = terminals[order], first[order], rank[terminal]
+
+    source, target, length, paths = road_tree(matrix, terminals, lon[first],
+                                              lat[first])
+    edges = []
+
+    for s, t, road_length, path in zip(first[source], first[target], length,
+                                       paths):
+
+        if path is None:
+
+            coords = [(lon[t], lat[t]), (lon[s], lat[s])]
+
+        else:
+
+            road_length = road_length + snap[s] + snap[t]
+            coords = ([(lon[t], lat[t])] +
+                      list(zip(node_lon[path], node_lat[path])) +
+                      [(lon[s], lat[s])])
+
+        edges.append((s, t, road_length, coords))
+
+    # Settlements sharing a junction with an earlier settlement join it
+    # through that junction.
+    for i in np.flatnonzero(np.arange(len(lon)) != first[terminal]):
+
+        j = first[terminal[i]]
+        if lon[i] == lon[j] and lat[i] == lat[j]:
+
+            continue
+
+        node = snapped[i]
+        coords = [(lon[i], lat[i]), (node_lon[node], node_lat[node]),
+                  (lon[j], lat[j])]
+        edges.append((j, i, snap[i] + snap[j], coords))
+
+    edges.sort(key = lambda edge: (edge[0], edge[1]))
+    lines = [linestrings(coords) for s, t, road_length, coords in edges]
+
+    edges = gpd.GeoDataFrame({
+        'from': labels[[edge[1] for edge in edges]],
+        'to': labels[[edge[0] for edge in edges]],
+        'length': np.array([edge[2] for edge in edges], dtype = float)},
+        geometry = gpd.GeoSeries(lines, dtype = 'geometry'), crs = 'epsg:4326')
+
+
+    return edges
@@ -0,0 +1,159 @@
+"""
+Variance-based global sensitivity analysis.
+
+Inputs are sampled with the Saltelli scheme: two independent base matrices
+A and B, plus one matrix AB_i per input in which column i of A is replaced
+by column i of B. From the N * (k + 2) model evaluations the first-order
+indices are estimated with the Saltelli (2010) estimator and the total
+indices with the Jansen estimator.
+
+"""
+import numpy as np
+import pandas as pd
+
+
+def saltelli_sample(sample_unit, n, k):
+    """
+    This function builds the Saltelli base matrices in the unit hypercube.
+
+    Parameters
+    ----------
+    sample_unit : function
+        Function returning an (n, dims) array of points in [0, 1).
+    n : int
+        Number of base samples.
+    k : int
+        Number of uncertain inputs.
+
+    Returns
+    -------
+    a : numpy array
+        Base matrix A of shape (n, k).
+    b : numpy array
+        Base matrix B of shape (n, k).
+
+    """
+    sample = sample_unit(n, 2 * k)
+
+
+    return sample[:, :k], sample[:, k:]
+
+
+def iter_saltelli_batches(a, b, batch_size = 100000):
+    """
+    This function yields the Saltelli evaluation matrices in batches of
+    whole matrices, in the order A, B, AB_1, ..., AB_k.
+
+    Parameters
+    ----------
+    a : numpy array
+        Base matrix A of shape (n, k).
+    b : numpy array
+        Base matrix B of shape (n, k).
+    batch_size : int
+        Largest number of rows in a batch.
+
+    Yields
+    ------
+    batch : numpy array
+        Stacked evaluation matrices.
+
+    """
+    n, k = a.shape
+    per_batch = max(1, batch_size // n)
+    matrices = []
+
+    for i in range(-2, k):
+
+        if i == -2:
+
+            matrix = a
+
+        elif i == -1:
+
+            matrix = b
+
+        else:
+
+            matrix = a.copy()
+            matrix[:, i] = b[:, i]
+
+        matrices.append(matrix)
+
+        if len(matrices) == per_batch:
+
+            yield np.vstack(matrices)
+            matrices = []
+
+    if matrices:
+
+        yield np.vstack(matrices)
+
+
+def sobol_indices(outputs, n, k):
+    """
+    This function estimates first-order and total Sobol indices.
+
+    Parameters
+    ----------
+    outputs : numpy array
+        Model outputs for A, B, AB_1, ..., AB_k stacked, length n * (k + 2).
+    n : int
+        Number of base samples.
+    k : int
+        Number of uncertain inputs.
+
+    Returns
+    -------
+    first_order : numpy array
+        First-order index of each input.
+    total : numpy array
+        Total index of each input.
+
+    """
+    outputs = np.asarray(outputs, dtype = float).reshape(k + 2, n)
+    f_a, f_b, f_ab = outputs[0], outputs[1], outputs[2:]
+    variance = np.var(np.concatenate([f_a, f_b]))
+
+    if variance == 0:
+
+        return np.zeros(k), np.zeros(k)
+
+    first_order = np.mean(f_b * (f_ab - f_a), axis = 1) / variance
+    total = 0.5 * np.mean((f_a - f_ab) ** 2, axis = 1) / variance
+
+
+    return first_order, total
+
+
+def sensitivity_table(outputs, names, n):
+    """
+    This function tabulates the Sobol indices of several model outputs.
+
+    Parameters
+    ----------
+    outputs : dict
+        Output name mapped to its stacked Saltelli evaluations.
+    names : list
+        Names of the uncertain inputs.
+    n : int
+        Number of base samples.
+
+    Returns
+    -------
+    df : dataframe
+        One row per output and input with the 'S1' and 'ST' indices.
+
+    """
+    rows = []
+    for output, values in outputs.items():
+
+        first_order, total = sobol_indices(values, n, len(names))
+
+        for name, s1, st in zip(names, first_order, total):
+
+            rows.append({'output': output, 'parameter': name, 'S1': s1,
+                         'ST': st})
+
+
+    return pd.DataFrame(rows)
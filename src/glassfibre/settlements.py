@@ -0,0 +1,183 @@
+"""
+Raster-native settlement detection.
+
+Settlements are the connected components of the population raster cells at
+or above the density threshold. Components are labelled directly on the
+array, populations are summed per label with a bincount and centroids come
+from the pixel moments, so no polygonizing, overlay or zonal statistics are
+needed unless the settlement outlines are explicitly requested.
+
+"""
+import numpy as np
+import geopandas as gpd
+
+from scipy import ndimage
+from rasterio.features import geometry_mask, shapes
+from shapely.geometry import Point, shape
+
+
+def settlement_type(population):
+    """
+    This function classifies settlements by population size.
+
+    Parameters
+    ----------
+    population : float or array
+        Settlement population.
+
+    Returns
+    -------
+    type : string or array
+        Settlement size category.
+
+    """
+    population = np.asarray(population, dtype = float)
+    conditions = [population <= 250, population < 500, population < 1000,
+                  population < 5000, population < 10000, population < 20000]
+    choices = ['<0.25k', '0.25-0.5k', '0.5-1k', '1-5k', '5-10k', '10-20k']
+    types = np.select(conditions, choices, default = '>20k')
+
+    if types.ndim == 0:
+
+        return str(types)
+
+
+    return types
+
+
+def detect_settlements(data, affine, threshold, settlement_size = 0,
+                       region = None, nodata = None, inclusive = False,
+                       outlines = False):
+    """
+    This function finds settlements in a population raster.
+
+    Parameters
+    ----------
+    data : numpy array
+        Population raster, either a single band or (1, rows, cols).
+    affine : affine
+        Affine transform of the raster.
+    threshold : float
+        Minimum cell population for a cell to belong to a settlement.
+    settlement_size : float
+        Minimum total settlement population.
+    region : shapely geometry
+        Optional region. Only cells whose centres fall inside it are counted,
+        matching an intersection of the settlement outlines with the region.
+    nodata : float
+        Nodata value excluded from settlements.
+    inclusive : bool
+        Keep settlements whose population equals settlement_size.
+    outlines : bool
+        Also return the settlement outline polygons.
+
+    Returns
+    -------
+    settlements : list of dicts
+        Features with the settlement centroid as geometry and the 'sum',
+        'count' and 'type' properties (plus 'outline' when requested).
+
+    """
+    data = np.asarray(data)
+    if data.ndim == 3:
+
+        data = data[0]
+
+    valid = data >= threshold
+    if nodata is not None:
+
+        valid &= data != nodata
+
+    labels, n_labels = ndimage.label(valid)
+    if n_labels == 0:
+
+        return []
+
+    counted = labels
+    if region is not None:
+
+        inside = geometry_mask([region], data.shape, affine, invert = True)
+        counted = np.where(inside, labels, 0)
+
+    rows, cols = np.nonzero(counted)
+    cell_labels = counted[rows, cols]
+    values = data[rows, cols].astype(float)
+    size = n_labels + 1
+
+    count = np.bincount(cell_labels, minlength = size)
+    population = np.bincount(cell_labels, weights = values, minlength = size)
+    col_moment = np.bincount(cell_labels, weights = cols, minlength = size)
+    row_moment = np.bincount(cell_labels, weights = rows, minlength = size)
+
+    keep = count > 0
+    keep[0] = False
+    if inclusive:
+
+        keep &= population >= settlement_size
+
+    else:
+
+        keep &= population > settlement_size
+
+    selected = np.nonzero(keep)[0]
+    centre_cols = col_moment[selected] / count[selected] + 0.5
+    centre_rows = row_moment[selected] / count[selected] + 0.5
+    xs, ys = affine * (centre_cols, centre_rows)
+    types = settlement_type(population[selected])
+
+    polygons = {}
+    if outlines and len(selected) > 0:
+
+        polygons = settlement_outlines(counted, affine, selected)
+
+    settlements = []
+    for i, label in enumerate(selected):
+
+        properties = {
+            'sum': float(population[label]),
+            'count': int(count[label]),
+            'type': str(types[i]),
+        }
+
+        if outlines:
+
+            properties['outline'] = polygons.get(label)
+
+        settlements.append({
+            'geometry': Point(xs[i], ys[i]),
+            'properties': properties,
+        })
+
+
+    return settlements
+
+
+def settlement_outlines(labels, affine, selected):
+    """
+    This function polygonizes the outlines of labelled settlements.
+
+    Parameters
+    ----------
+    labels : numpy array
+        Raster of settlement labels, zero outside settlements.
+    affine : affine
+        Affine transform of the raster.
+    selected : array
+        Labels to polygonize.
+
+    Returns
+    -------
+    outlines : dict
+        Settlement label mapped to its outline geometry.
+
+    """
+    mask = np.isin(labels, selected)
+    polygons = shapes(labels.astype(np.int32), mask = mask,
+                      transform = affine)
+    outlines = gpd.GeoDataFrame(
+        [{'label': int(value), 'geometry': shape(poly)}
+         for poly, value in polygons], geometry = 'geometry')
+    outlines = outlines.dissolve(by = 'label')
+
+
+    return outlines['geometry'].to_dict()
@@ -0,0 +1,161 @@
+"""
+Euclidean minimum spanning tree engine used to fit fiber edges.
+
+The tree is built on the Delaunay triangulation of the nodes, which is
+guaranteed to contain every edge of the Euclidean minimum spanning tree.
+This keeps the candidate edge set at O(n) instead of the O(n^2) complete
+graph, so the tree costs O(n log n) in time and O(n) in memory.
+
+"""
+import numpy as np
+import geopandas as gpd
+
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree
+from scipy.spatial import Delaunay, QhullError
+from shapely import linestrings
+
+
+def candidate_edges(coords):
+    """
+    This function generates the candidate edges containing the Euclidean
+    minimum spanning tree of a set of unique coordinates.
+
+    Parameters
+    ----------
+    coords : numpy array
+        Array of shape (n, 2) containing unique projected coordinates.
+
+    Returns
+    -------
+    edges : numpy array
+        Array of shape (m, 2) containing node index pairs with i < j.
+
+    """
+    n = len(coords)
+
+    if n < 2:
+
+        return np.empty((0, 2), dtype = np.int64)
+
+    if n > 3:
+
+        try:
+
+            tri = Delaunay(coords)
+            simplices = tri.simplices
+            edges = np.concatenate([simplices[:, [0, 1]],
+                                    simplices[:, [1, 2]],
+                                    simplices[:, [0, 2]]])
+            edges = np.sort(edges, axis = 1)
+
+            return np.unique(edges, axis = 0)
+
+        except QhullError:
+
+            pass
+
+    # Too few points, or all points collinear. Collinear points are spanned
+    # by joining neighbours along the line; a handful of points are simply
+    # joined pairwise.
+    if n <= 3:
+
+        i, j = np.triu_indices(n, k = 1)
+
+        return np.column_stack([i, j])
+
+    centered = coords - coords.mean(axis = 0)
+    direction = np.linalg.svd(centered, full_matrices = False)[2][0]
+    order = np.argsort(centered @ direction, kind = 'stable')
+    edges = np.sort(np.column_stack([order[:-1], order[1:]]), axis = 1)
+
+
+    return edges
+
+
+def euclidean_mst(coords):
+    """
+    This function computes the Euclidean minimum spanning tree of a set of
+    coordinates.
+
+    Coincident coordinates are collapsed onto their first occurrence, since
+    the zero length edges joining them are never exported.
+
+    Parameters
+    ----------
+    coords : numpy array
+        Array of shape (n, 2) containing projected coordinates.
+
+    Returns
+    -------
+    source : numpy array
+        Index of the first node of each tree edge.
+    target : numpy array
+        Index of the second node of each tree edge (source < target).
+    length : numpy array
+        Euclidean length of each tree edge.
+
+    """
+    coords = np.asarray(coords, dtype = float).reshape(-1, 2)
+
+    unique, first = np.unique(coords, axis = 0, return_index = True)
+    order = np.argsort(first)
+    unique, first = unique[order], first[order]
+
+    edges = candidate_edges(unique)
+
+    if len(edges) == 0:
+
+        empty = np.empty(0, dtype = np.int64)
+
+        return empty, empty, np.empty(0, dtype = float)
+
+    weights = np.hypot(*(unique[edges[:, 0]] - unique[edges[:, 1]]).T)
+    n = len(unique)
+    graph = coo_matrix((weights, (edges[:, 0], edges[:, 1])), shape = (n, n))
+    tree = minimum_spanning_tree(graph).tocoo()
+
+    source = first[tree.row]
+    target = first[tree.col]
+    swap = source > target
+    source[swap], target[swap] = target[swap], source[swap]
+    order = np.lexsort((target, source))
+
+
+    return source[order], target[order], tree.data[order]
+
+
+def fit_tree_edges(nodes):
+    """
+    This function fits minimum spanning tree edges between nodes.
+
+    Edges follow the orientation of the former complete graph builder,
+    running from the later node to the earlier node in the input frame.
+
+    Parameters
+    ----------
+    nodes : geodataframe
+        Point nodes in a projected coordinate reference system.
+
+    Returns
+    -------
+    edges : geodataframe
+        Edge linestrings with 'from', 'to' and 'length' columns, in the
+        coordinate reference system of the nodes.
+
+    """
+    coords = np.column_stack([nodes.geometry.x.values,
+                              nodes.geometry.y.values])
+    source, target, length = euclidean_mst(coords)
+
+    labels = np.asarray(nodes.index)
+    lines = linestrings(np.stack([coords[target], coords[source]], axis = 1))
+
+    edges = gpd.GeoDataFrame({
+        'from': labels[target],
+        'to': labels[source],
+        'length': length},
+        geometry = lines, crs = nodes.crs)
+
+
+    return edges
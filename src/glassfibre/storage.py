@@ -0,0 +1,735 @@
+"""
+Storage of the vector layers produced by the pipeline.
+
+Layers are addressed throughout the code by their Shapefile path. The
+storage format set in script_config.ini (or the GLASSFIBRE_STORAGE
+environment variable) decides what is written for that path: GeoParquet,
+FlatGeobuf or Shapefile. Reading resolves a layer in any of the formats,
+preferring the configured one, so results written before a format switch
+and the Shapefile region boundaries from preprocessing remain readable.
+Shapefiles for the QGIS projects in vis/ are exported as a final step.
+
+Layers written per region (GID) are stored in GeoParquet mode as the
+partitions of one dataset, folder/gid=<GID>/part-0.parquet, which can be
+read whole or filtered by region without touching the other partitions.
+Combining the regions into a country layer then only writes the dataset
+schema and a small reference file in place of the combined layer.
+
+"""
+import configparser
+import os
+import glob
+import json
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+
+FORMATS = {
+    'geoparquet': '.parquet',
+    'flatgeobuf': '.fgb',
+    'shapefile': '.shp',
+}
+REFERENCE = '.dataset.json'
+PARTITION = 'gid'
+
+
+def get_storage_format():
+    """
+    This function returns the storage format of the pipeline.
+
+    Returns
+    -------
+    storage_format : string
+        'geoparquet', 'flatgeobuf' or 'shapefile'.
+
+    """
+    storage_format = os.environ.get('GLASSFIBRE_STORAGE', CONFIG.get(
+        'storage', 'format', fallback = 'geoparquet')).lower()
+
+    if storage_format not in FORMATS:
+
+        raise ValueError('Unknown storage format {}, expected one of {}'.format(
+            storage_format, ', '.join(FORMATS)))
+
+
+    return storage_format
+
+
+def layer_path(path, storage_format = None):
+    """
+    This function returns the file a layer is stored in.
+
+    Parameters
+    ----------
+    path : string
+        Shapefile path of the layer.
+    storage_format : string
+        Storage format, the pipeline format when None.
+
+    Returns
+    -------
+    path : string
+        Path with the extension of the storage format.
+
+    """
+    storage_format = storage_format or get_storage_format()
+
+
+    return os.path.splitext(path)[0] + FORMATS[storage_format]
+
+
+def find_layer(path):
+    """
+    This function finds the stored file of a layer.
+
+    Parameters
+    ----------
+    path : string
+        Shapefile path of the layer.
+
+    Returns
+    -------
+    path : string
+        Existing file of the layer, in the pipeline format where present,
+        or None when the layer has not been written.
+
+    """
+    preferred = get_storage_format()
+    formats = [preferred] + [name for name in FORMATS if name != preferred]
+    candidates = [layer_path(path, name) for name in formats]
+    candidates.insert(1, os.path.splitext(path)[0] + REFERENCE)
+
+    for candidate in candidates:
+
+        if os.path.exists(candidate):
+
+            return candidate
+
+
+    return None
+
+
+def layer_exists(path):
+    """
+    This function checks whether a layer has been written in any format.
+
+    """
+    return find_layer(path) is not None
+
+
+def read_layer(path, columns = None, bbox = None, regions = None):
+    """
+    This function reads a layer in whichever format it is stored.
+
+    Parameters
+    ----------
+    path : string
+        Shapefile path of the layer.
+    columns : list
+        Columns to read, all columns when None.
+    bbox : tuple
+        (minx, miny, maxx, maxy) filter on feature bounds.
+    regions : list
+        GIDs to read when the layer is a combined region dataset.
+
+    Returns
+    -------
+    gdf : geodataframe
+        The layer.
+
+    """
+    found = find_layer(path)
+    if found is None:
+
+        raise FileNotFoundError('No layer stored for {}'.format(path))
+
+    if found.endswith(REFERENCE):
+
+        return read_reference(found, columns, bbox, regions)
+
+    kwargs = {}
+    if columns is not None:
+
+        kwargs['columns'] = columns
+
+    if bbox is not None:
+
+        kwargs['bbox'] = bbox
+
+    if found.endswith('.parquet'):
+
+        gdf = gpd.read_parquet(found, **kwargs)
+
+    else:
+
+        gdf = gpd.read_file(found, **kwargs)
+
+
+    return gdf
+
+
+def remove_layer(path):
+    """
+    This function removes every stored copy of a layer, including the
+    Shapefile sidecar files.
+
+    """
+    stem = os.path.splitext(path)[0]
+    for extension in list(FORMATS.values()) + [REFERENCE]:
+
+        if os.path.exists(stem + extension):
+
+            os.remove(stem + extension)
+
+    for sidecar in glob.glob(glob.escape(stem) + '.*'):
+
+        if os.path.splitext(sidecar)[1].lower() in ['.shx', '.dbf', '.prj',
+                                                     '.cpg', '.qix', '.sbn',
+                                                     '.sbx']:
+
+            os.remove(sidecar)
+
+
+def with_crs(gdf):
+    """
+    This function sets the pipeline CRS, EPSG:4326, on layers built
+    without one.
+
+    """
+    if gdf.crs is None:
+
+        return gdf.set_crs('epsg:4326')
+
+
+    return gdf
+
+
+def write_layer(gdf, path, index = None):
+    """
+    This function writes a layer in the pipeline storage format, replacing
+    any copy of it stored in another format.
+
+    Parameters
+    ----------
+    gdf : geodataframe
+        Layer to write.
+    path : string
+        Shapefile path of the layer.
+    index : bool
+        Whether to write the index, as in GeoDataFrame.to_file.
+
+    Returns
+    -------
+    path : string
+        The file written.
+
+    """
+    storage_format = get_storage_format()
+    path_out = layer_path(path, storage_format)
+    gdf = with_crs(gdf)
+
+    folder = os.path.dirname(path_out)
+    if folder and not os.path.exists(folder):
+
+        os.makedirs(folder, exist_ok = True)
+
+    remove_layer(path)
+
+    if storage_format == 'geoparquet':
+
+        # The bbox covering column lets readers filter on feature bounds.
+        gdf.to_parquet(path_out, index = index, write_covering_bbox = True)
+
+    elif storage_format == 'flatgeobuf':
+
+        gdf.to_file(path_out, driver = 'FlatGeobuf', index = index)
+
+    else:
+
+        gdf.to_file(path_out, index = index)
+
+
+    return path_out
+
+
+def list_layers(folder, suffix = ''):
+    """
+    This function lists the layers stored in a folder.
+
+    Parameters
+    ----------
+    folder : string
+        Folder to list.
+    suffix : string
+        Only list layers whose name ends with this suffix.
+
+    Returns
+    -------
+    filenames : list
+        Sorted Shapefile names of the layers, whatever their format.
+
+    """
+    extensions = set(FORMATS.values())
+    filenames = set()
+    for filename in os.listdir(folder):
+
+        stem, extension = os.path.splitext(filename)
+        if filename.endswith(REFERENCE):
+
+            stem, extension = filename[:-len(REFERENCE)], REFERENCE
+
+        if (extension in extensions or extension == REFERENCE) and \
+                stem.endswith(suffix):
+
+            filenames.add(stem + '.shp')
+
+
+    return sorted(filenames)
+
+
+def find_layers(folder, suffix = ''):
+    """
+    This function lists the layers stored below a folder.
+
+    Parameters
+    ----------
+    folder : string
+        Root folder to search.
+    suffix : string
+        Only list layers whose name ends with this suffix.
+
+    Returns
+    -------
+    paths : list
+        Shapefile paths of the layers, whatever their format.
+
+    """
+    paths = []
+    for root, dirs, files in os.walk(folder):
+
+        dirs[:] = sorted(name for name in dirs if not
+                         name.startswith(PARTITION + '='))
+        paths += [os.path.join(root, filename) for filename in
+                  list_layers(root, suffix)]
+
+
+    return paths
+
+
+def export_shapefiles(folder):
+    """
+    This function exports every GeoParquet and FlatGeobuf layer below a
+    folder to a Shapefile next to it, for the QGIS projects and R scripts
+    in vis/.
+
+    Parameters
+    ----------
+    folder : string
+        Root folder to export.
+
+    Returns
+    -------
+    exported : int
+        Number of Shapefiles written.
+
+    """
+    exported = 0
+    for root, dirs, files in os.walk(folder):
+
+        # Region partitions are exported through their combined layers.
+        dirs[:] = [name for name in dirs if not
+                   name.startswith(PARTITION + '=')]
+
+        for filename in sorted(files):
+
+            stem, extension = os.path.splitext(filename)
+            if filename.endswith(REFERENCE):
+
+                stem, extension = filename[:-len(REFERENCE)], REFERENCE
+
+            if extension not in ['.parquet', '.fgb', REFERENCE]:
+
+                continue
+
+            path = os.path.join(root, filename)
+            path_out = os.path.join(root, stem + '.shp')
+            if (os.path.exists(path_out) and
+                    os.path.getmtime(path_out) >= os.path.getmtime(path)):
+
+                continue
+
+            if extension == REFERENCE:
+
+                gdf = read_reference(path)
+
+            elif extension == '.parquet':
+
+                try:
+
+                    gdf = gpd.read_parquet(path)
+
+                except ValueError:
+
+                    # Non-spatial Parquet tables, e.g. UQ results.
+                    continue
+
+            else:
+
+                gdf = gpd.read_file(path)
+
+            gdf.to_file(path_out)
+            exported += 1
+
+
+    return exported
+
+
+def region_layer_path(folder, region, suffix = ''):
+    """
+    This function returns the Shapefile path of a region layer.
+
+    """
+    return os.path.join(folder, '{}{}.shp'.format(region, suffix))
+
+
+def partition_path(folder, region):
+    """
+    This function returns the file of a region partition.
+
+    """
+    return os.path.join(folder, '{}={}'.format(PARTITION, region),
+                        'part-0.parquet')
+
+
+def write_region_layer(gdf, folder, region, suffix = ''):
+    """
+    This function writes the layer of one region, as a partition of the
+    folder dataset in GeoParquet mode and as a separate layer named after
+    the region otherwise.
+
+    Parameters
+    ----------
+    gdf : geodataframe
+        Layer of the region.
+    folder : string
+        Folder of the region layers.
+    region : string
+        GID of the region.
+    suffix : string
+        Suffix of the layer name in non-partitioned formats.
+
+    Returns
+    -------
+    path : string
+        The file written.
+
+    """
+    if get_storage_format() != 'geoparquet':
+
+        return write_layer(gdf, region_layer_path(folder, region, suffix))
+
+    remove_layer(region_layer_path(folder, region, suffix))
+    path_out = partition_path(folder, region)
+    gdf = with_crs(gdf)
+    os.makedirs(os.path.dirname(path_out), exist_ok = True)
+
+    # The dataset schema changes with the partitions.
+    try:
+
+        os.remove(os.path.join(folder, '_common_metadata'))
+
+    except FileNotFoundError:
+
+        pass
+
+    gdf.to_parquet(path_out, index = False, write_covering_bbox = True)
+
+
+    return path_out
+
+
+def partition_files(folder):
+    """
+    This function lists the partition files of a region dataset.
+
+    """
+    return sorted(glob.glob(os.path.join(glob.escape(folder), '{}=*'.format(
+        PARTITION), '*.parquet')))
+
+
+def list_regions(folder, suffix = ''):
+    """
+    This function lists the regions written to a folder, as partitions or
+    as separate layers.
+
+    Parameters
+    ----------
+    folder : string
+        Folder of the region layers.
+    suffix : string
+        Suffix of the layer names in non-partitioned formats.
+
+    Returns
+    -------
+    regions : list
+        Sorted region GIDs.
+
+    """
+    regions = set()
+    if not os.path.exists(folder):
+
+        return []
+
+    for path in partition_files(folder):
+
+        regions.add(os.path.basename(os.path.dirname(path)).split('=', 1)[1])
+
+    for filename in list_layers(folder, suffix):
+
+        stem = os.path.splitext(filename)[0]
+        regions.add(stem[:len(stem) - len(suffix)])
+
+
+    return sorted(regions)
+
+
+def read_region_layer(folder, region, suffix = ''):
+    """
+    This function reads the layer of one region.
+
+    Parameters
+    ----------
+    folder : string
+        Folder of the region layers.
+    region : string
+        GID of the region.
+    suffix : string
+        Suffix of the layer name in non-partitioned formats.
+
+    Returns
+    -------
+    gdf : geodataframe
+        Layer of the region.
+
+    """
+    path = partition_path(folder, region)
+    if os.path.exists(path):
+
+        return gpd.read_parquet(path)
+
+
+    return read_layer(region_layer_path(folder, region, suffix))
+
+
+def dataset_schema(folder, files):
+    """
+    This function returns the schema of a region dataset, unifying the
+    schemas of the partitions when it has not been recorded.
+
+    """
+    path = os.path.join(folder, '_common_metadata')
+    if os.path.exists(path):
+
+        return pq.read_schema(path)
+
+    schema = pa.unify_schemas([pq.read_schema(path) for path in files],
+                              promote_options = 'permissive')
+
+
+    return schema.append(pa.field(PARTITION, pa.string()))
+
+
+def read_regions(folder, regions = None, columns = None, bbox = None,
+                 suffix = ''):
+    """
+    This function reads the layers of several regions at once, pushing the
+    region, column and bounds filters down to the partitions.
+
+    Parameters
+    ----------
+    folder : string
+        Folder of the region layers.
+    regions : list
+        GIDs to read, all regions when None.
+    columns : list
+        Columns to read, all columns when None.
+    bbox : tuple
+        (minx, miny, maxx, maxy) filter on feature bounds.
+    suffix : string
+        Suffix of the layer names in non-partitioned formats.
+
+    Returns
+    -------
+    gdf : geodataframe
+        Features of the regions, with their GID in the 'gid' column.
+
+    """
+    frames = []
+    files = partition_files(folder) if os.path.exists(folder) else []
+
+    if files:
+
+        partitioning = ds.partitioning(pa.schema([(PARTITION, pa.string())]),
+                                       flavor = 'hive')
+        dataset = ds.dataset(files, schema = dataset_schema(folder, files),
+                             format = 'parquet', partitioning = partitioning,
+                             partition_base_dir = folder)
+
+        condition = None
+        if regions is not None:
+
+            condition = ds.field(PARTITION).isin(list(regions))
+
+        if bbox is not None:
+
+            minx, miny, maxx, maxy = bbox
+            within = ((ds.field('bbox', 'xmin') <= maxx) &
+                      (ds.field('bbox', 'xmax') >= minx) &
+                      (ds.field('bbox', 'ymin') <= maxy) &
+                      (ds.field('bbox', 'ymax') >= miny))
+            condition = within if condition is None else condition & within
+
+        names = None
+        if columns is not None:
+
+            names = list(dict.fromkeys(list(columns) + ['geometry',
+                                                         PARTITION]))
+
+        table = dataset.to_table(columns = names, filter = condition)
+        if 'bbox' in table.column_names:
+
+            table = table.drop(['bbox'])
+
+        frames.append(gpd.GeoDataFrame.from_arrow(table))
+
+    for region in list_regions(folder, suffix):
+
+        if os.path.exists(partition_path(folder, region)) or (
+                regions is not None and region not in regions):
+
+            continue
+
+        gdf = read_layer(region_layer_path(folder, region, suffix),
+                         columns = columns, bbox = bbox)
+        gdf[PARTITION] = region
+        frames.append(gdf)
+
+    if len(frames) == 0:
+
+        return gpd.GeoDataFrame(columns = [PARTITION, 'geometry'],
+                                geometry = 'geometry')
+
+    gdf = gpd.GeoDataFrame(frames[0] if len(frames) == 1 else
+                           pd.concat(frames, ignore_index = True))
+
+
+    return gdf
+
+
+def read_reference(path, columns = None, bbox = None, regions = None):
+    """
+    This function reads a combined layer written by combine_regions.
+
+    """
+    with open(path) as source:
+
+        reference = json.load(source)
+
+    folder = os.path.join(os.path.dirname(path), reference['dataset'])
+    if columns is not None:
+
+        columns = [column for column in columns if column not in
+                   reference['constants'] and column != reference['column']]
+
+    gdf = read_regions(folder, regions, columns, bbox, reference['suffix'])
+
+    region = gdf.pop(PARTITION)
+    if reference['column'] is not None:
+
+        gdf[reference['column']] = region.values
+
+    for column, value in reference['constants'].items():
+
+        gdf[column] = value
+
+
+    return gdf
+
+
+def combine_regions(folder, path, column = None, constants = None,
+                    suffix = ''):
+    """
+    This function combines the region layers of a folder into one layer.
+
+    In GeoParquet mode this is a metadata-only operation: the unified
+    schema is recorded in the dataset and the combined layer is written as
+    a reference to it. Other formats read the regions once and write the
+    combined layer.
+
+    Parameters
+    ----------
+    folder : string
+        Folder of the region layers.
+    path : string
+        Shapefile path of the combined layer.
+    column : string
+        Column receiving the region GID, the GID is dropped when None.
+    constants : dict
+        Columns added with a constant value.
+    suffix : string
+        Suffix of the layer names in non-partitioned formats.
+
+    Returns
+    -------
+    path : string
+        The file written, None when there are no regions.
+
+    """
+    constants = constants or {}
+    files = partition_files(folder) if os.path.exists(folder) else []
+
+    if len(list_regions(folder, suffix)) == 0:
+
+        print('No region layers to combine in {}'.format(folder))
+
+        return None
+
+    if get_storage_format() != 'geoparquet' or not files:
+
+        gdf = read_regions(folder, suffix = suffix)
+        region = gdf.pop(PARTITION)
+
+        if column is not None:
+
+            gdf[column] = region.values
+
+        for name, value in constants.items():
+
+            gdf[name] = value
+
+
+        return write_layer(gdf, path, index = False)
+
+    pq.write_metadata(dataset_schema(folder, files),
+                      os.path.join(folder, '_common_metadata'))
+
+    remove_layer(path)
+    path_out = os.path.splitext(path)[0] + REFERENCE
+    os.makedirs(os.path.dirname(path_out) or '.', exist_ok = True)
+    reference = {
+        'dataset': os.path.relpath(folder, os.path.dirname(path_out)),
+        'column': column,
+        'constants': constants,
+        'suffix': suffix,
+    }
+    with open(path_out, 'w') as target:
+
+        json.dump(reference, target, indent = 1)
+
+
+    return path_out
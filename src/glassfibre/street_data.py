@@ -6,7 +6,11 @@ import shutil
 import geopandas as gpd
 import pandas as pd
 import osmnx as ox
-from shapely import wkt
+from glassfibre.aggregate import aggregate
+from glassfibre.storage import (read_layer, write_layer, layer_exists,
+                                write_region_layer)
+from glassfibre.vector_clip import clip_regional_lines
+from glassfibre.street_graph import graph_from_lines, graph_from_pbf
 pd.options.mode.chained_assignment = None
 warnings.filterwarnings('ignore')
 
@@ -20,6 +24,9 @@ DATA_RESULTS = os.path.join(BASE_PATH, '..', 'results', 'final')
 path = os.path.join(DATA_RAW, 'countries.csv')
 countries = pd.read_csv(path, encoding = 'utf-8-sig')
 
+NODE_COLUMNS = ['iso3', 'GID_1', 'GID_2', 'population', 'type', 'lon', 'lat', 
+                'geometry']
+
 
 def download_street_data(iso3):
 
@@ -83,12 +90,12 @@ def generate_street_shapefile(iso3):
         print('Reading CSV street data for {}'.format(iso3))
         df = pd.read_csv(csv_path)
         df = df[['highway', 'length', 'geometry']]
-        df['iso3'] = ''
 
         print('Processing CSV street data for {}'.format(iso3))
         df['iso3'] = iso3
-        df['geometry'] = df['geometry'].apply(lambda x: shapely.wkt.loads(x))
-        gdf = gpd.GeoDataFrame(data = df, geometry = df['geometry'], crs = 4329)
+        df['geometry'] = shapely.from_wkt(df['geometry'].values)
+        gdf = gpd.GeoDataFrame(data = df, geometry = 'geometry', 
+                               crs = 'epsg:4326')
 
         filename = '{}_street_data.shp'.format(iso3)
         folder_out = os.path.join(DATA_RAW, 'street_data', iso3)
@@ -98,20 +105,61 @@ def generate_street_shapefile(iso3):
             os.makedirs(folder_out)
 
         path_out = os.path.join(folder_out, filename)
-        gdf.to_file(path_out, crs = 'EPSG:4326')
+        write_layer(gdf, path_out)
 
 
     return None
 
 
-def process_region_street(iso3):
+def generate_street_graph(iso3):
+    """
+    This function builds the street graph used to route fiber along roads.
+
+    The graph is built offline from a local OpenStreetMap extract 
+    `{iso3}.osm.pbf` in the country street data folder when there is one, 
+    and otherwise from the street layer.
+
+    Parameters
+    ----------
+    iso3 : string
+        Country ISO3 code
+    """
+    folder_in = os.path.join(DATA_RAW, 'street_data', iso3)
+    pbf_path = os.path.join(folder_in, '{}.osm.pbf'.format(iso3))
+
+    if os.path.exists(pbf_path):
+
+        print('Building {} street graph from OSM extract'.format(iso3))
+        graph = graph_from_pbf(pbf_path)
+
+    else:
+
+        print('Building {} street graph from street data'.format(iso3))
+        path_in = os.path.join(folder_in, '{}_street_data.shp'.format(iso3))
+        graph = graph_from_lines(read_layer(path_in))
+
+    folder_out = os.path.join(DATA_PROCESSED, iso3, 'street_graph')
+    graph.save(folder_out)
+    print('{} street graph has {} nodes and {} edges'.format(iso3, len(graph),
+          graph.edge_count() // 2))
+
+
+    return None
+
+
+def process_region_street(iso3, workers = 1):
     """
     Function to process the street data at regional level.  
 
+    The national street network is read once and clipped to every region 
+    through a spatial index.
+
     Parameters
     ----------
     iso3 : string
         Country ISO3 code
+    workers : int
+        Number of worker processes clipping the regions.
     """
     regions = os.path.join(DATA_PROCESSED, iso3, 'regions', 
                            'regions_1_{}.shp'.format(iso3))
@@ -122,46 +170,33 @@ def process_region_street(iso3):
 
             continue
 
-        regions = gpd.read_file(regions)
+        regions = read_layer(regions)
         gid = 'GID_1'
 
-        for idx, region in regions.iterrows():
-            
-            gdf_region = regions
-            gid_id = region[gid]
-
-            file_in = os.path.join(DATA_RAW, 'street_data', iso3, 
-                                   '{}_street_data.shp'.format(iso3))
-
-            gdf_street = gpd.read_file(file_in)
-            gdf_region = gdf_region[gdf_region[gid] == gid_id]
-            print('Intersecting {} street data points'.format(gid_id))
-            gdf_street = gpd.overlay(gdf_street, gdf_region, how = 
-                                    'intersection')
-            
-            filename = '{}.shp'.format(gid_id)
-            folder_out = os.path.join(DATA_PROCESSED, iso3, 'streets', 
-                                    'regions')
-            
-            if not os.path.exists(folder_out):
+        file_in = os.path.join(DATA_RAW, 'street_data', iso3, 
+                               '{}_street_data.shp'.format(iso3))
+        gdf_street = read_layer(file_in)
 
-                os.makedirs(folder_out)
-
-            path_out = os.path.join(folder_out, filename)
-            gdf_street.to_file(path_out, crs = 'EPSG:4326')
+        folder_out = os.path.join(DATA_PROCESSED, iso3, 'streets', 'regions')
+        clip_regional_lines(gdf_street, regions, gid, folder_out, workers)
 
 
     return None
 
 
-def process_subregion_street(iso3):
+def process_subregion_street(iso3, workers = 1):
     """
     Function to process the street data at sub-regional level.  
 
+    The national street network is read once and clipped to every 
+    sub-region through a spatial index.
+
     Parameters
     ----------
     iso3 : string
         Country ISO3 code
+    workers : int
+        Number of worker processes clipping the sub-regions.
     """
     for idx, country in countries.iterrows():
 
@@ -174,40 +209,23 @@ def process_subregion_street(iso3):
         region_path_2 = os.path.join('results', 'processed', iso3, 'regions', 
                                     'regions_1_{}.shp'.format(iso3))
 
-        if os.path.exists(region_path):
+        if layer_exists(region_path):
 
-            regions = gpd.read_file(region_path)
+            regions = read_layer(region_path)
             gid = 'GID_2'
 
         else:
 
-            regions = gpd.read_file(region_path_2)
+            regions = read_layer(region_path_2)
             gid = 'GID_1'
 
-        for idx, region in regions.iterrows():
-
-            gid_id = region[gid]
-            gdf_region = regions
+        file_in = os.path.join(DATA_RAW, 'street_data', iso3, 
+                               '{}_street_data.shp'.format(iso3))
+        gdf_street = read_layer(file_in)
 
-            file_in = os.path.join(DATA_RAW, 'street_data', iso3, 
-                                   '{}_street_data.shp'.format(iso3))
-
-            gdf_street = gpd.read_file(file_in)
-            gdf_region = gdf_region[gdf_region[gid] == gid_id]
-            print('Intersecting {} street data points'.format(gid_id))
-            gdf_street = gpd.overlay(gdf_street, gdf_region, how = 
-                                     'intersection')
-            
-            filename = '{}.shp'.format(gid_id)
-            folder_out = os.path.join(DATA_PROCESSED, iso3, 'streets', 
-                                      'sub_regions')
-
-            if not os.path.exists(folder_out):
-
-                os.makedirs(folder_out)
-
-            path_out = os.path.join(folder_out, filename)
-            gdf_street.to_file(path_out, crs = 'EPSG:4326')
+        folder_out = os.path.join(DATA_PROCESSED, iso3, 'streets', 
+                                  'sub_regions')
+        clip_regional_lines(gdf_street, regions, gid, folder_out, workers)
 
     
     return None
@@ -223,31 +241,69 @@ def combine_street_csv(iso3):
         Country ISO3 code
     """
 
-    combined_df = pd.DataFrame()
     csv_path = os.path.join(DATA_RAW, 'street_data', iso3)
+    fileout = '{}_national_street_data.csv'.format(iso3)
+    path_out = os.path.join(csv_path, fileout)
 
-    print('Merging {} csv files'.format(iso3))
+    paths = []
     for root, _, files in os.walk(csv_path):
 
-        for file in files:
+        paths += [os.path.join(root, file) for file in sorted(files) if 
+                  file.endswith('.csv') and file != fileout]
+
+    print('Merging {} csv files'.format(iso3))
+    aggregate(paths, path_out, stream = True, description = 
+              'Merging {} street data'.format(iso3))
+
+    
+    return None
+
+
+def write_region_nodes(nodes, regions, gid, folder_out):
+    """
+    This function assigns nodes to the regions they fall within using one 
+    spatial join and writes the nodes of each region.
 
-            if file.endswith('.csv'):
+    Parameters
+    ----------
+    nodes : geodataframe
+        Settlement nodes.
+    regions : geodataframe
+        Region boundaries.
+    gid : string
+        Column holding the region identifier.
+    folder_out : string
+        Folder of the regional node layers.
+    """
+    parents = [column for column in ['GID_1'] if column != gid and column in
+               regions.columns]
+    regions = regions[[gid] + parents + ['geometry']].rename(columns = dict(
+        {gid: 'region'}, **{column: 'region_' + column for column in parents}))
+    nodes = gpd.sjoin(nodes, regions, how = 'inner', predicate = 'within')
 
-                file_path = os.path.join(root, file)
-                df = pd.read_csv(file_path)
+    # Node layers only carry the GID levels of their country, the missing
+    # ones are taken from the region each node falls within.
+    for column in ['GID_1', 'GID_2']:
 
-                combined_df = pd.concat([combined_df, df], ignore_index = True)
+        source = nodes.get('region_' + column, nodes['region'])
+        if column in nodes.columns:
 
-                fileout = '{}_national_street_data.csv'.format(iso3)
-                folder_out = os.path.join(DATA_RAW, 'street_data', iso3)
-                if not os.path.exists(folder_out):
+            nodes[column] = nodes[column].fillna(source)
 
-                    os.makedirs(folder_out)
+        else:
+
+            nodes[column] = source
+
+    nodes = nodes.reindex(columns = NODE_COLUMNS + ['region'])
+    groups = dict(list(nodes.groupby('region', sort = False)))
+
+    for gid_id in regions['region']:
+
+        region_nodes = groups.get(gid_id, nodes.iloc[:0])
+        region_nodes = region_nodes[NODE_COLUMNS].reset_index(drop = True)
+        write_region_layer(region_nodes, folder_out, gid_id)
 
-                path_out = os.path.join(folder_out, fileout)
-                combined_df.to_csv(path_out, index = False) 
 
-    
     return None
 
 
@@ -270,38 +326,16 @@ def generate_region_nodes(iso3):
 
             continue
 
-        regions = gpd.read_file(regions)
+        regions = read_layer(regions)
         gid = 'GID_1'
 
-        for idx, region in regions.iterrows():
-            
-            gdf_region = regions
-            gid_id = region[gid]
-
-            file_in = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                      'combined', '{}_combined_access_nodes.shp'.format(iso3))
-
-            gdf_settlement = gpd.read_file(file_in)
-            gdf_region = gdf_region[gdf_region[gid] == gid_id]
-            gdf_settlement = gpd.overlay(gdf_settlement, gdf_region, how = 
-                                    'intersection')
-            
-            filename = '{}.shp'.format(gid_id)
-            folder_out = os.path.join(DATA_PROCESSED, iso3, 
-                        'buffer_routing_zones', 'pcsf_regional_nodes')
-            try:
-                gdf_settlement = gdf_settlement[['iso3', 'GID_1', 'GID_2', 
-                                'population', 'type', 'lon', 'lat', 'geometry']]
-            except:
-                gdf_settlement.rename(columns = {'GID_1_1': 'GID_1', 'GID_1_2': 'GID_2'}, inplace = True)
-                gdf_settlement = gdf_settlement[['iso3', 'GID_1', 'GID_2', 
-                                'population', 'type', 'lon', 'lat', 'geometry']]
-            if not os.path.exists(folder_out):
-
-                os.makedirs(folder_out)
-
-            path_out = os.path.join(folder_out, filename)
-            gdf_settlement.to_file(path_out, crs = 'EPSG:4326')
+        file_in = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
+                  'combined', '{}_combined_access_nodes.shp'.format(iso3))
+        gdf_settlement = read_layer(file_in)
+
+        folder_out = os.path.join(DATA_PROCESSED, iso3, 
+                    'buffer_routing_zones', 'pcsf_regional_nodes')
+        write_region_nodes(gdf_settlement, regions, gid, folder_out)
 
 
     return None
@@ -329,49 +363,23 @@ def generate_sub_region_nodes(iso3):
         
         region_path_2 = os.path.join('results', 'processed', iso3, 'regions', 
                                    'regions_1_{}.shp'.format(iso3))        
-        if os.path.exists(region_path):
+        if layer_exists(region_path):
 
-            regions = gpd.read_file(region_path)
+            regions = read_layer(region_path)
             gid = 'GID_2'
 
         else:
 
-            regions = gpd.read_file(region_path_2)
+            regions = read_layer(region_path_2)
             gid = 'GID_1'
 
-        for idx, region in regions.iterrows():
-            
-            gdf_region = regions
-            gid_id = region[gid]
-
-            file_in = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
-                      'combined', 
-                      '{}_combined_pcsf_regional_nodes.shp'.format(iso3))
-
-            gdf_settlement = gpd.read_file(file_in)
-            gdf_region = gdf_region[gdf_region[gid] == gid_id]
-            gdf_settlement = gpd.overlay(gdf_settlement, gdf_region, how = 
-                                    'intersection')
-
-            filename = '{}.shp'.format(gid_id)
-            folder_out = os.path.join(DATA_PROCESSED, iso3, 
-                        'buffer_routing_zones', 'pcsf_subregional_nodes')
-            
-            try:
-                gdf_settlement = gdf_settlement[['iso3', 'GID_1', 'population', 'geometry']]
-                gdf_settlement.rename(columns = {'GID_2_2': 'GID_2'}, 
-                                      inplace = True)
-            except:
-                pass
-                '''gdf_settlement.rename(columns = {'GID_1_1': 'GID_1', 'GID_1_2': 'GID_2'}, inplace = True)
-                gdf_settlement = gdf_settlement[['iso3', 'GID_1', 'GID_2', 
-                                'population', 'type', 'lon', 'lat', 'geometry']]'''
-            if not os.path.exists(folder_out):
-
-                os.makedirs(folder_out)
-
-            path_out = os.path.join(folder_out, filename)
-            gdf_settlement.to_file(path_out, crs = 'EPSG:4326')
+        file_in = os.path.join(DATA_PROCESSED, iso3, 'buffer_routing_zones', 
+                  'combined', '{}_combined_pcsf_regional_nodes.shp'.format(iso3))
+        gdf_settlement = read_layer(file_in)
+
+        folder_out = os.path.join(DATA_PROCESSED, iso3, 
+                    'buffer_routing_zones', 'pcsf_subregional_nodes')
+        write_region_nodes(gdf_settlement, regions, gid, folder_out)
 
 
     return None
@@ -389,6 +397,7 @@ for idx, country in countries.iterrows():
     #download_street_data(countries['iso3'].loc[idx])
     #combine_street_csv(countries['iso3'].loc[idx])
     #generate_street_shapefile(countries['iso3'].loc[idx])
+    #generate_street_graph(countries['iso3'].loc[idx])
     #process_region_street(countries['iso3'].loc[idx])
     #process_subregion_street(countries['iso3'].loc[idx])
     #generate_sub_region_nodes(countries['iso3'].loc[idx])
@@ -0,0 +1,371 @@
+"""
+Compact street graphs for routing fiber along roads.
+
+A road network is read either offline from a local OpenStreetMap .osm.pbf
+extract (with the optional osmium package) or from an existing street
+layer. Ways are split at junctions and the vertices in between are folded
+into the edge lengths, so the graph only holds junctions and dead ends.
+
+The graph is kept in compressed sparse row (CSR) form: node ids are int32
+positions into the coordinate arrays, the neighbours of node i are
+indices[indptr[i]:indptr[i + 1]] and every edge carries its length in
+metres and its highway type in typed arrays. Both directions of each road
+are stored. The arrays are saved as .npy files, which are memory-mapped
+when a graph is loaded.
+
+"""
+import os
+import json
+import array
+import numpy as np
+import shapely
+
+try:
+
+    import osmium
+
+except ImportError:
+
+    osmium = None
+
+EARTH_RADIUS = 6371008.8
+EXCLUDED_HIGHWAYS = ['abandoned', 'construction', 'planned', 'platform',
+                     'proposed', 'raceway', 'razed']
+ARRAYS = ['indptr', 'indices', 'length', 'highway', 'lon', 'lat', 'node_id']
+
+
+class StreetGraph:
+
+    """
+    This class holds a street graph in CSR form.
+    """
+
+    def __init__(self, indptr, indices, length, highway, lon, lat, node_id,
+                 highways):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        indptr : numpy array
+            Offsets of the neighbours of each node, of length nodes + 1.
+        indices : numpy array
+            int32 neighbour of each edge.
+        length : numpy array
+            float32 length of each edge in metres.
+        highway : numpy array
+            Highway type code of each edge.
+        lon : numpy array
+            Longitude of each node.
+        lat : numpy array
+            Latitude of each node.
+        node_id : numpy array
+            int64 source identifier of each node, the OSM node id for graphs
+            read from an extract.
+        highways : list
+            Highway types indexed by code.
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.length = length
+        self.highway = highway
+        self.lon = lon
+        self.lat = lat
+        self.node_id = node_id
+        self.highways = highways
+
+
+    def __len__(self):
+
+        return len(self.lon)
+
+
+    def edge_count(self):
+        """
+        Return the number of directed edges.
+
+        """
+        return len(self.indices)
+
+
+    def save(self, folder):
+        """
+        Save the graph as .npy files and a metadata file.
+
+        Parameters
+        ----------
+        folder : string
+            Folder of the graph.
+
+        """
+        os.makedirs(folder, exist_ok = True)
+
+        for name in ARRAYS:
+
+            np.save(os.path.join(folder, name + '.npy'), getattr(self, name))
+
+        with open(os.path.join(folder, 'graph.json'), 'w') as f:
+
+            json.dump({'nodes': len(self), 'edges': self.edge_count(),
+                       'highways': list(self.highways)}, f)
+
+
+def load_street_graph(folder, mmap_mode = 'r'):
+    """
+    This function loads a saved street graph, memory-mapping its arrays.
+
+    Parameters
+    ----------
+    folder : string
+        Folder of the graph.
+    mmap_mode : string
+        Memory-map mode of the arrays, None reads them into memory.
+
+    Returns
+    -------
+    graph : StreetGraph
+        The street graph.
+
+    """
+    with open(os.path.join(folder, 'graph.json')) as f:
+
+        meta = json.load(f)
+
+    arrays = {name: np.load(os.path.join(folder, name + '.npy'),
+                            mmap_mode = mmap_mode) for name in ARRAYS}
+
+
+    return StreetGraph(highways = meta['highways'], **arrays)
+
+
+def street_graph_exists(folder):
+    """
+    This function checks whether a saved street graph exists.
+
+    """
+    return os.path.exists(os.path.join(folder, 'graph.json'))
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    This function computes great-circle distances in metres.
+
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) *
+         np.sin((lon2 - lon1) / 2) ** 2)
+
+
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def build_street_graph(vertex_id, lon, lat, way, highway):
+    """
+    This function builds a CSR street graph from the vertices of ways.
+
+    Ways are split at every vertex shared with another way or repeated
+    within the way, and at their ends. Parallel edges keep the shortest
+    length and self loops are dropped.
+
+    Parameters
+    ----------
+    vertex_id : numpy array
+        int64 identifier of each vertex, shared by ways meeting there.
+    lon : numpy array
+        Longitude of each vertex.
+    lat : numpy array
+        Latitude of each vertex.
+    way : numpy array
+        Way of each vertex, vertices of a way being consecutive.
+    highway : numpy array
+        Highway type of each way.
+
+    Returns
+    -------
+    graph : StreetGraph
+        The street graph.
+
+    """
+    vertex_id = np.asarray(vertex_id, dtype = np.int64)
+    lon = np.asarray(lon, dtype = np.float64)
+    lat = np.asarray(lat, dtype = np.float64)
+    way = np.asarray(way, dtype = np.int64)
+
+    unique_id, inverse, counts = np.unique(vertex_id, return_inverse = True,
+                                           return_counts = True)
+    new_way = way[1:] != way[:-1]
+    start = np.concatenate([[True], new_way])
+    end = np.concatenate([new_way, [True]])
+    junction = (counts[inverse] > 1) | start | end
+
+    segment = haversine(lon[:-1], lat[:-1], lon[1:], lat[1:])
+    segment[new_way] = 0
+    distance = np.concatenate([[0], np.cumsum(segment)])
+
+    positions = np.flatnonzero(junction)
+    a, b = positions[:-1], positions[1:]
+    same_way = way[a] == way[b]
+    a, b = a[same_way], b[same_way]
+
+    nodes, first = np.unique(inverse[positions], return_index = True)
+    graph_id = np.full(len(unique_id), -1, dtype = np.int32)
+    graph_id[nodes] = np.arange(len(nodes), dtype = np.int32)
+
+    u = graph_id[inverse[a]]
+    v = graph_id[inverse[b]]
+    length = distance[b] - distance[a]
+
+    highways, codes = np.unique(np.asarray(highway).astype(str),
+                                return_inverse = True)
+    code_type = np.uint8 if len(highways) <= 256 else np.uint16
+    codes = codes.astype(code_type)[way[a]]
+
+    loop = u == v
+    u, v, length, codes = u[~loop], v[~loop], length[~loop], codes[~loop]
+
+    source = np.concatenate([u, v])
+    target = np.concatenate([v, u])
+    length = np.concatenate([length, length])
+    codes = np.concatenate([codes, codes])
+
+    order = np.lexsort((length, target, source))
+    source, target = source[order], target[order]
+    length, codes = length[order], codes[order]
+    keep = np.concatenate([[True], (source[1:] != source[:-1]) |
+                           (target[1:] != target[:-1])])
+    source, target = source[keep], target[keep]
+    length, codes = length[keep], codes[keep]
+
+    indptr = np.zeros(len(nodes) + 1, dtype = np.int64)
+    np.cumsum(np.bincount(source, minlength = len(nodes)), out = indptr[1:])
+    vertex = positions[first]
+
+
+    return StreetGraph(indptr, target.astype(np.int32),
+                       length.astype(np.float32), codes, lon[vertex],
+                       lat[vertex], unique_id[nodes],
+                       [str(value) for value in highways])
+
+
+def read_pbf_ways(path):
+    """
+    This function reads the highway ways of an OpenStreetMap extract.
+
+    Parameters
+    ----------
+    path : string
+        Path to the .osm.pbf extract.
+
+    Returns
+    -------
+    vertex_id : numpy array
+        OSM node id of each way vertex.
+    lon : numpy array
+        Longitude of each vertex.
+    lat : numpy array
+        Latitude of each vertex.
+    way : numpy array
+        Way of each vertex.
+    highway : numpy array
+        Highway type of each way.
+
+    """
+    if osmium is None:
+
+        raise ImportError('Reading .osm.pbf extracts requires the osmium '
+                          'package')
+
+    class WayHandler(osmium.SimpleHandler):
+
+        def __init__(self):
+
+            super().__init__()
+            self.vertex_id = array.array('q')
+            self.lon = array.array('d')
+            self.lat = array.array('d')
+            self.way_index = array.array('q')
+            self.highway = []
+
+
+        def way(self, w):
+
+            highway = w.tags.get('highway')
+            if highway is None or highway in EXCLUDED_HIGHWAYS:
+
+                return None
+
+            refs = [(n.ref, n.lon, n.lat) for n in w.nodes
+                    if n.location.valid()]
+            if len(refs) < 2:
+
+                return None
+
+            for ref, lon, lat in refs:
+
+                self.vertex_id.append(ref)
+                self.lon.append(lon)
+                self.lat.append(lat)
+
+            self.way_index.extend([len(self.highway)] * len(refs))
+            self.highway.append(highway)
+
+    handler = WayHandler()
+    handler.apply_file(path, locations = True, idx = 'flex_mem')
+
+
+    return (np.frombuffer(handler.vertex_id, dtype = np.int64),
+            np.frombuffer(handler.lon), np.frombuffer(handler.lat),
+            np.frombuffer(handler.way_index, dtype = np.int64),
+            np.array(handler.highway))
+
+
+def graph_from_pbf(path):
+    """
+    This function builds a street graph offline from an OpenStreetMap
+    extract.
+
+    Parameters
+    ----------
+    path : string
+        Path to the .osm.pbf extract.
+
+    Returns
+    -------
+    graph : StreetGraph
+        The street graph.
+
+    """
+    vertex_id, lon, lat, way, highway = read_pbf_ways(path)
+
+
+    return build_street_graph(vertex_id, lon, lat, way, highway)
+
+
+def graph_from_lines(gdf, decimals = 7):
+    """
+    This function builds a street graph from a street layer, joining lines
+    whose vertices coincide once rounded.
+
+    Parameters
+    ----------
+    gdf : geodataframe
+        Street lines with a 'highway' column, in EPSG:4326.
+    decimals : int
+        Decimal places of the coordinates used to match vertices.
+
+    Returns
+    -------
+    graph : StreetGraph
+        The street graph.
+
+    """
+    gdf = gdf[~gdf.geometry.is_empty & gdf.geometry.notna()]
+    gdf = gdf.explode(index_parts = False)
+    coordinates, way = shapely.get_coordinates(gdf.geometry.values,
+                                               return_index = True)
+    vertex_id = np.unique(np.round(coordinates, decimals), axis = 0,
+                          return_inverse = True)[1].ravel()
+
+
+    return build_street_graph(vertex_id, coordinates[:, 0], coordinates[:, 1],
+                              way, gdf['highway'].astype(str).values)
@@ -0,0 +1,346 @@
+"""
+Streaming summary statistics for Monte Carlo results.
+
+Results are folded into running accumulators chunk by chunk, so that the
+mean, variance, extremes and quantiles of any number of draws can be
+reported without keeping the draws. Moments are merged with the parallel
+form of Welford's algorithm (Chan et al.) and quantiles are estimated with
+a merging t-digest.
+
+"""
+import numpy as np
+import pandas as pd
+
+
+QUANTILES = [0.025, 0.05, 0.25, 0.5, 0.75, 0.95, 0.975]
+
+
+class OnlineSummary:
+
+    """
+    This class accumulates the count, mean, variance and range of a
+    stream of values.
+    """
+
+    def __init__(self):
+        """
+        A class constructor
+
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+
+    def update(self, values):
+        """
+        Fold a batch of values into the summary.
+
+        Parameters
+        ----------
+        values : array
+            Batch of values. NaN values are ignored.
+
+        """
+        values = np.asarray(values, dtype = float)
+        values = values[~np.isnan(values)]
+        n = len(values)
+
+        if n == 0:
+
+            return None
+
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        total = self.count + n
+        delta = mean - self.mean
+
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+
+    def variance(self):
+        """
+        Return the sample variance.
+
+        """
+        if self.count < 2:
+
+            return np.nan
+
+
+        return self.m2 / (self.count - 1)
+
+
+    def standard_error(self):
+        """
+        Return the standard error of the mean.
+
+        """
+        if self.count < 2:
+
+            return np.nan
+
+
+        return np.sqrt(self.variance() / self.count)
+
+
+    def relative_standard_error(self):
+        """
+        Return the standard error relative to the absolute mean.
+
+        """
+        if self.count < 2 or self.mean == 0:
+
+            return np.nan
+
+
+        return self.standard_error() / abs(self.mean)
+
+
+class TDigest:
+
+    """
+    This class estimates quantiles of a stream of values with a merging
+    t-digest.
+    """
+
+    def __init__(self, compression = 500, buffer_size = 10000):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        compression : float
+            Compression parameter, bounding the number of centroids.
+        buffer_size : int
+            Number of values buffered before they are merged.
+        """
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+        self.buffered = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+
+    def update(self, values):
+        """
+        Add a batch of values to the digest.
+
+        Parameters
+        ----------
+        values : array
+            Batch of values. NaN values are ignored.
+
+        """
+        values = np.asarray(values, dtype = float).ravel()
+        values = values[~np.isnan(values)]
+
+        if len(values) == 0:
+
+            return None
+
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.buffer.append(values)
+        self.buffered += len(values)
+
+        if self.buffered >= self.buffer_size:
+
+            self.compress()
+
+
+    def compress(self):
+        """
+        Merge the buffered values into the centroids.
+
+        Sorted points are grouped so that each centroid spans at most one
+        unit of the arcsine scale function, which keeps centroids small in
+        the tails and large in the middle of the distribution.
+
+        """
+        if self.buffered == 0:
+
+            return None
+
+        means = np.concatenate([self.means] + self.buffer)
+        weights = np.concatenate([self.weights] +
+                                 [np.ones(len(b)) for b in self.buffer])
+        self.buffer = []
+        self.buffered = 0
+
+        order = np.argsort(means, kind = 'stable')
+        means, weights = means[order], weights[order]
+
+        total = weights.sum()
+        cumulative = np.cumsum(weights)
+        q_mid = (cumulative - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_mid - 1)
+        groups = np.floor(k - k[0]).astype(np.int64)
+        groups = np.unique(groups, return_inverse = True)[1]
+
+        merged_weights = np.bincount(groups, weights = weights)
+        merged_means = np.bincount(groups, weights = means * weights)
+
+        self.weights = merged_weights
+        self.means = merged_means / merged_weights
+
+
+    def count(self):
+        """
+        Return the number of values added.
+
+        """
+        return self.weights.sum() + self.buffered
+
+
+    def quantile(self, q):
+        """
+        Estimate quantiles.
+
+        Parameters
+        ----------
+        q : float or array
+            Quantiles between 0 and 1.
+
+        Returns
+        -------
+        values : float or array
+            Estimated quantiles.
+
+        """
+        self.compress()
+
+        if len(self.means) == 0:
+
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+
+        total = self.weights.sum()
+        positions = (np.cumsum(self.weights) - self.weights / 2) / total
+        positions = np.concatenate([[0.0], positions, [1.0]])
+        means = np.concatenate([[self.min], self.means, [self.max]])
+
+
+        return np.interp(q, positions, means)
+
+
+class GroupedSummary:
+
+    """
+    This class keeps an OnlineSummary and a TDigest for every metric of
+    every group of a stream of result chunks.
+    """
+
+    def __init__(self, keys, metrics, compression = 500):
+        """
+        A class constructor
+
+        Arguments
+        ---------
+        keys : list
+            Columns identifying a group, e.g. decile, strategy, algorithm.
+        metrics : list
+            Result columns to summarize.
+        compression : float
+            Compression parameter of the t-digests.
+        """
+        self.keys = keys
+        self.metrics = metrics
+        self.compression = compression
+        self.groups = {}
+
+
+    def update(self, df):
+        """
+        Fold a chunk of results into the group summaries.
+
+        Parameters
+        ----------
+        df : dataframe
+            Results containing the key and metric columns.
+
+        """
+        for group, data in df.groupby(self.keys, sort = False):
+
+            group = group if isinstance(group, tuple) else (group,)
+            accumulators = self.groups.get(group)
+
+            if accumulators is None:
+
+                accumulators = {metric: (OnlineSummary(),
+                                         TDigest(self.compression))
+                                for metric in self.metrics}
+                self.groups[group] = accumulators
+
+            for metric in self.metrics:
+
+                summary, digest = accumulators[metric]
+                values = data[metric].values
+                summary.update(values)
+                digest.update(values)
+
+
+    def relative_standard_error(self, metric):
+        """
+        Return the relative standard error of a metric for every group.
+
+        Returns
+        -------
+        errors : dict
+            Group mapped to the relative standard error of its mean.
+
+        """
+        return {group: accumulators[metric][0].relative_standard_error()
+                for group, accumulators in self.groups.items()}
+
+
+    def summary(self, quantiles = QUANTILES):
+        """
+        Return the summary table.
+
+        Returns
+        -------
+        df : dataframe
+            One row per group and metric with the count, mean, standard
+            deviation, standard error, range and quantiles.
+
+        """
+        rows = []
+        for group, accumulators in self.groups.items():
+
+            for metric in self.metrics:
+
+                summary, digest = accumulators[metric]
+                row = dict(zip(self.keys, group))
+                row.update({
+                    'metric': metric,
+                    'count': summary.count,
+                    'mean': summary.mean,
+                    'std': np.sqrt(summary.variance()),
+                    'sem': summary.standard_error(),
+                    'min': summary.min,
+                    'max': summary.max,
+                })
+
+                for q, value in zip(quantiles, digest.quantile(quantiles)):
+
+                    row['p{:g}'.format(q * 100).replace('.', '_')] = value
+
+                rows.append(row)
+
+        df = pd.DataFrame(rows)
+
+        if len(df) > 0:
+
+            df = df.sort_values(self.keys + ['metric']).reset_index(drop = True)
+
+
+        return df
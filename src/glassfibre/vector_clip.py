@@ -0,0 +1,257 @@
+"""
+Clipping of a national line network into regional layers.
+
+The national network is read once and indexed with an STRtree. For each
+region only the segments whose bounding boxes meet the region are tested:
+segments lying inside the region are kept as they are and only those that
+cross the region boundary are intersected with it. The regional layers
+have the same columns as gpd.overlay(lines, region, how = 'intersection')
+and are all produced in one pass over the regions, optionally split
+across a process pool.
+
+"""
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from concurrent.futures import ProcessPoolExecutor
+from shapely import STRtree
+from glassfibre.storage import write_region_layer
+
+LINE_TYPES = [1, 2, 5]
+
+
+def line_parts(geometries):
+    """
+    This function keeps the linear part of clipped geometries, dropping the
+    points where a segment only touches a region boundary.
+
+    Parameters
+    ----------
+    geometries : numpy array
+        Clipped geometries.
+
+    Returns
+    -------
+    geometries : numpy array
+        Lines and multilines, or None where nothing linear is left.
+
+    """
+    geometries = geometries.copy()
+    types = shapely.get_type_id(geometries)
+
+    for i in np.flatnonzero(types == 7):
+
+        parts = shapely.get_parts(shapely.get_parts(geometries[i]))
+        parts = parts[np.isin(shapely.get_type_id(parts), LINE_TYPES)]
+
+        if len(parts) == 1:
+
+            geometries[i] = parts[0]
+
+        elif len(parts) > 1:
+
+            geometries[i] = shapely.multilinestrings(parts)
+
+    types = shapely.get_type_id(geometries)
+    geometries[~np.isin(types, LINE_TYPES) | shapely.is_empty(geometries)
+               ] = None
+
+
+    return geometries
+
+
+def clip_lines(geometries, region, tree = None):
+    """
+    This function clips lines to a region.
+
+    Parameters
+    ----------
+    geometries : numpy array
+        Line geometries.
+    region : polygon
+        Region geometry.
+    tree : STRtree
+        Spatial index of the geometries, built when not given.
+
+    Returns
+    -------
+    positions : numpy array
+        Sorted positions of the lines within the region.
+    clipped : numpy array
+        The clipped geometry of each of these lines.
+
+    """
+    if tree is None:
+
+        tree = STRtree(geometries)
+
+    shapely.prepare(region)
+    positions = np.sort(tree.query(region, predicate = 'intersects'))
+    clipped = geometries[positions]
+
+    crossing = ~shapely.covers(region, clipped)
+    clipped[crossing] = shapely.intersection(clipped[crossing], region)
+    clipped = line_parts(clipped)
+    keep = ~shapely.is_missing(clipped)
+
+
+    return positions[keep], clipped[keep]
+
+
+def region_frame(lines, region, positions, clipped):
+    """
+    This function joins the attributes of the clipped lines and of their
+    region, naming clashing columns as gpd.overlay does.
+
+    Parameters
+    ----------
+    lines : geodataframe
+        Line network.
+    region : series
+        Region attributes and geometry.
+    positions : numpy array
+        Positions of the clipped lines.
+    clipped : numpy array
+        Clipped line geometries.
+
+    Returns
+    -------
+    gdf : geodataframe
+        Clipped lines of the region.
+
+    """
+    left = pd.DataFrame(lines.drop(columns = lines.geometry.name)).iloc[
+        positions].reset_index(drop = True)
+    right = region.drop(labels = 'geometry')
+
+    shared = set(left.columns) & set(right.index)
+    left = left.rename(columns = {column: '{}_1'.format(column) for column in
+                                  shared})
+    right = right.rename({column: '{}_2'.format(column) for column in shared})
+
+    for column, value in right.items():
+
+        left[column] = value
+
+    gdf = gpd.GeoDataFrame(left, geometry = gpd.GeoSeries(clipped),
+                           crs = lines.crs)
+
+
+    return gdf
+
+
+def clip_regions(job):
+    """
+    Clip the line network to each region of a job.
+
+    Parameters
+    ----------
+    job : tuple
+        Lines meeting the regions, the regions, the column holding the
+        region identifier and the folder of the regional layers.
+
+    Returns
+    -------
+    clipped : dict
+        Region identifier mapped to its clipped lines when no folder is
+        given, otherwise empty.
+
+    """
+    lines, regions, gid_level, folder_out = job
+    geometries = np.asarray(lines.geometry.values)
+    tree = STRtree(geometries)
+    clipped = {}
+
+    for idx, region in regions.iterrows():
+
+        gid = region[gid_level]
+        print('Intersecting {} street data points'.format(gid))
+        positions, geometries_region = clip_lines(geometries,
+                                                  region['geometry'], tree)
+        gdf = region_frame(lines, region, positions, geometries_region)
+
+        if folder_out is not None:
+
+            write_region_layer(gdf, folder_out, gid)
+
+        else:
+
+            clipped[gid] = gdf
+
+
+    return clipped
+
+
+def clip_regional_lines(lines, regions, gid_level, folder_out = None,
+                        workers = 1):
+    """
+    This function clips a national line network into one layer per region.
+
+    Parameters
+    ----------
+    lines : geodataframe
+        National line network, read once.
+    regions : geodataframe
+        Regions to clip.
+    gid_level : string
+        Column holding the region identifier used to name the outputs.
+    folder_out : string
+        Folder of the regional layers. Nothing is written when None.
+    workers : int
+        Number of worker processes. With more than one, the regions are
+        split into contiguous groups and each worker receives only the
+        lines meeting its group.
+
+    Returns
+    -------
+    clipped : dict
+        Region identifier mapped to its clipped lines when folder_out is
+        None, otherwise None.
+
+    """
+    regions = regions.reset_index(drop = True)
+    if regions.geometry.name != 'geometry':
+
+        regions = regions.rename_geometry('geometry')
+
+    invalid = ~regions.geometry.is_valid
+    regions.loc[invalid, 'geometry'] = regions.geometry[invalid].make_valid()
+
+    if workers is not None and workers <= 1 or len(regions) < 2:
+
+        clipped = clip_regions((lines, regions, gid_level, folder_out))
+
+    else:
+
+        tree = STRtree(np.asarray(lines.geometry.values))
+        jobs = []
+
+        for chunk in np.array_split(np.arange(len(regions)), workers or
+                                    os.cpu_count()):
+
+            if len(chunk) == 0:
+
+                continue
+
+            chunk_regions = regions.iloc[chunk]
+            positions = np.unique(tree.query(chunk_regions.geometry.values,
+                                             predicate = 'intersects')[1])
+            jobs.append((lines.iloc[positions], chunk_regions, gid_level,
+                         folder_out))
+
+        clipped = {}
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+
+            for result in executor.map(clip_regions, jobs):
+
+                clipped.update(result)
+
+    if folder_out is None:
+
+        return clipped
+
+
+    return None
@@ -0,0 +1,38 @@
+"""
+Storing and restoring stage outputs.
+
+"""
+import os
+
+from glassfibre.cache import StageCache
+
+
+def test_rewriting_restored_output_keeps_cache_entry(tmp_path):
+
+    cache = StageCache(str(tmp_path / 'cache'))
+    base = str(tmp_path / 'country')
+    path = os.path.join(base, 'fiber_design', 'KEN_fiber.csv')
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as sink:
+
+        sink.write('GID_1,length_km\nKEN.1_1,10\n')
+
+    key = cache.key('generate_access_csv', base, [], {'lowest': 2})
+    cache.store(key, base, [path])
+    os.remove(path)
+
+    assert cache.restore(key, base)
+    with open(path, 'w') as sink:
+
+        sink.write('GID_1,length_km\nKEN.1_1,99\n')
+
+    path_object = os.path.join(cache.entry_path(key), 'files', 'fiber_design',
+                               'KEN_fiber.csv')
+    with open(path_object) as source:
+
+        assert source.read() == 'GID_1,length_km\nKEN.1_1,10\n'
+
+    assert cache.restore(key, base)
+    with open(path) as source:
+
+        assert source.read() == 'GID_1,length_km\nKEN.1_1,10\n'
@@ -0,0 +1,65 @@
+"""
+End-to-end run of the fiber sensitivity analysis on a tiny synthetic
+decile dataset.
+
+"""
+import os
+import sys
+import pandas as pd
+import pytest
+
+pytest.importorskip('geosafi_consav')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from inputs import parameters
+from fiber_montecarlo import deciles
+import fiber_sensitivity
+
+
+def write_decile_data(root):
+    """
+    Write the SSA decile inputs read by the cost and emission models.
+
+    """
+    ssa = os.path.join(root, 'work', 'results', 'SSA')
+    valid = os.path.join(root, 'geosafi-consav', 'results', 'SSA')
+    os.makedirs(ssa)
+    os.makedirs(valid)
+    os.makedirs(os.path.join(root, 'work', 'data'))
+
+    pd.DataFrame({
+        'decile': deciles,
+        'total_population': 1000000,
+        'total_poor_unconnected': 1000,
+        'total_area_sqkm': 5000.0}).to_csv(os.path.join(
+        ssa, 'SSA_decile_summary_stats.csv'), index = False)
+    pd.DataFrame({
+        'iso3': 'KEN', 'GID_1': 'KEN.1_1', 'GID_2': 'KEN.1.1_1',
+        'area': 10.0, 'population': 1000, 'pop_density_sqkm': 100.0,
+        'decile_value': 1, 'decile': deciles}).to_csv(os.path.join(
+        ssa, 'SSA_subregional_population_deciles.csv'), index = False)
+    pd.DataFrame([{
+        'decile': decile, 'strategy': strategy, 'algorithm': algorithm,
+        'total_population': 50000.0, 'mean_distance_km': 100.0, 'nodes': 2}
+        for decile in deciles for strategy in ['access', 'regional']
+        for algorithm in ['pcsf', 'prims']]).to_csv(os.path.join(
+        ssa, 'population_connected_fiber.csv'), index = False)
+    pd.DataFrame({
+        'decile': deciles, 'cost_per_1GB_usd': 2.0,
+        'monthly_income_usd': 100.0, 'cost_per_month_usd': 10.0,
+        'adoption_rate_perc': 20.0, 'arpu_usd': 5.0}).to_csv(os.path.join(
+        valid, 'SSA_decile_summary_stats.csv'), index = False)
+
+
+def test_run_sensitivity(tmp_path, monkeypatch):
+
+    write_decile_data(str(tmp_path))
+    monkeypatch.chdir(tmp_path / 'work')
+
+    fiber_sensitivity.run_sensitivity(parameters, n = 8, workers = 1)
+
+    df = pd.read_csv(os.path.join('results', 'SSA',
+                                  'SSA_fiber_sobol_indices.csv'))
+    assert set(df['decile']) == set(deciles)
+    assert set(df['strategy']) == {'access', 'regional'}
+    assert len(df) > 0
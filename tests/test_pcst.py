@@ -0,0 +1,49 @@
+"""
+Prize-collecting Steiner forest solver.
+
+"""
+import os
+import numpy as np
+import geopandas as gpd
+import pytest
+
+from glassfibre import pcst
+from glassfibre.storage import read_region_layer, write_region_layer
+
+
+def test_pcsf_returns_a_tree():
+
+    rng = np.random.default_rng(0)
+    lon, lat = rng.uniform(36, 36.5, 50), rng.uniform(-1, -0.5, 50)
+    edges, length_km = pcst.settlement_edges(lon, lat)
+    prizes = rng.lognormal(10, 1.5, 50)
+
+    nodes, tree = pcst.pcsf(prizes, edges, length_km * 2000)
+
+    assert len(tree) == len(nodes) - 1
+    assert set(edges[tree].ravel()) <= set(nodes)
+
+
+@pytest.mark.parametrize('level', ['regional', 'access'])
+def test_solve_pcsf_tags_edges_with_level_strategy(tmp_path, monkeypatch,
+                                                   level):
+
+    monkeypatch.setattr(pcst, 'DATA_PROCESSED', str(tmp_path / 'processed'))
+    monkeypatch.setattr(pcst, 'DATA_RESULTS', str(tmp_path / 'final'))
+    folders = pcst.LEVELS[level]
+    rng = np.random.default_rng(1)
+    nodes = gpd.GeoDataFrame({'iso3': 'SYN', 'GID_1': 'SYN.1_1',
+                              'population': rng.lognormal(9, 1, 30)},
+                             geometry = gpd.points_from_xy(
+                             rng.uniform(36, 36.2, 30),
+                             rng.uniform(-1, -0.8, 30)), crs = 'epsg:4326')
+    write_region_layer(nodes, os.path.join(pcst.DATA_PROCESSED, 'SYN',
+                       'buffer_routing_zones', folders['nodes']), 'SYN.1_1')
+
+    pcst.solve_pcsf('SYN', level)
+
+    edges = read_region_layer(os.path.join(pcst.DATA_RESULTS, 'SYN',
+                              'pcsf_solutions', folders['edges']), 'SYN.1_1',
+                              '_edges')
+    assert len(edges) > 0
+    assert set(edges['strategy']) == {folders['strategy']}
@@ -0,0 +1,38 @@
+"""
+Road-constrained routing of fiber between settlements.
+
+"""
+import types
+import numpy as np
+from scipy.sparse import random as sparse_random
+
+from glassfibre.road_routing import region_subgraph
+
+
+def test_region_subgraph_matches_country_slice():
+
+    rng = np.random.default_rng(0)
+    n = 400
+    country = sparse_random(n, n, density = 0.02, format = 'csr',
+                            random_state = 0, dtype = np.float32)
+    indptr = country.indptr.astype(np.int64)
+    indices = country.indices.astype(np.int32)
+    graph = types.SimpleNamespace(lon = rng.uniform(36, 37, n),
+                                  lat = rng.uniform(-1, 0, n),
+                                  indptr = indptr, indices = indices,
+                                  length = country.data)
+    bounds = (36.2, -0.8, 36.6, -0.3)
+
+    matrix, lon, lat = region_subgraph(graph, bounds)
+
+    keep = np.flatnonzero((graph.lon >= 36.15) & (graph.lon <= 36.65) &
+                          (graph.lat >= -0.85) & (graph.lat <= -0.25))
+    expected = country.astype(np.float64)[keep][:, keep]
+
+    assert matrix.shape == expected.shape
+    assert matrix.dtype == np.float64
+    assert np.array_equal(matrix.indptr, expected.indptr)
+    assert np.array_equal(matrix.indices, expected.indices)
+    assert np.array_equal(matrix.data, expected.data)
+    assert np.array_equal(lon, graph.lon[keep])
+    assert np.array_equal(lat, graph.lat[keep])
@@ -0,0 +1,92 @@
+"""
+Stage resolution and resumption of the pipeline runner.
+
+"""
+import importlib
+import os
+import sys
+import pandas as pd
+import pytest
+
+pytest.importorskip('fiona')
+pytest.importorskip('osmnx')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+
+@pytest.fixture
+def run_all(tmp_path, monkeypatch):
+    """
+    Import run_all from a working directory holding the country list its
+    stage modules read on import.
+
+    """
+    os.makedirs(tmp_path / 'data' / 'raw')
+    pd.DataFrame({'iso3': ['SYN'], 'region': ['Sub-Saharan Africa'],
+                  'Exclude': [0]}).to_csv(tmp_path / 'data' / 'raw' /
+                                          'countries.csv', index = False)
+    monkeypatch.chdir(tmp_path)
+
+
+    return importlib.import_module('run_all')
+
+
+@pytest.mark.parametrize('stage', ['generate_region_nodes', 'solve_pcsf'])
+def test_region_nodes_resolve_combined_access_nodes(run_all, stage):
+
+    stages = run_all.resolve_stages([stage], set())
+
+    for dependency in ['create_routing_buffer_zone', 'combine_access_nodes']:
+
+        assert dependency in stages
+        assert stages.index(dependency) < stages.index(
+            'generate_region_nodes')
+
+
+def test_changed_cached_stage_reruns_completed_dependents(run_all, tmp_path,
+                                                          monkeypatch):
+
+    processed = tmp_path / 'processed'
+    monkeypatch.setattr(run_all, 'DATA_PROCESSED', str(processed))
+    monkeypatch.setattr(run_all, 'CACHE_ROOT', str(tmp_path / 'cache'))
+    monkeypatch.setattr(run_all, 'CACHED', {
+        'process_access_settlement_tifs': {'inputs': ['population.txt'],
+                                           'outputs': ['tifs'],
+                                           'params': []}})
+    ran = []
+
+    def record(stage):
+
+        def run(country, workers):
+
+            ran.append(stage)
+            folder = processed / country['iso3'] / 'tifs'
+            os.makedirs(folder, exist_ok = True)
+            (folder / 'settlements.tif').write_text(stage)
+
+
+        return run
+
+    monkeypatch.setattr(run_all, 'STAGE_FUNCTIONS', {
+        name: record(name) for name in run_all.STAGE_NAMES})
+
+    status = {stage: {'key': None} for stage in run_all.DEFAULT_STAGES}
+    status['process_access_settlement_tifs'] = {'key': 'previous'}
+    run_all.save_status('SYN', status)
+    (processed / 'SYN' / 'population.txt').write_text('changed')
+
+    country = {'iso3': 'SYN'}
+    requested = run_all.DEFAULT_STAGES
+    result = run_all.run_country(country, requested, cache_gb = 1)
+
+    assert result['error'] is None
+    assert ran[0] == 'process_access_settlement_tifs'
+    assert 'generate_access_settlement_lut' in ran
+    assert 'solve_pcsf' in ran
+    assert 'create_region_nodes' not in ran
+
+    ran.clear()
+    result = run_all.run_country(country, requested, cache_gb = 1)
+
+    assert result['error'] is None
+    assert ran == []
@@ -0,0 +1,28 @@
+"""
+Layers written through the storage layer.
+
+"""
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from glassfibre.storage import (read_layer, read_region_layer, write_layer,
+                                write_region_layer)
+
+
+@pytest.mark.parametrize('storage_format', ['geoparquet', 'flatgeobuf',
+                                            'shapefile'])
+def test_layers_without_crs_are_written_in_4326(tmp_path, monkeypatch,
+                                                storage_format):
+
+    monkeypatch.setenv('GLASSFIBRE_STORAGE', storage_format)
+    gdf = gpd.GeoDataFrame({'id': [0]}, geometry = [Point(36.8, -1.3)])
+    path = str(tmp_path / 'layer.shp')
+    folder = str(tmp_path / 'regions')
+
+    write_layer(gdf, path)
+    write_region_layer(gdf, folder, 'KEN.1_1')
+
+    assert gdf.crs is None
+    assert read_layer(path).crs == 'epsg:4326'
+    assert read_region_layer(folder, 'KEN.1_1').crs == 'epsg:4326'
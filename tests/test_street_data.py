@@ -0,0 +1,90 @@
+"""
+Assignment of settlement nodes to their regions.
+
+"""
+import importlib
+import os
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+pytest.importorskip('osmnx')
+
+from glassfibre.storage import list_regions, read_region_layer
+
+
+@pytest.fixture
+def street_data(tmp_path, monkeypatch):
+    """
+    Import street_data from a working directory holding the country list
+    it reads on import.
+
+    """
+    os.makedirs(tmp_path / 'data' / 'raw')
+    pd.DataFrame({'iso3': ['SYN']}).to_csv(tmp_path / 'data' / 'raw' /
+                                           'countries.csv', index = False)
+    monkeypatch.chdir(tmp_path)
+
+
+    return importlib.import_module('glassfibre.street_data')
+
+
+def make_nodes(columns):
+    """
+    Return one node in each half of the unit square.
+
+    """
+    gdf = gpd.GeoDataFrame({'iso3': 'SYN', 'population': [10, 20],
+                            'type': 'access', 'lon': [0.25, 0.75],
+                            'lat': 0.5}, geometry = gpd.points_from_xy(
+                            [0.25, 0.75], [0.5, 0.5]), crs = 'epsg:4326')
+    for column, values in columns.items():
+
+        gdf[column] = values
+
+
+    return gdf
+
+
+def test_region_nodes_lowest_1(street_data, tmp_path):
+
+    regions = gpd.GeoDataFrame({'GID_1': ['SYN.1_1', 'SYN.2_1']},
+                               geometry = [box(0, 0, 0.5, 1),
+                                           box(0.5, 0, 1, 1)],
+                               crs = 'epsg:4326')
+    nodes = make_nodes({'GID_1': ['SYN.1_1', 'SYN.2_1']})
+    folder = str(tmp_path / 'nodes')
+
+    street_data.write_region_nodes(nodes, regions, 'GID_1', folder)
+
+    assert list_regions(folder) == ['SYN.1_1', 'SYN.2_1']
+    for gid in ['SYN.1_1', 'SYN.2_1']:
+
+        gdf = read_region_layer(folder, gid)
+        assert list(gdf.columns) == street_data.NODE_COLUMNS
+        assert list(gdf['GID_1']) == [gid]
+        assert list(gdf['GID_2']) == [gid]
+
+
+@pytest.mark.parametrize('columns', [
+    {'GID_1': ['SYN.1_1', 'SYN.1_1'], 'GID_2': ['SYN.1.1_1', 'SYN.1.2_1']},
+    {'GID_1': ['SYN.1_1', 'SYN.1_1']}, {}])
+def test_region_nodes_lowest_2(street_data, tmp_path, columns):
+
+    regions = gpd.GeoDataFrame({'GID_1': 'SYN.1_1',
+                                'GID_2': ['SYN.1.1_1', 'SYN.1.2_1']},
+                               geometry = [box(0, 0, 0.5, 1),
+                                           box(0.5, 0, 1, 1)],
+                               crs = 'epsg:4326')
+    nodes = make_nodes(columns)
+    folder = str(tmp_path / 'nodes')
+
+    street_data.write_region_nodes(nodes, regions, 'GID_2', folder)
+
+    for gid in ['SYN.1.1_1', 'SYN.1.2_1']:
+
+        gdf = read_region_layer(folder, gid)
+        assert list(gdf.columns) == street_data.NODE_COLUMNS
+        assert list(gdf['GID_1']) == ['SYN.1_1']
+        assert list(gdf['GID_2']) == [gid]